@@ -0,0 +1,72 @@
+import random
+import statistics
+import sys
+import time
+from solver.problem_solver import load_schedule
+from solver.graph_builder import build_graph, expand_graph, expand_graph_sparse
+from solver.costFunctions import solve_cost_function, solve_alternatives
+from solver.utils import day_time_to_seconds
+
+
+def cost_seconds(cost_function, cost):
+    return day_time_to_seconds(cost) if cost_function == 'arrivaltime' else int(cost)
+
+
+def median_ms(function, queries):
+    """
+    Runs function on every query and returns the median latency in milliseconds and the results.
+    """
+    latencies = []
+    results = []
+    for query in queries:
+        begin = time.perf_counter()
+        results.append(function(*query))
+        latencies.append((time.perf_counter() - begin) * 1000)
+    return statistics.median(latencies), results
+
+
+def main():
+    schedule_file = sys.argv[1] if len(sys.argv) > 1 else "data/schedule.csv"
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    max_k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    schedule_df = load_schedule(schedule_file)
+    graph = build_graph(schedule_df)
+    graphs = {'station': graph, 'expanded': expand_graph(graph), 'sparse': expand_graph_sparse(graph)}
+
+    random.seed(0)
+    stations = sorted(graph.nodes)
+    queries = [(*random.sample(stations, 2), random.randrange(86400)) for _ in range(n_queries)]
+    print(f"schedule: {schedule_file} ({graph.number_of_nodes()} stations, {graph.number_of_edges()} edges), "
+          f"{n_queries} queries, median latency in ms")
+
+    consistent = True
+    for cost_function, kind in [('stops', 'station'), ('timeintrain', 'station'), ('traveltime', 'expanded'),
+                                ('traveltime', 'sparse'), ('arrivaltime', 'expanded'), ('arrivaltime', 'sparse')]:
+        search_graph = graphs[kind]
+        single, best = median_ms(
+            lambda start, target, input_time: solve_cost_function(
+                search_graph, start, target, schedule_df, cost_function, input_time), queries)
+
+        latencies = []
+        for k in range(1, max_k + 1):
+            latency, alternatives = median_ms(
+                lambda start, target, input_time: solve_alternatives(
+                    search_graph, start, target, cost_function, k, input_time), queries)
+            latencies.append(latency)
+            # The first alternative is the optimum; the others are distinct and no cheaper
+            for result, found in zip(best, alternatives):
+                costs = [cost_seconds(cost_function, cost) for _, cost in found]
+                consistent = consistent and (result == 'PATH NOT FOUND') == (not found)
+                consistent = consistent and costs == sorted(costs) and len({c for c, _ in found}) == len(found)
+                if found:
+                    consistent = consistent and costs[0] == cost_seconds(cost_function, result[1])
+
+        print(f"{cost_function:11s} {kind:8s} single search {single:7.2f}   k=1..{max_k}: "
+              + " ".join(f"{latency:7.2f}" for latency in latencies))
+
+    print(f"consistent with solve_cost_function: {consistent}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import sys
+import time
+from solver.problem_solver import read_and_preprocess_csv
+from solver.graph_builder import build_graph, build_graph_iterative
+
+
+def edge_set(graph):
+    """
+    Returns the edges of a MultiDiGraph as a sorted list of (from, to, attributes) tuples.
+    """
+    return sorted((u, v, tuple(sorted(data.items()))) for u, v, data in graph.edges(data=True))
+
+
+def time_builder(builder, schedule_df, repeat):
+    """
+    Runs a graph builder several times and returns the best wall time together with the last graph.
+    """
+    best = float('infinity')
+    graph = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        graph = builder(schedule_df)
+        best = min(best, time.perf_counter() - start)
+    return best, graph
+
+
+def main():
+    schedule_file = sys.argv[1] if len(sys.argv) > 1 else "data/schedule.csv"
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    schedule_df = read_and_preprocess_csv(schedule_file)
+
+    iterative_time, iterative_graph = time_builder(build_graph_iterative, schedule_df, repeat)
+    bulk_time, bulk_graph = time_builder(build_graph, schedule_df, repeat)
+
+    print(f"schedule:        {schedule_file} ({len(schedule_df)} rows)")
+    print(f"edges:           {bulk_graph.number_of_edges()}")
+    print(f"build_graph_iterative: {iterative_time:.3f} s")
+    print(f"build_graph:           {bulk_time:.3f} s")
+    print(f"speedup:         {iterative_time / bulk_time:.1f}x")
+    print(f"identical edges: {edge_set(iterative_graph) == edge_set(bulk_graph)}")
+
+
+if __name__ == "__main__":
+    main()
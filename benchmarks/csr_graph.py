@@ -0,0 +1,77 @@
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from solver.problem_solver import read_and_preprocess_csv
+from solver.graph_builder import build_graph
+from solver.csr_graph import build_csr_graph, csr_from_graph, dijkstra_path_csr
+from solver.costFunctions import dijkstra_path
+
+
+def traced_build(builder, schedule_df):
+    """
+    Builds a graph under tracemalloc and returns it with the memory it still holds, in bytes.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    graph = builder(schedule_df)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return graph, after - before
+
+
+def same_csr(a, b):
+    """
+    Compares two CSRGraphs field by field.
+    """
+    return all(
+        (x.shape == y.shape and (x == y).all()) if hasattr(x, 'shape') else x == y
+        for x, y in zip(a, b))
+
+
+def time_queries(search, graph, queries, cost_attribute):
+    """
+    Runs every query once and returns the per-query latencies in milliseconds and the results.
+    """
+    latencies = []
+    results = []
+    for start, target in queries:
+        begin = time.perf_counter()
+        results.append(search(graph, start, target, cost_attribute))
+        latencies.append((time.perf_counter() - begin) * 1000)
+    return latencies, results
+
+
+def main():
+    schedule_file = sys.argv[1] if len(sys.argv) > 1 else "data/schedule.csv"
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    schedule_df = read_and_preprocess_csv(schedule_file)
+
+    graph, graph_bytes = traced_build(build_graph, schedule_df)
+    csr, csr_bytes = traced_build(build_csr_graph, schedule_df)
+
+    random.seed(0)
+    stations = sorted(graph.nodes)
+    queries = [tuple(random.sample(stations, 2)) for _ in range(n_queries)]
+
+    print(f"schedule: {schedule_file} ({len(schedule_df)} rows, "
+          f"{graph.number_of_nodes()} stations, {graph.number_of_edges()} edges)")
+    print(f"memory   networkx: {graph_bytes / 2**20:8.2f} MiB   csr: {csr_bytes / 2**20:8.2f} MiB")
+
+    identical = same_csr(csr, csr_from_graph(graph))
+    for cost_attribute in ['stops', 'timeintrain']:
+        nx_latencies, nx_results = time_queries(dijkstra_path, graph, queries, cost_attribute)
+        csr_latencies, csr_results = time_queries(dijkstra_path_csr, csr, queries, cost_attribute)
+        identical = identical and nx_results == csr_results
+        print(f"{cost_attribute:11s} networkx: median {statistics.median(nx_latencies):7.2f} ms, "
+              f"mean {statistics.mean(nx_latencies):7.2f} ms   "
+              f"csr: median {statistics.median(csr_latencies):7.2f} ms, "
+              f"mean {statistics.mean(csr_latencies):7.2f} ms")
+
+    print(f"identical results: {identical}")
+
+
+if __name__ == "__main__":
+    main()
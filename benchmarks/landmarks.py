@@ -0,0 +1,69 @@
+import random
+import statistics
+import sys
+import time
+from solver.problem_solver import load_schedule
+from solver.csr_graph import build_csr_graph, dijkstra_tree_csr, csr_tree_path
+from solver.landmarks import build_landmarks, astar_path_csr
+
+
+def dijkstra_search(graph, start, target, cost_attribute, stats):
+    tree = dijkstra_tree_csr(graph, start, cost_attribute, [target], stats)
+    return csr_tree_path(graph, tree, target)
+
+
+def run_queries(search, queries, cost_attribute):
+    """
+    Runs every query once and returns the per-query latencies in milliseconds, settled stations and costs.
+    """
+    latencies = []
+    settled = []
+    costs = []
+    for start, target in queries:
+        stats = {}
+        begin = time.perf_counter()
+        _, _, total_cost = search(start, target, cost_attribute, stats)
+        latencies.append((time.perf_counter() - begin) * 1000)
+        settled.append(stats['settled'])
+        costs.append(total_cost)
+    return latencies, settled, costs
+
+
+def main():
+    schedule_file = sys.argv[1] if len(sys.argv) > 1 else "data/schedule.csv"
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    n_landmarks = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+
+    graph = build_csr_graph(load_schedule(schedule_file))
+    begin = time.perf_counter()
+    landmarks = build_landmarks(graph, n_landmarks)
+    build_seconds = time.perf_counter() - begin
+    table_bytes = sum(table.nbytes for table in landmarks)
+
+    random.seed(0)
+    stations = list(graph.stations)
+    queries = [tuple(random.sample(stations, 2)) for _ in range(n_queries)]
+
+    print(f"schedule: {schedule_file} ({len(graph.stations)} stations, {len(graph.targets)} edges)")
+    print(f"{len(landmarks.landmarks)} landmarks: built in {build_seconds:.2f} s, "
+          f"tables {table_bytes / 2**20:.2f} MiB")
+
+    identical = True
+    for cost_attribute in ['stops', 'timeintrain']:
+        dijkstra_latencies, dijkstra_settled, dijkstra_costs = run_queries(
+            lambda start, target, cost, stats: dijkstra_search(graph, start, target, cost, stats),
+            queries, cost_attribute)
+        astar_latencies, astar_settled, astar_costs = run_queries(
+            lambda start, target, cost, stats: astar_path_csr(graph, landmarks, start, target, cost, stats),
+            queries, cost_attribute)
+        identical = identical and dijkstra_costs == astar_costs
+        print(f"{cost_attribute:11s} dijkstra: median {statistics.median(dijkstra_latencies):7.2f} ms, "
+              f"{statistics.mean(dijkstra_settled):8.1f} settled   "
+              f"a*: median {statistics.median(astar_latencies):7.2f} ms, "
+              f"{statistics.mean(astar_settled):8.1f} settled")
+
+    print(f"identical costs: {identical}")
+
+
+if __name__ == "__main__":
+    main()
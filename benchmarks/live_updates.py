@@ -0,0 +1,217 @@
+import argparse
+import random
+import tempfile
+import time
+from collections import Counter
+import numpy as np
+import pandas as pd
+from solver.problem_solver import load_schedule
+from solver.graph_builder import build_graph, expand_graph, expand_graph_sparse, collapse_parallel_edges
+from solver.costFunctions import solve_cost_function
+from solver.batch import ScheduleGraphs, apply_feed, _graph_kind
+from solver.result_cache import ResultCache
+from solver.connection_scan import build_timetable
+from solver.csr_graph import build_csr_graph
+from solver.updates import (Delta, FEED_COLUMNS, load_feed, TrainIndex, apply_to_schedule, train_legs,
+                            update_station_graph, update_collapsed_graph, update_expanded_graph, update_csr_graph,
+                            update_timetable)
+
+
+def random_feed(schedule_df: pd.DataFrame, n_deltas: int, seed: int = 0) -> list:
+    """
+    Draws delays of up to an hour, cancellations and skipped stops of random trains.
+    """
+    rng = random.Random(seed)
+    stops = schedule_df[['Train No.', 'islno']].astype({'Train No.': str}).itertuples(index=False)
+    islnos = {}
+    for train, islno in stops:
+        islnos.setdefault(train, []).append(int(islno))
+    trains = sorted(islnos)
+
+    feed = []
+    for _ in range(n_deltas):
+        train = rng.choice(trains)
+        kind = rng.choices(['delay', 'cancel', 'skip'], weights=[6, 1, 3])[0]
+        if kind == 'delay':
+            feed.append(Delta('delay', train, rng.choice(islnos[train]), rng.randrange(60, 3600, 60)))
+        elif kind == 'skip':
+            feed.append(Delta('skip', train, rng.choice(islnos[train])))
+        else:
+            feed.append(Delta('cancel', train))
+    return feed
+
+
+def edge_multiset(graph) -> Counter:
+    """
+    The edges of a graph with their attributes, ignoring insertion order and multigraph keys.
+    """
+    return Counter((u, v, tuple(sorted(data.items()))) for u, v, data in graph.edges(data=True))
+
+
+def array_edges(graph) -> list:
+    """
+    The edges of a CSRGraph or the connections of a Timetable, by station and train name, in order.
+    """
+    if hasattr(graph, 'offsets'):
+        sources = np.repeat(np.arange(len(graph.stations)), np.diff(graph.offsets))
+        columns = (sources, graph.targets, graph.train, graph.timeintrain, graph.fromislno, graph.toislno)
+    else:
+        columns = (graph.from_station, graph.to_station, graph.train, graph.departure, graph.from_islno,
+                   graph.to_islno)
+    from_stations, to_stations, trains, *rest = (np.asarray(column).tolist() for column in columns)
+    return list(zip([graph.stations[station] for station in from_stations],
+                    [graph.stations[station] for station in to_stations],
+                    [graph.trains[train] for train in trains], *rest))
+
+
+def replay_graphs(schedule_df: pd.DataFrame, feed: list, queries: list) -> bool:
+    """
+    Applies the feed to the networkx graphs in place and to the array-backed ones, and compares
+    them with graphs rebuilt from the updated schedule, edge by edge and by the costs of the queries.
+    """
+    # apply_to_schedule delays in place, and the caller's frame is kept as it was
+    schedule_df = schedule_df.copy()
+    graph = build_graph(schedule_df)
+    graphs = {
+        'station': graph,
+        'stops': collapse_parallel_edges(graph, 'stops'),
+        'timeintrain': collapse_parallel_edges(graph, 'timeintrain'),
+        'expanded': expand_graph(graph),
+        'sparse': expand_graph_sparse(graph),
+        'csr': build_csr_graph(schedule_df),
+        'timetable': build_timetable(schedule_df),
+    }
+
+    rows = TrainIndex(schedule_df)
+    seconds = Counter()
+    for delta in feed:
+        if delta.train not in rows:
+            continue
+        begin = time.perf_counter()
+        old_legs = train_legs(schedule_df, delta.train, rows[delta.train])
+        schedule_df, kept = apply_to_schedule(schedule_df, delta, rows[delta.train])
+        rows.keep(delta.train, kept)
+        new_legs = train_legs(schedule_df, delta.train, rows[delta.train])
+        seconds['schedule'] += time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        update_station_graph(graphs['station'], old_legs, new_legs)
+        seconds['station'] += time.perf_counter() - begin
+        for cost_function in ('stops', 'timeintrain'):
+            begin = time.perf_counter()
+            update_collapsed_graph(graphs[cost_function], graphs['station'], cost_function, old_legs, new_legs)
+            seconds[cost_function] += time.perf_counter() - begin
+        for kind in ('expanded', 'sparse'):
+            begin = time.perf_counter()
+            update_expanded_graph(graphs[kind], old_legs, new_legs, sparse=kind == 'sparse')
+            seconds[kind] += time.perf_counter() - begin
+        begin = time.perf_counter()
+        graphs['csr'] = update_csr_graph(graphs['csr'], old_legs, new_legs)
+        seconds['csr'] += time.perf_counter() - begin
+        begin = time.perf_counter()
+        graphs['timetable'] = update_timetable(graphs['timetable'], old_legs, new_legs)
+        seconds['timetable'] += time.perf_counter() - begin
+
+    rebuilt = {}
+    rebuild_seconds = {}
+    for kind, builder in [('csr', build_csr_graph), ('timetable', build_timetable)]:
+        begin = time.perf_counter()
+        rebuilt[kind] = builder(schedule_df)
+        rebuild_seconds[kind] = time.perf_counter() - begin
+    begin = time.perf_counter()
+    rebuilt['station'] = build_graph(schedule_df)
+    rebuild_seconds['station'] = time.perf_counter() - begin
+    for kind, builder in [('stops', lambda g: collapse_parallel_edges(g, 'stops')),
+                          ('timeintrain', lambda g: collapse_parallel_edges(g, 'timeintrain')),
+                          ('expanded', expand_graph), ('sparse', expand_graph_sparse)]:
+        begin = time.perf_counter()
+        rebuilt[kind] = builder(rebuilt['station'])
+        rebuild_seconds[kind] = time.perf_counter() - begin
+
+    print(f"  {'schedule':12s} update {seconds['schedule'] / len(feed) * 1000:8.2f} ms per delta")
+    identical = True
+    for kind, updated in graphs.items():
+        # Collapsed graphs may keep a different one of several equally cheap edges, so only costs are compared
+        same_edges = 'n/a'
+        if kind in ('csr', 'timetable'):
+            # The array graphs keep the builders' order too
+            same_edges = array_edges(updated) == array_edges(rebuilt[kind])
+            identical = identical and same_edges
+        elif kind not in ('stops', 'timeintrain'):
+            same_edges = edge_multiset(updated) == edge_multiset(rebuilt[kind])
+            identical = identical and same_edges
+        print(f"  {kind:12s} update {seconds[kind] / len(feed) * 1000:8.2f} ms per delta   "
+              f"rebuild {rebuild_seconds[kind] * 1000:9.2f} ms   same edges: {same_edges}")
+
+    mismatches = 0
+    for cost_function, kind in [('stops', 'stops'), ('timeintrain', 'timeintrain'),
+                                ('traveltime', 'expanded'), ('arrivaltime', 'expanded'),
+                                ('traveltime', 'sparse'), ('arrivaltime', 'sparse'),
+                                ('stops', 'csr'), ('timeintrain', 'csr'),
+                                ('traveltime', 'timetable'), ('arrivaltime', 'timetable')]:
+        for start, target, input_time in queries:
+            a = solve_cost_function(graphs[kind], start, target, schedule_df, cost_function, input_time)
+            b = solve_cost_function(rebuilt[kind], start, target, schedule_df, cost_function, input_time)
+            mismatches += (a if isinstance(a, str) else a[1]) != (b if isinstance(b, str) else b[1])
+    print(f"  query costs differing from the rebuilt graphs: {mismatches}")
+    return identical and mismatches == 0
+
+
+def replay_cache(schedule_file: str, feed: list, queries: list) -> bool:
+    """
+    Fills a result cache, applies the feed with apply_feed and checks every answer the cache still
+    gives against a fresh search on the updated graphs.
+    """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        schedules = {'schedule': ScheduleGraphs(schedule_file, cache_dir=cache_dir)}
+        cache = ResultCache(len(queries) * 4)
+        graphs = schedules['schedule']
+        for cost_function in ('stops', 'timeintrain', 'traveltime', 'arrivaltime'):
+            for start, target, input_time in queries:
+                cache.solve_many(graphs, graphs[_graph_kind(cost_function)], 'schedule', cost_function,
+                                 start, [target], input_time)
+        filled = len(cache)
+
+        begin = time.perf_counter()
+        apply_feed(schedules, feed, cache)
+        elapsed = time.perf_counter() - begin
+
+        stale = 0
+        for key in list(cache.entries):
+            _, start, target, cost_function, _ = key
+            input_time = next(when for s, t, when in queries if (s, t) == (start, target))
+            cached = cache.lookup(graphs, 'schedule', cost_function, start, target, input_time)
+            fresh = solve_cost_function(graphs[_graph_kind(cost_function)], start, target, graphs['schedule'],
+                                        cost_function, input_time)
+            stale += (cached if isinstance(cached, str) else cached[1]) != (fresh if isinstance(fresh, str) else fresh[1])
+    print(f"  result cache: {filled} entries, {cache.invalidations} invalidated, apply_feed {elapsed:.2f} s, "
+          f"stale answers among the {len(cache)} kept: {stale}")
+    return stale == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a delay/cancellation feed on the built graphs and check them against a rebuild.")
+    parser.add_argument('schedule')
+    parser.add_argument('feed', help="feed CSV with the columns " + ", ".join(FEED_COLUMNS))
+    parser.add_argument('--generate', type=int, metavar='N', help="first write a random feed of N deltas to FEED")
+    parser.add_argument('--queries', type=int, default=30)
+    args = parser.parse_args()
+
+    schedule_df = load_schedule(args.schedule)
+    if args.generate:
+        pd.DataFrame(random_feed(schedule_df, args.generate), columns=FEED_COLUMNS).to_csv(args.feed, index=False)
+    feed = load_feed(args.feed)
+
+    rng = random.Random(0)
+    stations = sorted(schedule_df['station Code'].unique())
+    queries = [(*rng.sample(stations, 2), rng.randrange(86400)) for _ in range(args.queries)]
+
+    print(f"schedule: {args.schedule} ({len(schedule_df)} rows), feed: {args.feed} ({len(feed)} deltas)")
+    ok = replay_graphs(schedule_df, feed, queries)
+    ok = replay_cache(args.schedule, feed, queries) and ok
+    print(f"consistent: {ok}")
+
+
+if __name__ == "__main__":
+    main()
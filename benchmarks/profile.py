@@ -0,0 +1,43 @@
+import random
+import sys
+import time
+from solver.problem_solver import load_schedule
+from solver.connection_scan import build_timetable, profile_scan, profile_arrival_time, scan_arrival_time
+
+
+def main():
+    schedule_file = sys.argv[1] if len(sys.argv) > 1 else "data/schedule.csv"
+    n_pairs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    times_per_pair = int(sys.argv[3]) if len(sys.argv) > 3 else 24
+
+    timetable = build_timetable(load_schedule(schedule_file))
+    rng = random.Random(0)
+    pairs = [tuple(rng.sample(timetable.stations, 2)) for _ in range(n_pairs)]
+    # Departure times of a timetable board: evenly spread over the day
+    departure_times = [hour * 86400 // times_per_pair for hour in range(times_per_pair)]
+
+    profile_seconds = scan_seconds = 0
+    journeys = mismatches = 0
+    for start, target in pairs:
+        begin = time.perf_counter()
+        profile = profile_scan(timetable, start, target)
+        answers = [profile_arrival_time(profile, departure_time)[1] for departure_time in departure_times]
+        profile_seconds += time.perf_counter() - begin
+        journeys += len(profile)
+
+        begin = time.perf_counter()
+        expected = [scan_arrival_time(timetable, start, target, departure_time)[1]
+                    for departure_time in departure_times]
+        scan_seconds += time.perf_counter() - begin
+        mismatches += sum(a != b for a, b in zip(answers, expected))
+
+    print(f"schedule: {schedule_file} ({len(timetable.departure)} connections), {n_pairs} station pairs, "
+          f"{times_per_pair} departure times each")
+    print(f"  profile_scan + binary search {profile_seconds / n_pairs * 1000:8.1f} ms per pair "
+          f"({journeys / n_pairs:.1f} journeys per profile)")
+    print(f"  scan_arrival_time per time   {scan_seconds / n_pairs * 1000:8.1f} ms per pair")
+    print(f"  answers differing: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
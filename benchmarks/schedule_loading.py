@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import pandas as pd
+
+# Runs one loader in a fresh interpreter and reports its wall time and the process's peak RSS
+MEASURE = """
+import json, resource, sys, time
+from solver.problem_solver import {loader}
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+schedule_df = {loader}(sys.argv[1])
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'rows': len(schedule_df), 'seconds': elapsed, 'peak_rss_kib': peak,
+                  'import_rss_kib': baseline,
+                  'frame_bytes': int(schedule_df.memory_usage(deep=True).sum())}}))
+"""
+
+LOADERS = ['read_and_preprocess_csv', 'load_schedule']
+
+
+def enlarge_schedule(schedule_file_path: str, factor: int, output_path: str):
+    """
+    Writes a schedule with every train repeated factor times under new train numbers.
+    """
+    schedule_df = pd.read_csv(schedule_file_path, dtype=str)
+    copies = []
+    for copy in range(factor):
+        copy_df = schedule_df.copy()
+        copy_df['Train No.'] = copy_df['Train No.'].str.replace(r"'?$", f"-{copy}'", regex=True)
+        copies.append(copy_df)
+    pd.concat(copies).to_csv(output_path, index=False)
+
+
+def measure(loader: str, schedule_file_path: str) -> dict:
+    """
+    Runs a loader in a subprocess so its peak RSS is not shared with other measurements.
+    """
+    output = subprocess.run(
+        [sys.executable, '-c', MEASURE.format(loader=loader), schedule_file_path],
+        check=True, capture_output=True, text=True, cwd=os.getcwd()).stdout
+    return json.loads(output)
+
+
+def main():
+    schedule_file = sys.argv[1] if len(sys.argv) > 1 else "data/schedule.csv"
+    factor = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    with tempfile.TemporaryDirectory() as tmp:
+        enlarged_file = os.path.join(tmp, f"schedule-x{factor}.csv")
+        enlarge_schedule(schedule_file, factor, enlarged_file)
+
+        for label, path in [(schedule_file, schedule_file), (f"{schedule_file} x{factor}", enlarged_file)]:
+            print(f"{label} ({os.path.getsize(path) / 2**20:.1f} MiB)")
+            for loader in LOADERS:
+                result = measure(loader, path)
+                print(f"  {loader:24s} {result['seconds']:7.3f} s   "
+                      f"peak RSS {result['peak_rss_kib'] / 1024:7.1f} MiB "
+                      f"(+{(result['peak_rss_kib'] - result['import_rss_kib']) / 1024:6.1f} MiB over imports)   "
+                      f"frame {result['frame_bytes'] / 2**20:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
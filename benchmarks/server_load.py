@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlencode
+from solver.problem_solver import load_problems_csv
+
+
+def percentile(values: list, fraction: float) -> float:
+    """
+    Nearest-rank percentile of a list of values.
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def query_targets(problems_file: str) -> list:
+    """
+    Turns the problems of a problems file into /solve request targets.
+    """
+    targets = []
+    for row in load_problems_csv(problems_file).itertuples(index=False):
+        query = {'from': row.FromStation, 'to': row.ToStation, 'cost': row.CostFunction, 'schedule': row.Schedule}
+        if row.CostFunction == 'arrivaltime':
+            query['time'] = row.input_time
+        targets.append('/solve?' + urlencode(query))
+    return targets
+
+
+async def request(reader, writer, host: str, target: str) -> dict:
+    """
+    Sends one GET request on a keep-alive connection and reads the JSON response.
+    """
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    await writer.drain()
+    await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    return json.loads(await reader.readexactly(length))
+
+
+async def client(host: str, port: int, targets: list, latencies: list):
+    """
+    Sends targets one after another over a single connection, recording each latency.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for target in targets:
+            begin = time.perf_counter()
+            await request(reader, writer, host, target)
+            latencies.append(time.perf_counter() - begin)
+    finally:
+        writer.close()
+
+
+async def run(host: str, port: int, targets: list, n_requests: int, concurrency: int):
+    targets = [targets[i % len(targets)] for i in range(n_requests)]
+    latencies = []
+
+    begin = time.perf_counter()
+    await asyncio.gather(*(client(host, port, targets[i::concurrency], latencies) for i in range(concurrency)))
+    elapsed = time.perf_counter() - begin
+
+    reader, writer = await asyncio.open_connection(host, port)
+    server_stats = await request(reader, writer, host, '/stats')
+    writer.close()
+
+    print(f"{len(latencies)} requests, {concurrency} concurrent clients: {len(latencies) / elapsed:.1f} requests/s")
+    print(f"client p50 {percentile(latencies, 0.50) * 1000:.2f} ms, p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"server {server_stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send the problems of a problems file to a running serve.py.")
+    parser.add_argument('problems', nargs='?', default='problems/problems.csv')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8973)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.host, args.port, query_targets(args.problems), args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
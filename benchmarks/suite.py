@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.synthetic_schedule import generate_schedule
+from solver.problem_solver import read_and_preprocess_csv, load_schedule
+from solver.graph_builder import (build_graph, expand_graph, expand_graph_sparse, adjust_start_times,
+                                  collapse_parallel_edges)
+from solver.connection_scan import build_timetable
+from solver.csr_graph import build_csr_graph, collapse_csr_graph
+from solver.costFunctions import solve_cost_function
+
+# Engines each cost function is timed on: (engine name, graph it runs on)
+QUERY_ENGINES = {
+    'stops': [('networkx', 'graph'), ('networkx-collapsed', 'collapsed'), ('csr', 'csr'),
+              ('csr-collapsed', 'csr-collapsed')],
+    'timeintrain': [('networkx', 'graph'), ('networkx-collapsed', 'collapsed'), ('csr', 'csr'),
+                    ('csr-collapsed', 'csr-collapsed')],
+    'traveltime': [('expanded', 'expanded'), ('sparse', 'sparse'), ('csa', 'timetable')],
+    'arrivaltime': [('expanded', 'expanded'), ('sparse', 'sparse'), ('csa', 'timetable')],
+}
+
+STAGES = ['read_and_preprocess_csv', 'load_schedule', 'build_graph', 'build_csr_graph', 'build_timetable',
+          'expand_graph', 'expand_graph_sparse', 'collapse_parallel_edges', 'collapse_csr_graph',
+          'adjust_start_times']
+
+
+def collapse_both(collapse, graph) -> dict:
+    """
+    Collapses a station graph for both station cost functions.
+    """
+    return {cost_function: collapse(graph, cost_function) for cost_function in ('stops', 'timeintrain')}
+
+
+def best_of(repeat: int, function, *args):
+    """
+    Runs function repeat times and returns its last result and the fastest wall time in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = function(*args)
+        timings.append(time.perf_counter() - begin)
+    return result, min(timings)
+
+
+def percentile(values: list, fraction: float) -> float:
+    """
+    Nearest-rank percentile of a list of values.
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def bench_schedule(name: str, schedule_file: str, stages: list, n_queries: int, repeat: int) -> list:
+    """
+    Times every build stage and every cost function engine on one schedule file.
+
+    Returns:
+        list: One result record per stage and per (cost function, engine)
+    """
+    records = []
+
+    def record(stage, seconds, **fields):
+        records.append({'schedule': name, 'stage': stage, 'seconds': seconds, **fields})
+        print(f"  {stage:40s} {seconds * 1000:10.2f} ms", flush=True)
+
+    # Build stages; later stages and the queries reuse the results
+    built = {}
+    schedule_df, seconds = best_of(repeat, read_and_preprocess_csv, schedule_file)
+    if 'read_and_preprocess_csv' in stages:
+        record('read_and_preprocess_csv', seconds, rows=len(schedule_df))
+    if 'load_schedule' in stages:
+        loaded_df, seconds = best_of(repeat, load_schedule, schedule_file)
+        record('load_schedule', seconds, rows=len(loaded_df))
+
+    builders = [
+        ('build_graph', 'graph', build_graph, lambda: schedule_df),
+        ('build_csr_graph', 'csr', build_csr_graph, lambda: schedule_df),
+        ('build_timetable', 'timetable', build_timetable, lambda: schedule_df),
+        ('expand_graph', 'expanded', expand_graph, lambda: built['graph']),
+        ('expand_graph_sparse', 'sparse', expand_graph_sparse, lambda: built['graph']),
+        ('collapse_parallel_edges', 'collapsed', lambda graph: collapse_both(collapse_parallel_edges, graph),
+         lambda: built['graph']),
+        ('collapse_csr_graph', 'csr-collapsed', lambda graph: collapse_both(collapse_csr_graph, graph),
+         lambda: built['csr']),
+    ]
+    # Stages whose input graph is built even if its own stage is not timed
+    needs = {'graph': {'expand_graph', 'expand_graph_sparse', 'collapse_parallel_edges'},
+             'csr': {'collapse_csr_graph'}}
+    for stage, kind, builder, source in builders:
+        if stage in stages or needs.get(kind, set()) & set(stages):
+            built[kind], seconds = best_of(repeat, builder, source())
+            if stage in stages:
+                record(stage, seconds)
+
+    # Queries go between stations that have departures, chosen with a fixed seed
+    rng = random.Random(0)
+    stations = sorted(schedule_df['station Code'].unique())
+    queries = [(*rng.sample(stations, 2), rng.randrange(86400)) for _ in range(n_queries)] if len(stations) > 1 else []
+
+    if 'adjust_start_times' in stages and 'expanded' in built and queries:
+        start, _, input_time = queries[0]
+        _, seconds = best_of(repeat, adjust_start_times, built['expanded'], start, input_time)
+        record('adjust_start_times', seconds)
+
+    for cost_function, engines in QUERY_ENGINES.items():
+        for engine, kind in engines:
+            if kind not in built or not queries:
+                continue
+            # Collapsed graphs are built per cost function
+            graph = built[kind][cost_function] if isinstance(built[kind], dict) else built[kind]
+            latencies = []
+            found = 0
+            for start, target, input_time in queries:
+                begin = time.perf_counter()
+                result = solve_cost_function(
+                    graph, start, target, schedule_df, cost_function, input_time)
+                latencies.append(time.perf_counter() - begin)
+                found += not isinstance(result, str)
+            record(f"{cost_function}/{engine}", statistics.median(latencies), cost_function=cost_function,
+                   engine=engine, queries=len(latencies), found=found,
+                   p95_seconds=percentile(latencies, 0.95), total_seconds=sum(latencies))
+
+    return records
+
+
+def environment() -> dict:
+    """
+    Describes the machine and revision the results were measured on.
+    """
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'cpus': os.cpu_count(), 'revision': revision, 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def compare(records: list, baseline_file: str, tolerance: float) -> list:
+    """
+    Compares results against a previous results file.
+
+    Returns:
+        list: (schedule, stage, baseline seconds, seconds) for every result slower than the baseline
+        by more than the tolerance (a fraction)
+    """
+    with open(baseline_file) as fp:
+        baseline = {(r['schedule'], r['stage']): r['seconds'] for r in json.load(fp)['results']}
+
+    regressions = []
+    for r in records:
+        before = baseline.get((r['schedule'], r['stage']))
+        if before is not None and r['seconds'] > before * (1 + tolerance):
+            regressions.append((r['schedule'], r['stage'], before, r['seconds']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the build stages and the cost functions on schedule files.")
+    parser.add_argument('schedules', nargs='*', default=['data/mini-schedule.csv', 'data/schedule.csv'],
+                        help="schedule CSV files to benchmark")
+    parser.add_argument('--synthetic', type=int, action='append', default=[], metavar='TRAINS',
+                        help="also benchmark a generated schedule with this many trains (repeatable)")
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES,
+                        help="build stages to run; queries run on whatever graphs these build")
+    parser.add_argument('--queries', type=int, default=50, help="queries per cost function and engine")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per build stage; the fastest is kept")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', help="results JSON of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="slowdown over the baseline reported as a regression (default 0.25 = 25%%)")
+    args = parser.parse_args()
+
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        schedule_files = [(os.path.basename(path), path) for path in args.schedules]
+        for n_trains in args.synthetic:
+            path = os.path.join(tmp, f"synthetic-{n_trains}.csv")
+            generate_schedule(path, n_stations=max(50, n_trains // 2), n_trains=n_trains)
+            schedule_files.append((f"synthetic-{n_trains}", path))
+
+        for name, path in schedule_files:
+            print(f"{name} ({os.path.getsize(path) / 2**20:.1f} MiB)", flush=True)
+            records.extend(bench_schedule(name, path, args.stages, args.queries, args.repeat))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump({'environment': environment(), 'results': records}, fp, indent=2)
+
+    if args.baseline:
+        regressions = compare(records, args.baseline, args.tolerance)
+        for schedule, stage, before, after in regressions:
+            print(f"REGRESSION {schedule} {stage}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import csv
+import random
+
+# Column layout of data/schedule.csv
+COLUMNS = [
+    'Train No.', 'train Name', 'islno', 'station Code', 'Station Name', 'Arrival time', 'Departure time',
+    'Distance', 'Source Station Code', 'source Station Name', 'Destination station Code',
+    'Destination Station Name'
+]
+
+
+def format_time(seconds: int) -> str:
+    """
+    Formats seconds as the quoted "'HH:MM:SS'" times used in the schedule, wrapping past midnight.
+    """
+    seconds %= 86400
+    return f"'{seconds // 3600:02}:{seconds % 3600 // 60:02}:{seconds % 60:02}'"
+
+
+def generate_schedule(file_path: str, n_stations: int = 1000, n_trains: int = 2000,
+                      max_stops: int = 30, seed: int = 0):
+    """
+    Writes a random schedule in the format of data/schedule.csv.
+
+    Every train visits between 2 and max_stops distinct stations. Trains start at random times,
+    dwell a few minutes per stop and run for minutes to hours between stops, so journeys cross
+    midnight like in the real data. A small share of hub stations is visited far more often,
+    to get the busy junctions of the real network.
+    """
+    rng = random.Random(seed)
+    stations = [f"S{i:05}" for i in range(n_stations)]
+    hubs = stations[:max(1, n_stations // 50)]
+
+    with open(file_path, 'w', newline='') as fp:
+        writer = csv.writer(fp)
+        writer.writerow(COLUMNS)
+        for train in range(n_trains):
+            n_stops = rng.randint(2, max_stops)
+            route = rng.sample(stations, n_stops)
+            # Route some stops through hubs
+            for i in range(n_stops):
+                if rng.random() < 0.2:
+                    hub = rng.choice(hubs)
+                    if hub not in route:
+                        route[i] = hub
+
+            train_no = f"'{10000 + train}'"
+            time = rng.randrange(0, 86400, 60)
+            distance = 0
+            for islno, station in enumerate(route, start=1):
+                arrival = time
+                departure = arrival + rng.choice([0, 60, 120, 300, 600])
+                writer.writerow([
+                    train_no, f"TRAIN {train}", islno, station, f"STATION {station}",
+                    format_time(arrival), format_time(departure), distance,
+                    route[0], f"STATION {route[0]}", route[-1], f"STATION {route[-1]}"
+                ])
+                time = departure + rng.randrange(300, 4 * 3600, 60)
+                distance += rng.randint(5, 200)
+
+
+def generate_problems(file_path: str, schedule_file_path: str, schedule_name: str, n_problems: int = 100,
+                      seed: int = 0):
+    """
+    Writes a problems file in the format of problems/problems.csv with random station pairs
+    from a schedule, cycling through the four cost functions.
+    """
+    rng = random.Random(seed)
+    with open(schedule_file_path, newline='') as fp:
+        stations = sorted({row['station Code'].strip() for row in csv.DictReader(fp)})
+
+    cost_functions = ['stops', 'timeintrain', 'traveltime', 'arrivaltime']
+    with open(file_path, 'w', newline='') as fp:
+        writer = csv.writer(fp)
+        writer.writerow(['ProblemNo', 'FromStation', 'ToStation', 'Schedule', 'CostFunction'])
+        for problem_no in range(1, n_problems + 1):
+            from_station, to_station = rng.sample(stations, 2)
+            cost_function = cost_functions[problem_no % len(cost_functions)]
+            if cost_function == 'arrivaltime':
+                cost_function += ' ' + format_time(rng.randrange(86400)).strip("'")
+            writer.writerow([problem_no, from_station, to_station, schedule_name, cost_function])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic schedule in the schedule.csv format.")
+    parser.add_argument('output', help="schedule CSV to write")
+    parser.add_argument('--stations', type=int, default=1000)
+    parser.add_argument('--trains', type=int, default=2000)
+    parser.add_argument('--max-stops', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--problems', help="also write a problems CSV for the schedule to this path")
+    parser.add_argument('--n-problems', type=int, default=100)
+    args = parser.parse_args()
+
+    generate_schedule(args.output, args.stations, args.trains, args.max_stops, args.seed)
+    if args.problems:
+        generate_problems(args.problems, args.output, 'schedule.csv', args.n_problems, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
-from solver.problem_solver import load_problems_csv, read_and_preprocess_csv, create_solutions_csv
-from solver.costFunctions import solve_cost_function
-from solver.graph_builder import build_graph, expand_graph, adjust_start_times
+from solver.problem_solver import load_problems_csv, create_solutions_csv
+from solver.batch import load_schedules, solve_problems, default_workers, apply_feed
+from solver.updates import load_feed
 
 
 def main():
@@ -8,54 +8,38 @@ def main():
     problems_file = "problems/problems.csv"
     mini_schedule_file = "data/mini-schedule.csv"
     schedule_file = "data/schedule.csv"         # File containing schedule data
-
-    # Load and preprocess the problem
+    # 'csr' answers stops/timeintrain on the array-backed station graph, 'alt' on it by A* with landmark
+    # lower bounds, 'networkx' on the MultiDiGraph
+    station_engine = 'csr'
+    # 'csa' answers arrivaltime/traveltime by connection scan, 'expanded' by Dijkstra on the expanded graph,
+    # 'sparse' by Dijkstra on the expanded graph with chained waiting edges instead of all transfer pairs
+    timetable_engine = 'csa'
+    # Worker processes for solving the problems; 1 solves them in this process
+    workers = default_workers()
+    # Results kept per worker process for repeated queries; 0 disables the cache
+    cache_size = 10000
+    # Delays, cancellations and skipped stops applied to the schedules before solving (see solver/updates.py);
+    # None solves on the schedule files as they are
+    feed_file = None
+    # JSON lines trace of the run: graph build times and sizes, and per problem the search time, nodes settled,
+    # edges relaxed and heap pushes (see solve_problems); None collects no stats
+    trace_file = None
+
+    # Load and preprocess the problem; schedules and graphs come from the on-disk cache
+    # and are only rebuilt when the schedule file or the builders change. They are registered
+    # lazily: solve_problems only loads the (schedule, graph) pairs the problems need
     problems_df = load_problems_csv(problems_file)
-    mini_schedule_df = read_and_preprocess_csv(mini_schedule_file)
-    schedule_df = read_and_preprocess_csv(schedule_file)
-
-    # build Graph from data
-    graph = build_graph(schedule_df)
-    mini_graph = build_graph(mini_schedule_df)
-    expanded_mini_graph = expand_graph(mini_graph)
-    expanded_graph = expand_graph(graph)
-
-    solutions = {'ProblemNo': [], 'Connection': [], 'Cost': []}
-
-    cost_functions = [
-        ('stops', mini_graph, graph),
-        ('timeintrain', mini_graph, graph),
-        ('arrivaltime', expanded_mini_graph, expanded_graph),
-        ('traveltime', expanded_mini_graph, expanded_graph)
-    ]
-
-    # Iterate through all problems
-    for cost_function, mini_g, full_g in cost_functions:
-        rslt_df = problems_df.loc[(
-            problems_df['CostFunction'] == cost_function)]
-
-        for _, row in rslt_df.iterrows():
-            if row['Schedule'] == 'mini-schedule.csv':
-                df = mini_schedule_df
-                G = mini_g
-            else:
-                df = schedule_df
-                G = full_g
-
-            if cost_function == 'arrivaltime':
-                G = adjust_start_times(
-                    G, row['FromStation'], row['input_time'])
-                connection, cost = solve_cost_function(
-                    G, row['FromStation'], row['ToStation'], df, cost_function, row['input_time']
-                )
-            else:
-                connection, cost = solve_cost_function(
-                    G, row['FromStation'], row['ToStation'], df, cost_function
-                )
-
-            solutions['ProblemNo'].append(row['ProblemNo'])
-            solutions['Connection'].append(connection)
-            solutions['Cost'].append(cost)
+    schedules = load_schedules(
+        {'mini-schedule.csv': mini_schedule_file, 'schedule.csv': schedule_file},
+        station_engine, timetable_engine, lazy=True)
+    if feed_file is not None:
+        apply_feed(schedules, load_feed(feed_file))
+
+    # Solve all problems of the supported cost functions; the problems are independent,
+    # so they are spread over a pool of worker processes sharing the graphs built above
+    cost_functions = ['stops', 'timeintrain', 'arrivaltime', 'traveltime']
+    problems_df = problems_df.loc[problems_df['CostFunction'].isin(cost_functions)]
+    solutions = solve_problems(problems_df, schedules, workers, cache_size=cache_size, trace_file=trace_file)
 
     create_solutions_csv(solutions, 'solutions/solutions.csv')
 
@@ -0,0 +1,34 @@
+import argparse
+import asyncio
+from solver.batch import load_schedules, default_workers
+from solver.server import QueryServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer connection queries over HTTP on warm graphs.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8973)
+    parser.add_argument('--workers', type=int, default=default_workers(),
+                        help="worker processes running the searches; 1 runs them in this process")
+    parser.add_argument('--cache-size', type=int, default=10000, help="results kept in the LRU cache; 0 disables it")
+    parser.add_argument('--mini-schedule', default='data/mini-schedule.csv')
+    parser.add_argument('--schedule', default='data/schedule.csv')
+    parser.add_argument('--station-engine', default='csr', choices=['csr', 'alt', 'networkx'])
+    parser.add_argument('--timetable-engine', default='csa', choices=['csa', 'sparse', 'expanded'])
+    args = parser.parse_args()
+
+    # Graphs are loaded once, before the server accepts connections
+    schedules = load_schedules(
+        {'mini-schedule.csv': args.mini_schedule, 'schedule.csv': args.schedule},
+        args.station_engine, args.timetable_engine)
+
+    server = QueryServer(schedules, args.workers, args.cache_size)
+    try:
+        asyncio.run(server.run(args.host, args.port, ready=lambda address: print(
+            f"Serving on http://{address[0]}:{address[1]} with {args.workers} worker(s)", flush=True)))
+    except KeyboardInterrupt:
+        print(f"Stopped: {server.stats.summary()}, cache {server.cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+import heapq
+from itertools import count
+from solver.instrumentation import add_counts
+from solver.utils import time_difference_seconds
+
+# Fields of a search label, kept as plain tuples for speed. A label is the end of a journey, from
+# a node to the target; NEXT links it to the label it was extended from, one step closer to the target
+COST, NODE, NEXT, LEG, TRANSFERS, STATIONS, ENTRY = range(7)
+
+
+class _ShortestPathTree:
+    """
+    Cost of the cheapest path from the source to nodes, from a Dijkstra search over an adjacency
+    (graph.succ) that only settles as many nodes as it is asked for.
+    """
+
+    def __init__(self, adjacency, source, edge_cost):
+        self.adjacency = adjacency
+        self.edge_cost = edge_cost  # Cost of the edge data from a node to one neighbor: edge_cost(node, edges)
+        self.costs = {source: 0}
+        self.settled = {}
+        self.priority_queue = [(0, source)]
+        self.relaxed = 0
+        self.pushes = 0
+
+    def bound(self, node):
+        """
+        The cost of node if it is settled, else a lower bound: the cost of the search frontier.
+        Infinity once the search is exhausted without reaching node.
+        """
+        if node in self.settled:
+            return self.settled[node]
+        return self.priority_queue[0][0] if self.priority_queue else float('infinity')
+
+    def settle(self, node, limit):
+        """
+        Continues the search until node is settled or the frontier costs more than limit.
+        """
+        infinity = float('infinity')
+        while node not in self.settled and self.priority_queue and self.priority_queue[0][0] <= limit:
+            current_cost, current_node = heapq.heappop(self.priority_queue)
+            if current_cost > self.costs[current_node]:
+                continue
+            self.settled[current_node] = current_cost
+
+            neighbors = self.adjacency[current_node]
+            self.relaxed += len(neighbors)
+            for neighbor, edges in neighbors.items():
+                travel_cost = current_cost + self.edge_cost(current_node, edges)
+                if travel_cost < self.costs.get(neighbor, infinity):
+                    self.costs[neighbor] = travel_cost
+                    heapq.heappush(self.priority_queue, (travel_cost, neighbor))
+                    self.pushes += 1
+
+    def add_counts(self, stats: dict):
+        add_counts(stats, settled=len(self.settled), relaxed=self.relaxed, pushes=self.pushes)
+
+
+def _next_label(priority_queue: list, tree: _ShortestPathTree, tie) -> tuple:
+    """
+    Pops the label to extend next, or None once the queue is empty.
+
+    A label is queued by its cost plus a lower bound of the cost from the source to its node.
+    Before it is extended the tree is grown until the bound is exact or no longer the smallest in
+    the queue; a label whose bound grew is queued again.
+    """
+    infinity = float('infinity')
+    while priority_queue:
+        key, transfers, _, label = heapq.heappop(priority_queue)
+        node = label[NODE]
+        if node not in tree.settled:
+            tree.settle(node, priority_queue[0][0] - label[COST] if priority_queue else infinity)
+        bound = tree.bound(node)
+        if bound == infinity:
+            continue
+        if label[COST] + bound > key:
+            heapq.heappush(priority_queue, (label[COST] + bound, transfers, next(tie), label))
+            continue
+        return label
+    return None
+
+
+def _visited(stations: tuple, station) -> bool:
+    """
+    Whether a station is on the (station, later stations) chain of a label.
+    """
+    while stations is not None:
+        if stations[0] == station:
+            return True
+        stations = stations[1]
+    return False
+
+
+def _labels(label: tuple) -> list:
+    """
+    The labels from label on to the target, in journey order.
+    """
+    labels = []
+    while label is not None:
+        labels.append(label)
+        label = label[NEXT]
+    return labels
+
+
+def k_shortest_paths(graph, start, target, cost_attribute, k, max_transfers=None, stats=None) -> list:
+    """
+    The k cheapest journeys from start to target in a MultiDiGraph from build_graph, each a distinct
+    sequence of train legs that passes no station twice.
+
+    The shortest-path tree of start, the one dijkstra_path grows, gives the cost from start to the
+    stations. Journeys are built backwards from target, extending the cheapest partial journey by
+    its cost plus the cost from start to where it begins. That cost is exact, so the search runs
+    straight along a cheapest path and only the deviations from it (the sidetracks of Eppstein's
+    algorithm) wait in the queue. The tree is shared by all alternatives and only grown as far as
+    the partial journeys need (see _next_label); no search is restarted per alternative, as in
+    Yen's algorithm. Of equally costly partial journeys the one with fewer transfers is extended first.
+
+    Parameters:
+        graph (nx.MultiDiGraph): The station graph to search.
+        start (str), target (str): The stations of the query.
+        cost_attribute (str): The edge cost to use ('stops' or 'timeintrain').
+        k (int): Number of journeys to return at most.
+        max_transfers (int): If given, journeys changing trains more often are left out.
+        stats (dict): If given, the numbers of nodes and labels settled, edges relaxed and heap pushes
+            of the tree and the enumeration are added to it.
+
+    Returns:
+        list: (station_sequence, leg_sequence, total_cost) per journey, cheapest first, where
+        leg_sequence holds one (train, fromislno, toislno) per edge; empty if target is unreachable
+    """
+    if start not in graph or target not in graph or start == target or k <= 0:
+        return []
+    tree = _ShortestPathTree(
+        graph.succ, start, lambda node, edges: min(attribute[cost_attribute] for attribute in edges.values()))
+    infinity = float('infinity')
+
+    tie = count()
+    priority_queue = [(0, 0, next(tie), (0, target, None, None, 0, (target, None), None))]
+    journeys = []
+    settled = relaxed = pushes = 0
+
+    while len(journeys) < k:
+        label = _next_label(priority_queue, tree, tie)
+        if label is None:
+            break
+        settled += 1
+        cost, station, _, leg, transfers, stations, _ = label
+        if station == start:
+            labels = _labels(label)
+            journeys.append(([step[NODE] for step in labels], [step[LEG] for step in labels[:-1]], cost))
+            continue
+
+        for neighbor, edges in graph.pred[station].items():
+            bound = tree.bound(neighbor)
+            if bound == infinity or _visited(stations, neighbor):
+                continue
+            relaxed += len(edges)
+            for attribute in edges.values():
+                # Staying on a train continues from the stop its earlier leg arrived at
+                next_transfers = transfers + (
+                    leg is not None and (attribute['train'] != leg[0] or attribute['toislno'] != leg[1]))
+                if max_transfers is not None and next_transfers > max_transfers:
+                    continue
+                next_cost = cost + attribute[cost_attribute]
+                next_leg = (attribute['train'], attribute['fromislno'], attribute['toislno'])
+                heapq.heappush(priority_queue, (
+                    next_cost + bound, next_transfers, next(tie),
+                    (next_cost, neighbor, label, next_leg, next_transfers, (neighbor, stations), None)))
+                pushes += 1
+
+    tree.add_counts(stats)
+    add_counts(stats, settled=settled, relaxed=relaxed, pushes=pushes)
+    return journeys
+
+
+def k_shortest_paths_expanded_graph(graph, start, target, k, departure_time=None, max_transfers=None,
+                                    stats=None) -> list:
+    """
+    The k cheapest journeys from start to target in an expanded graph from expand_graph or
+    expand_graph_sparse, each a distinct sequence of train legs that passes no station twice.
+
+    The search works like k_shortest_paths, on the tree of the start station's virtual start node
+    that dijkstra_path_expanded_graph grows. In a sparse graph a stay at a station never waits
+    along the whole waiting chain back to where it entered it, so no journey repeats another one
+    day later.
+
+    Parameters:
+        graph (nx.DiGraph): The expanded graph to search.
+        start (str), target (str): The stations of the query.
+        k (int): Number of journeys to return at most.
+        departure_time (int): Optional earliest departure in seconds since midnight; the waits at the
+            start station are then counted, as in dijkstra_path_expanded_graph ('arrivaltime').
+        max_transfers (int): If given, journeys changing trains more often are left out.
+        stats (dict): If given, the numbers of nodes and labels settled, edges relaxed and heap pushes
+            of the tree and the enumeration are added to it.
+
+    Returns:
+        list: (node_sequence, total_cost) per journey, cheapest first; empty if target is unreachable
+    """
+    start_node = (start, '0', -1, 'start')
+    end_node = (target, '0', -1, 'end')
+    if start_node not in graph or end_node not in graph or start == target or k <= 0:
+        return []
+
+    def edge_cost(node, attribute):
+        if departure_time is not None and node == start_node:
+            # Wait at the start station until this departure
+            return time_difference_seconds(departure_time, attribute['departuretime'])
+        return attribute['time']
+
+    tree = _ShortestPathTree(graph.succ, start_node, edge_cost)
+    infinity = float('infinity')
+
+    tie = count()
+    # LEG is the departure node of the next train leg, ENTRY the waiting node a stay at a station
+    # was left from
+    priority_queue = [(0, 0, next(tie), (0, end_node, None, None, 0, (target, None), None))]
+    journeys = []
+    settled = relaxed = pushes = 0
+
+    while len(journeys) < k:
+        label = _next_label(priority_queue, tree, tie)
+        if label is None:
+            break
+        settled += 1
+        cost, node, _, next_departure, transfers, stations, entry = label
+        if node == start_node:
+            journeys.append(([step[NODE] for step in _labels(label)], cost))
+            continue
+
+        predecessors = graph.pred[node]
+        relaxed += len(predecessors)
+        for neighbor, attribute in predecessors.items():
+            bound = tree.bound(neighbor)
+            if bound == infinity:
+                continue
+            # A journey leaves the start station only once
+            if node[0] == start and node[3] == 'dep' and neighbor != start_node:
+                continue
+
+            next_transfers, next_stations, next_entry = transfers, stations, entry
+            leg = neighbor[3] == 'dep' and node[3] == 'arr'
+            if leg:
+                if _visited(stations, neighbor[0]):
+                    continue
+                # Staying on a train continues from the stop it arrived at
+                next_transfers += next_departure is not None and (
+                    node[1] != next_departure[1] or node[2] != next_departure[2])
+                if max_transfers is not None and next_transfers > max_transfers:
+                    continue
+                next_stations = (neighbor[0], stations)
+            elif neighbor[3] == 'wait':
+                if node[3] == 'dep':
+                    next_entry = neighbor
+                elif neighbor == entry:
+                    continue
+
+            next_cost = cost + edge_cost(neighbor, attribute)
+            heapq.heappush(priority_queue, (
+                next_cost + bound, next_transfers, next(tie),
+                (next_cost, neighbor, label, neighbor if leg else next_departure, next_transfers, next_stations,
+                 next_entry)))
+            pushes += 1
+
+    tree.add_counts(stats)
+    add_counts(stats, settled=settled, relaxed=relaxed, pushes=pushes)
+    return journeys
@@ -0,0 +1,416 @@
+import multiprocessing
+import os
+import time
+from collections.abc import Mapping
+import pandas as pd
+from solver.costFunctions import solve_cost_function_many, solve_profile, solve_pareto
+from solver.problem_solver import load_schedule
+from solver.graph_builder import build_graph, expand_graph, expand_graph_sparse, collapse_parallel_edges
+from solver.connection_scan import Timetable, build_timetable
+from solver.csr_graph import CSRGraph, build_csr_graph, collapse_csr_graph
+from solver.landmarks import ALTGraph, build_landmarks
+from solver.graph_cache import load_or_build, DEFAULT_CACHE_DIR
+from solver.result_cache import ResultCache
+from solver.instrumentation import timer, peak_rss_mib, write_json_lines
+from solver.updates import (Delta, TrainIndex, apply_to_schedule, train_legs, lowers_costs, update_station_graph,
+                            update_collapsed_graph, update_csr_graph, update_collapsed_csr_graph, update_timetable,
+                            update_expanded_graph, cache_scope)
+
+# Graphs of the running batch; set in the parent before the pool starts so forked workers
+# inherit them copy-on-write instead of receiving a pickled copy per task
+_schedules = {}
+# Results of earlier searches in this process, or None to always search
+_result_cache = None
+
+
+def _graph_kind(cost_function: str) -> str:
+    """
+    Names the graph a cost function is answered on: 'stops' and 'timeintrain' each have their own
+    station graph with the parallel edges collapsed.
+    """
+    return cost_function if cost_function in ('stops', 'timeintrain') else 'timetable'
+
+
+def graph_size(graph) -> dict:
+    """
+    The size of a schedule DataFrame or graph of any engine, as reported in traces.
+    """
+    if isinstance(graph, pd.DataFrame):
+        return {'rows': len(graph)}
+    if isinstance(graph, ALTGraph):
+        return {**graph_size(graph.graph), 'landmarks': len(graph.landmarks.landmarks)}
+    if isinstance(graph, CSRGraph):
+        return {'nodes': len(graph.stations), 'edges': len(graph.targets)}
+    if isinstance(graph, Timetable):
+        return {'nodes': len(graph.stations), 'connections': len(graph.departure)}
+    return {'nodes': graph.number_of_nodes(), 'edges': graph.number_of_edges()}
+
+
+class ScheduleGraphs(Mapping):
+    """
+    The schedule DataFrame and graphs of one schedule file, each loaded or built through the on-disk
+    cache on first access and kept from then on.
+
+    Keys are 'schedule', 'station', 'stops', 'timeintrain' and 'timetable'. 'stops' and
+    'timeintrain' are the station graph reduced to the cheapest edge per station pair for that cost
+    function; the graph types depend on the engines, see load_schedules. apply_delta changes the
+    schedule and every graph built from it.
+
+    stats records, per kind, the seconds it took to load or build (including the graphs it is
+    built from, when they were first needed then) and its graph_size.
+    """
+    KINDS = ('schedule', 'station', 'stops', 'timeintrain', 'timetable')
+
+    def __init__(self, path: str, station_engine: str = 'csr', timetable_engine: str = 'csa',
+                 cache_dir: str = DEFAULT_CACHE_DIR):
+        self.path = path
+        self.station_engine = station_engine
+        self.timetable_engine = timetable_engine
+        self.cache_dir = cache_dir
+        self.built = {}
+        self.stats = {}
+        self.deltas = []  # Deltas applied since the schedule file was loaded
+        self.train_rows = None  # TrainIndex of the schedule, made by the first apply_delta
+
+    def __getitem__(self, kind: str):
+        if kind not in self.built:
+            if kind not in self.KINDS:
+                raise KeyError(kind)
+            begin = time.perf_counter()
+            self.built[kind] = self._build(kind)
+            self.stats[kind] = {'seconds': time.perf_counter() - begin, **graph_size(self.built[kind])}
+        return self.built[kind]
+
+    def __iter__(self):
+        return iter(self.KINDS)
+
+    def __len__(self):
+        return len(self.KINDS)
+
+    def _cached(self, kind: str, builder):
+        # Once deltas are applied the schedule file no longer describes the graphs
+        if self.deltas:
+            return builder()
+        return load_or_build(self.path, kind, builder, self.cache_dir)
+
+    def apply_delta(self, delta: Delta) -> bool:
+        """
+        Applies a delta to the schedule and to the graphs built so far.
+
+        The train's rows are found through train_rows, and only those are changed. The graphs
+        are updated touching only the train's edges: the networkx graphs (station, collapsed and
+        expanded) in place, including the transfers at the train's stations, the CSRGraphs by
+        rewriting the edges of the stations the train leaves and the Timetable by moving only the
+        train's changed connections. The landmarks are built again only if the delta can make a
+        journey cheaper, as their distances then no longer bound the costs.
+
+        Returns:
+            bool: False if the schedule has no such train
+        """
+        schedule_df = self['schedule']
+        if self.train_rows is None:
+            self.train_rows = TrainIndex(schedule_df)
+        if delta.train not in self.train_rows:
+            return False
+        if 'stops' in self.built or 'timeintrain' in self.built:
+            # The collapsed graphs are updated from the station graph; when they came from the
+            # cache it may not be built yet, and must be built from the schedule before the change
+            self['station']
+        rows = self.train_rows[delta.train]
+        old_legs = train_legs(schedule_df, delta.train, rows)
+        schedule_df, kept = apply_to_schedule(schedule_df, delta, rows)
+        self.train_rows.keep(delta.train, kept)
+        new_legs = train_legs(schedule_df, delta.train, self.train_rows[delta.train])
+        self.built['schedule'] = schedule_df
+        self.deltas.append(delta)
+
+        if self.station_engine == 'networkx':
+            if 'station' in self.built:
+                update_station_graph(self.built['station'], old_legs, new_legs)
+            for cost_function in ('stops', 'timeintrain'):
+                if cost_function in self.built:
+                    update_collapsed_graph(self.built[cost_function], self.built['station'], cost_function,
+                                           old_legs, new_legs)
+        elif 'station' in self.built:
+            self.built['station'] = update_csr_graph(self.built['station'], old_legs, new_legs)
+            landmarks = None
+            for cost_function in ('stops', 'timeintrain'):
+                if cost_function not in self.built:
+                    continue
+                graph = self.built[cost_function]
+                reduced = graph.graph if isinstance(graph, ALTGraph) else graph
+                reduced = update_collapsed_csr_graph(reduced, self.built['station'], cost_function, old_legs, new_legs)
+                if isinstance(graph, ALTGraph):
+                    if landmarks is None:
+                        landmarks = graph.landmarks
+                        if lowers_costs(old_legs, new_legs):
+                            landmarks = build_landmarks(self.built['station'])
+                    reduced = ALTGraph(reduced, landmarks)
+                self.built[cost_function] = reduced
+
+        if 'timetable' in self.built:
+            if self.timetable_engine == 'csa':
+                self.built['timetable'] = update_timetable(self.built['timetable'], old_legs, new_legs)
+            else:
+                update_expanded_graph(self.built['timetable'], old_legs, new_legs, self.timetable_engine == 'sparse')
+        return True
+
+    def _build(self, kind: str):
+        if kind == 'schedule':
+            return self._cached('schedule', lambda: load_schedule(self.path))
+
+        if kind == 'station':
+            if self.station_engine in ('csr', 'alt'):
+                return self._cached('csr', lambda: build_csr_graph(self['schedule']))
+            return self._cached('graph', lambda: build_graph(self['schedule']))
+
+        if kind in ('stops', 'timeintrain'):
+            if self.station_engine == 'networkx':
+                return self._cached(f"graph-{kind}", lambda: collapse_parallel_edges(self['station'], kind))
+            reduced = collapse_csr_graph(self['station'], kind)
+            if self.station_engine == 'alt':
+                # Collapsing keeps the cheapest edges, so the landmark costs hold for the reduced graphs too
+                return ALTGraph(reduced, self._cached('landmarks', lambda: build_landmarks(self['station'])))
+            return reduced
+
+        if self.timetable_engine == 'csa':
+            return self._cached('timetable', lambda: build_timetable(self['schedule']))
+        if self.timetable_engine == 'sparse':
+            return self._cached('sparse', lambda: expand_graph_sparse(build_graph(self['schedule'])))
+        return self._cached('expanded', lambda: expand_graph(build_graph(self['schedule'])))
+
+
+def load_schedules(schedule_files: dict, station_engine: str = 'csr', timetable_engine: str = 'csa',
+                   cache_dir: str = DEFAULT_CACHE_DIR, lazy: bool = False) -> dict:
+    """
+    Registers every schedule with the graphs its problems are answered on, through the on-disk cache.
+
+    Parameters:
+        schedule_files (dict): Schedule name as used in problem files -> schedule CSV path.
+        station_engine (str): 'csr' for the array-backed station graph, 'alt' for it with landmarks for
+            A* search, 'networkx' for the MultiDiGraph.
+        timetable_engine (str): 'csa' for a Timetable, 'sparse' or 'expanded' for an expanded graph.
+        cache_dir (str): Directory of the graph cache.
+        lazy (bool): Only load or build each graph when it is first used, instead of all of them now.
+
+    Returns:
+        dict: Schedule name -> ScheduleGraphs
+    """
+    schedules = {}
+    for name, path in schedule_files.items():
+        schedules[name] = ScheduleGraphs(path, station_engine, timetable_engine, cache_dir)
+        if not lazy:
+            for kind in ScheduleGraphs.KINDS:
+                schedules[name][kind]
+    return schedules
+
+
+def apply_feed(schedules: dict, feed: list, result_cache: ResultCache = None) -> int:
+    """
+    Applies the deltas of a feed (see updates.load_feed) in order to every schedule that runs the
+    train, and drops the result_cache entries each delta can have made wrong (see updates.cache_scope).
+
+    Returns:
+        int: Number of deltas that matched a train
+    """
+    applied = 0
+    for delta in feed:
+        for name, graphs in schedules.items():
+            if graphs.apply_delta(delta):
+                applied += 1
+                if result_cache is not None:
+                    result_cache.invalidate(name, delta.train, cache_scope(delta))
+    return applied
+
+
+def _init_worker(schedules: dict, cache_size: int = 0):
+    """
+    Pool initializer; with the fork start method the schedules are inherited, not pickled.
+    Each worker gets its own result cache of cache_size entries.
+    """
+    global _schedules, _result_cache
+    _schedules = schedules
+    _result_cache = ResultCache(cache_size) if cache_size > 0 else None
+
+
+def solve_problem_group(group: tuple, stats: dict = None) -> list:
+    """
+    Solves a group of problems that share schedule, cost function, start station and input time
+    with a single search from the start station.
+
+    Parameters:
+        group (tuple): ((Schedule, CostFunction, FromStation, input_time), [(ProblemNo, ToStation), ...])
+        stats (dict): If given, collects the stats of the search (see solve_cost_function_many) and
+            the result cache hits.
+
+    Returns:
+        list: (ProblemNo, connection, cost) per problem of the group
+    """
+    (schedule, cost_function, from_station, input_time), problems = group
+    graphs = _schedules[schedule]
+    graph = graphs[_graph_kind(cost_function)]
+    targets = [to_station for _, to_station in problems]
+
+    if _result_cache is not None:
+        solutions = _result_cache.solve_many(
+            graphs, graph, schedule, cost_function, from_station, targets, input_time, stats)
+    elif cost_function == 'arrivaltime':
+        solutions = solve_cost_function_many(
+            graph, from_station, targets, graphs['schedule'], cost_function, input_time, stats)
+    else:
+        solutions = solve_cost_function_many(
+            graph, from_station, targets, graphs['schedule'], cost_function, stats=stats)
+
+    results = []
+    for problem_no, to_station in problems:
+        result = solutions[to_station]
+        # 'PATH NOT FOUND' and 'Invalid Cost Attribute' come back as a bare string
+        if isinstance(result, str):
+            results.append((problem_no, result, ''))
+        else:
+            connection, cost = result
+            results.append((problem_no, connection, cost))
+    return results
+
+
+def trace_problem_group(group: tuple) -> tuple:
+    """
+    solve_problem_group that also returns the stats of the group, with its wall time as 'group_seconds'.
+
+    Returns:
+        tuple: (results of solve_problem_group, stats)
+    """
+    stats = {}
+    with timer(stats, 'group'):
+        results = solve_problem_group(group, stats)
+    return results, stats
+
+
+def solve_profile_query(schedule: str, from_station: str, to_station: str) -> list:
+    """
+    Lists the journeys of the day between two stations on the schedules of this process, see solve_profile.
+    """
+    return solve_profile(_schedules[schedule]['timetable'], from_station, to_station)
+
+
+def solve_pareto_query(schedule: str, from_station: str, to_station: str, input_time) -> list:
+    """
+    Lists the Pareto-optimal journeys between two stations on the schedules of this process, see solve_pareto.
+    """
+    return solve_pareto(_schedules[schedule]['timetable'], from_station, to_station, input_time)
+
+
+def group_problems(problems_df: pd.DataFrame, schedules: dict, default_schedule: str = 'schedule.csv') -> list:
+    """
+    Groups problems by (schedule, cost function, start station, input time), so every group can be
+    answered from one search. The input time only separates arrivaltime problems.
+
+    Returns:
+        list: ((Schedule, CostFunction, FromStation, input_time), [(ProblemNo, ToStation), ...]) per group
+    """
+    groups = {}
+    for row in problems_df.itertuples(index=False):
+        schedule = row.Schedule if row.Schedule in schedules else default_schedule
+        input_time = row.input_time if row.CostFunction == 'arrivaltime' else None
+        key = (schedule, row.CostFunction, row.FromStation, input_time)
+        groups.setdefault(key, []).append((row.ProblemNo, row.ToStation))
+    return list(groups.items())
+
+
+def required_graphs(groups: list) -> set:
+    """
+    The (schedule, graph kind) pairs needed to answer groups from group_problems.
+    """
+    required = set()
+    for (schedule, cost_function, _, _), _ in groups:
+        required.update({(schedule, 'schedule'), (schedule, _graph_kind(cost_function))})
+    return required
+
+
+def _trace_records(schedules: dict, groups: list, group_stats: list) -> list:
+    """
+    The trace of a solve_problems run: one 'graph' record per loaded schedule graph and one 'problem'
+    record per problem, carrying the stats of the group search that answered it, in ProblemNo order.
+    """
+    records = []
+    for schedule, graphs in schedules.items():
+        for kind, stats in getattr(graphs, 'stats', {}).items():
+            records.append({'record': 'graph', 'schedule': schedule, 'kind': kind, **stats})
+
+    problem_records = []
+    for ((schedule, cost_function, from_station, input_time), problems), stats in zip(groups, group_stats):
+        for problem_no, to_station in problems:
+            problem_records.append({
+                'record': 'problem', 'ProblemNo': problem_no, 'schedule': schedule, 'cost_function': cost_function,
+                'from': from_station, 'to': to_station, 'input_time': input_time, 'group_size': len(problems),
+                **stats
+            })
+    problem_records.sort(key=lambda record: record['ProblemNo'])
+    return records + problem_records
+
+
+def solve_problems(problems_df: pd.DataFrame, schedules: dict, workers: int = 1,
+                   default_schedule: str = 'schedule.csv', cache_size: int = 0, trace_file: str = None) -> dict:
+    """
+    Solves every problem of a problems DataFrame, optionally over a pool of worker processes.
+    Problems sharing a start station are answered from one search (see group_problems).
+
+    Parameters:
+        problems_df (pd.DataFrame): Problems as returned by load_problems_csv.
+        schedules (dict): Schedule name -> ScheduleGraphs, or a dict with the same keys.
+        workers (int): Number of worker processes; 1 solves in this process.
+        default_schedule (str): Schedule used for problems naming a schedule not in schedules.
+        cache_size (int): Entries of the per-process ResultCache; 0 disables it.
+        trace_file (str): If given, a JSON lines trace of the run is written to it: the load or build
+            time and size of every graph used, the search stats of every problem (see
+            solve_cost_function_many) and a closing 'summary' record with the wall time and peak memory.
+
+    Returns:
+        dict: Solutions in ProblemNo order, in the layout create_solutions_csv expects.
+    """
+    begin = time.perf_counter()
+    groups = group_problems(problems_df, schedules, default_schedule)
+
+    # Load the graphs of lazy schedules that the problems use, before any worker is forked
+    for schedule, kind in sorted(required_graphs(groups)):
+        schedules[schedule][kind]
+
+    # Without a trace file the groups are solved without collecting any stats
+    solve_group = solve_problem_group if trace_file is None else trace_problem_group
+    _init_worker(schedules, cache_size)
+    workers = min(workers, len(groups))
+    if workers <= 1:
+        grouped_results = [solve_group(group) for group in groups]
+    else:
+        # fork shares the already built graphs with the workers; other start methods
+        # pickle them once per worker through the initializer
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        chunksize = max(1, len(groups) // (workers * 4))
+        with context.Pool(workers, initializer=_init_worker, initargs=(schedules, cache_size)) as pool:
+            grouped_results = pool.map(solve_group, groups, chunksize=chunksize)
+
+    if trace_file is not None:
+        grouped_results, group_stats = zip(*grouped_results) if grouped_results else ((), ())
+        records = _trace_records(schedules, groups, group_stats)
+        records.append({'record': 'summary', 'problems': len(problems_df), 'groups': len(groups),
+                        'workers': max(workers, 1), 'seconds': time.perf_counter() - begin, **peak_rss_mib()})
+        write_json_lines(trace_file, records)
+
+    results = [result for group_results in grouped_results for result in group_results]
+    results.sort(key=lambda result: result[0])
+    return {
+        'ProblemNo': [problem_no for problem_no, _, _ in results],
+        'Connection': [connection for _, connection, _ in results],
+        'Cost': [cost for _, _, cost in results]
+    }
+
+
+def default_workers() -> int:
+    """
+    Number of worker processes to use when none is configured: one per available core.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
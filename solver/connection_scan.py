@@ -0,0 +1,395 @@
+from bisect import bisect_left
+from itertools import count
+from typing import NamedTuple
+from solver.graph_builder import consecutive_stops
+from solver.instrumentation import add_counts
+from solver.utils import SECONDS_PER_DAY
+import numpy as np
+import pandas as pd
+
+
+class Timetable(NamedTuple):
+    """
+    Elementary connections of a schedule, one per train leg, sorted by departure time.
+
+    Stations and trains are interned to integer indices. Departure times are seconds since
+    midnight; arrival times are departure plus travel time and may run past midnight.
+    The schedule repeats every day, so a connection can be taken on any day.
+    """
+    stations: list  # Station code per station index (sorted)
+    station_index: dict  # Station code -> station index
+    trains: list  # Train number per train index (sorted)
+    departure: np.ndarray
+    arrival: np.ndarray
+    from_station: np.ndarray
+    to_station: np.ndarray
+    train: np.ndarray
+    from_islno: np.ndarray
+    to_islno: np.ndarray
+
+
+def build_timetable(schedule_df: pd.DataFrame) -> Timetable:
+    """
+    Builds the connection array used by the Connection Scan Algorithm directly from the schedule.
+    """
+    legs = consecutive_stops(schedule_df)
+
+    stations, station_ids = np.unique(
+        np.concatenate([legs['from'].to_numpy(), legs['to'].to_numpy()]), return_inverse=True)
+    trains, train_ids = np.unique(legs['train'].to_numpy(), return_inverse=True)
+    departure = legs['departuretime'].to_numpy(dtype=np.int64)
+    arrival = departure + legs['timeintrain'].to_numpy(dtype=np.int64)
+
+    # Sort by departure, then arrival; lexsort is stable, so legs of one train
+    # with identical times keep their stop order
+    order = np.lexsort((arrival, departure))
+    n = len(legs)
+
+    return Timetable(
+        stations=stations.tolist(),
+        station_index={code: i for i, code in enumerate(stations.tolist())},
+        trains=trains.tolist(),
+        departure=departure[order],
+        arrival=arrival[order],
+        from_station=station_ids[:n][order].astype(np.int64),
+        to_station=station_ids[n:][order].astype(np.int64),
+        train=train_ids[order].astype(np.int64),
+        from_islno=legs['fromislno'].to_numpy(dtype=np.int64)[order],
+        to_islno=legs['toislno'].to_numpy(dtype=np.int64)[order]
+    )
+
+
+def _scan(timetable: Timetable, source: int, departure_time: int, destinations: list, arrival_bounds: list,
+          stats: dict = None):
+    """
+    Connection Scan from source at departure_time over the daily repeating connection array.
+
+    The array is scanned from departure_time onwards, wrapping into the following days, until no
+    connection can bring any destination below both its current arrival and its bound. Without
+    destinations the scan runs until every reachable station has its earliest arrival. If stats is
+    given, the numbers of scans, connections scanned and earliest arrivals improved are added to it.
+
+    Returns:
+        tuple: (earliest, reached_by) per station index, where reached_by holds the connection
+        index that set the earliest arrival
+    """
+    departure = memoryview(timetable.departure)
+    arrival = memoryview(timetable.arrival)
+    from_station = memoryview(timetable.from_station)
+    to_station = memoryview(timetable.to_station)
+    n = len(departure)
+
+    infinity = float('infinity')
+    earliest = [infinity] * len(timetable.stations)
+    reached_by = [None] * len(timetable.stations)
+    earliest[source] = departure_time
+    latest_reached = departure_time
+
+    # The scan may stop once it departs after every destination's arrival (or bound)
+    watched = dict(zip(destinations, arrival_bounds))
+    stop_at = max(watched.values()) if watched else infinity
+
+    first = bisect_left(departure, departure_time % SECONDS_PER_DAY)
+    done = False
+    scanned = improved = 0
+    for day_offset in count(departure_time - departure_time % SECONDS_PER_DAY, SECONDS_PER_DAY):
+        end = n
+        for i in range(first, n):
+            dep = departure[i] + day_offset
+
+            # Nothing departing from here on can improve a destination, or every reached
+            # station has already seen a full day of departures
+            if dep >= stop_at or dep >= latest_reached + SECONDS_PER_DAY:
+                done = True
+                end = i
+                break
+
+            if earliest[from_station[i]] <= dep:
+                arr = arrival[i] + day_offset
+                to = to_station[i]
+                if arr < earliest[to]:
+                    earliest[to] = arr
+                    reached_by[to] = i
+                    improved += 1
+                    if arr > latest_reached:
+                        latest_reached = arr
+                    if to in watched:
+                        stop_at = max(min(earliest[station], bound) for station, bound in watched.items())
+        scanned += end - first
+        if done:
+            break
+        first = 0
+
+    add_counts(stats, scans=1, scanned=scanned, improved=improved)
+    return earliest, reached_by
+
+
+def _legs(timetable: Timetable, reached_by: list, source: int, destination: int) -> list:
+    """
+    Walks the connections of a _scan result back from destination to source.
+
+    Returns:
+        list: (train, fromislno, toislno) per connection, in travel order
+    """
+    connections = []
+    station = destination
+    while station != source:
+        i = reached_by[station]
+        connections.append(i)
+        station = timetable.from_station[i]
+
+    return [(timetable.trains[timetable.train[i]], int(timetable.from_islno[i]), int(timetable.to_islno[i]))
+            for i in reversed(connections)]
+
+
+def _destinations(timetable: Timetable, source, targets: list) -> dict:
+    """
+    Maps the targets that exist in the timetable and differ from the source to their station index.
+    """
+    return {target: timetable.station_index[target] for target in targets
+            if target in timetable.station_index and timetable.station_index[target] != source}
+
+
+def scan_arrival_time(timetable: Timetable, start: str, target: str, departure_time: int):
+    """
+    Answers an arrivaltime query: earliest arrival when leaving start no earlier than departure_time.
+
+    Returns:
+        tuple: (legs, total_cost) with total_cost in seconds after departure_time, or (None, None)
+    """
+    return scan_arrival_times(timetable, start, [target], departure_time)[target]
+
+
+def scan_arrival_times(timetable: Timetable, start: str, targets: list, departure_time: int,
+                       stats: dict = None) -> dict:
+    """
+    Answers the arrivaltime queries from one start station to several targets with a single scan.
+    stats, if given, collects the scan counters of _scan.
+
+    Returns:
+        dict: target -> (legs, total_cost), or (None, None) if unreachable
+    """
+    results = {target: (None, None) for target in targets}
+    source = timetable.station_index.get(start)
+    destinations = _destinations(timetable, source, targets)
+    if source is None or not destinations:
+        return results
+
+    earliest, reached_by = _scan(
+        timetable, source, departure_time, list(destinations.values()),
+        [float('infinity')] * len(destinations), stats)
+    for target, destination in destinations.items():
+        if reached_by[destination] is not None:
+            results[target] = (_legs(timetable, reached_by, source, destination),
+                               earliest[destination] - departure_time)
+    return results
+
+
+def scan_travel_time(timetable: Timetable, start: str, target: str):
+    """
+    Answers a traveltime query: the shortest time from the first departure at start to the arrival at target.
+
+    Returns:
+        tuple: (legs, total_cost) or (None, None)
+    """
+    return scan_travel_times(timetable, start, [target])[target]
+
+
+def scan_travel_times(timetable: Timetable, start: str, targets: list, stats: dict = None) -> dict:
+    """
+    Answers the traveltime queries from one start station to several targets.
+
+    Runs an earliest-arrival scan for every distinct departure time at the start station. Each scan
+    only searches for journeys that can beat the best duration found so far for some target.
+    stats, if given, collects the scan counters of _scan over all scans.
+
+    Returns:
+        dict: target -> (legs, total_cost), or (None, None) if unreachable
+    """
+    results = {target: (None, None) for target in targets}
+    source = timetable.station_index.get(start)
+    destinations = _destinations(timetable, source, targets)
+    if source is None or not destinations:
+        return results
+
+    departure_times = np.unique(timetable.departure[timetable.from_station == source]).tolist()
+
+    best_cost = {target: float('infinity') for target in destinations}
+    for departure_time in departure_times:
+        earliest, reached_by = _scan(
+            timetable, source, departure_time, list(destinations.values()),
+            [departure_time + best_cost[target] for target in destinations], stats)
+        for target, destination in destinations.items():
+            cost = earliest[destination] - departure_time
+            if reached_by[destination] is not None and cost < best_cost[target]:
+                best_cost[target] = cost
+                results[target] = (_legs(timetable, reached_by, source, destination), cost)
+    return results
+
+
+class _Profile:
+    """
+    Pareto set of (departure, arrival) pairs of one station towards the target, sorted by departure.
+
+    Departures lie within one day; arrivals are absolute seconds since midnight of the departure day.
+    Both grow together, so the best journey leaving at or after a time is the first one at or after it,
+    or, past the last departure, the first one of the next day.
+    """
+    __slots__ = ('departure', 'arrival', 'connection')
+
+    def __init__(self):
+        self.departure = []
+        self.arrival = []
+        self.connection = []  # Index of the first connection of each journey
+
+    def lookup(self, time: int):
+        """
+        Returns (arrival, entry index, day offset) of the best journey leaving at or after time (absolute),
+        or None if there is none.
+        """
+        if not self.departure:
+            return None
+        day, time_of_day = divmod(time, SECONDS_PER_DAY)
+        i = bisect_left(self.departure, time_of_day)
+        if i == len(self.departure):
+            i = 0
+            day += 1
+        return self.arrival[i] + day * SECONDS_PER_DAY, i, day
+
+    def insert(self, departure: int, arrival: int, connection: int) -> bool:
+        """
+        Adds a journey unless it is dominated, removing the journeys it dominates.
+
+        Returns:
+            bool: Whether the profile changed
+        """
+        best = self.lookup(departure)
+        if best is not None and best[0] <= arrival:
+            return False
+
+        i = bisect_left(self.departure, departure)
+        if i < len(self.departure) and self.departure[i] == departure:
+            self.arrival[i] = arrival
+            self.connection[i] = connection
+        else:
+            self.departure.insert(i, departure)
+            self.arrival.insert(i, arrival)
+            self.connection.insert(i, connection)
+
+        # Earlier departures arriving no earlier are dominated
+        first = i
+        while first > 0 and self.arrival[first - 1] >= arrival:
+            first -= 1
+        # Late departures are dominated by waiting for this journey on the next day
+        last = len(self.departure)
+        while last - 1 > i and self.arrival[last - 1] >= arrival + SECONDS_PER_DAY:
+            last -= 1
+        del self.departure[last:], self.arrival[last:], self.connection[last:]
+        del self.departure[first:i], self.arrival[first:i], self.connection[first:i]
+        return True
+
+
+def profile_scan(timetable: Timetable, start: str, target: str, max_passes: int = 64) -> list:
+    """
+    Profile Connection Scan: every Pareto-optimal journey from start to target over the day in one search.
+
+    The connections are scanned by decreasing departure time, and every station keeps the Pareto
+    set of (departure, arrival at target) of the journeys leaving it, like _Profile. A connection
+    extends the best journey leaving its arrival station after it arrives. The schedule repeats
+    every day, so a journey may continue with the next day's profile of a station. Those profiles
+    are only complete after the sweep, and the sweep is therefore repeated until nothing changes
+    (one more sweep per midnight a journey crosses). Repeated sweeps only look at the connections
+    into stations whose profile changed.
+
+    Parameters:
+        timetable (Timetable): The connections to scan.
+        start (str): The starting station.
+        target (str): The target station.
+        max_passes (int): Upper bound on the sweeps.
+
+    Returns:
+        list: (departure, arrival, legs) per journey, sorted by departure, with departure in seconds since
+        midnight, arrival in seconds since midnight of the departure day and legs a list of
+        (train, fromislno, toislno); empty if target cannot be reached
+    """
+    source = timetable.station_index.get(start)
+    destination = _destinations(timetable, source, [target]).get(target)
+    if source is None or destination is None:
+        return []
+
+    departure = memoryview(timetable.departure)
+    arrival = memoryview(timetable.arrival)
+    from_station = memoryview(timetable.from_station)
+    to_station = memoryview(timetable.to_station)
+
+    profiles = [_Profile() for _ in timetable.stations]
+    # After the first sweep a connection can only improve if its arrival station's profile changed
+    # since the connection was last scanned, that is during the previous or the current sweep
+    previous_changed = None
+    for _ in range(max_passes):
+        changed = set()
+        for i in range(len(departure) - 1, -1, -1):
+            origin = from_station[i]
+            if origin == destination:
+                continue
+            to = to_station[i]
+            if previous_changed is not None and to not in previous_changed and to not in changed:
+                continue
+            if to == destination:
+                reached = arrival[i]
+            else:
+                best = profiles[to].lookup(arrival[i])
+                if best is None:
+                    continue
+                reached = best[0]
+            if profiles[origin].insert(departure[i], reached, i):
+                changed.add(origin)
+        if not changed:
+            break
+        previous_changed = changed
+
+    journeys = []
+    profile = profiles[source]
+    for departure_time, arrival_time, first in zip(profile.departure, profile.arrival, profile.connection):
+        journeys.append((departure_time, arrival_time,
+                         _profile_legs(timetable, profiles, first, destination)))
+    return journeys
+
+
+def _profile_legs(timetable: Timetable, profiles: list, connection: int, destination: int) -> list:
+    """
+    Follows a journey through the station profiles from its first connection to the destination.
+
+    Returns:
+        list: (train, fromislno, toislno) per connection, in travel order
+    """
+    connections = [connection]
+    day = 0
+    while timetable.to_station[connection] != destination:
+        _, entry, day_offset = profiles[timetable.to_station[connection]].lookup(
+            int(timetable.arrival[connection]) + day * SECONDS_PER_DAY)
+        day = day_offset
+        connection = profiles[timetable.to_station[connection]].connection[entry]
+        connections.append(connection)
+
+    return [(timetable.trains[timetable.train[i]], int(timetable.from_islno[i]), int(timetable.to_islno[i]))
+            for i in connections]
+
+
+def profile_arrival_time(profile: list, departure_time: int):
+    """
+    Answers an arrivaltime query from a profile_scan result by binary search.
+
+    Returns:
+        tuple: (legs, total_cost) with total_cost in seconds after departure_time, or (None, None)
+    """
+    if not profile:
+        return None, None
+    time_of_day = departure_time % SECONDS_PER_DAY
+    i = bisect_left(profile, time_of_day, key=lambda journey: journey[0])
+    wait_days = 0
+    if i == len(profile):
+        i = 0
+        wait_days = 1
+    journey_departure, journey_arrival, legs = profile[i]
+    return legs, journey_arrival + wait_days * SECONDS_PER_DAY - time_of_day
@@ -1,37 +1,192 @@
 import heapq
-from solver.problem_solver import construct_connection, construct_connection_expanded_graph
-from solver.utils import add_seconds_to_time
+import networkx as nx
+from solver.alternatives import k_shortest_paths, k_shortest_paths_expanded_graph
+from solver.csr_graph import CSRGraph, dijkstra_tree_csr, csr_tree_path
+from solver.landmarks import ALTGraph, astar_path_csr
+from solver.instrumentation import add_counts, timer
+from solver.connection_scan import Timetable, scan_arrival_times, scan_travel_times, profile_scan
+from solver.pareto import pareto_scan
+from solver.problem_solver import construct_connection_expanded_graph, construct_connection_from_legs
+from solver.utils import add_seconds_to_time, time_to_seconds, time_difference_seconds, format_day_time
 
 
-def solve_cost_function(graph, start, target, schedule_df, cost_attribute='stops', input_arrival_time='00:00:00'):
+def solve_cost_function(graph, start, target, schedule_df, cost_attribute='stops', input_arrival_time='00:00:00',
+                        bidirectional=False, stats=None):
     """
     Solves for the optimal path based on the specified cost attribute and formats the solution.
+
+    For 'stops' and 'timeintrain' the graph is either the MultiDiGraph from build_graph or its
+    CSRGraph form from build_csr_graph. On the MultiDiGraph, bidirectional=True searches from
+    both ends with bidirectional_dijkstra_path; it is not supported on any other graph. An ALTGraph (a CSRGraph with its landmarks from
+    build_landmarks) is searched with A*, giving the same costs as on the CSRGraph.
+    stats, if given, collects the search and formatting times and the search counters (see
+    solve_cost_function_many).
+    For 'traveltime' and 'arrivaltime' the graph is either the expanded graph from expand_graph or a
+    Timetable from build_timetable; a Timetable is answered with the Connection Scan Algorithm.
+
+    Raises:
+        ValueError: If bidirectional=True is given for a graph or cost function it does not support.
     """
-    if cost_attribute == 'stops' or cost_attribute == 'timeintrain':
-        station_sequence, train_sequence, total_cost = dijkstra_path(
-            graph, start, target, cost_attribute)
-        if station_sequence is None:
-            return 'PATH NOT FOUND'
-        connection = construct_connection(
-            schedule_df, station_sequence, train_sequence)
-    elif cost_attribute == 'traveltime':
-        node_sequence, total_cost = dijkstra_path_expanded_graph(
-            graph, start, target)
-        if node_sequence is None:
-            return 'PATH NOT FOUND'
-        connection = construct_connection_expanded_graph(node_sequence)
-    elif cost_attribute == 'arrivaltime':
-        node_sequence, total_cost = dijkstra_path_expanded_graph(
-            graph, start, target)
-        if node_sequence is None:
-            return 'PATH NOT FOUND'
-        connection = construct_connection_expanded_graph(node_sequence)
-        total_cost = add_seconds_to_time(input_arrival_time, total_cost)
-
-    else:
-        return 'Invalid Cost Attribute'
-
-    return connection, str(total_cost)
+    if bidirectional and cost_attribute in ('stops', 'timeintrain', 'traveltime', 'arrivaltime'):
+        if cost_attribute not in ('stops', 'timeintrain') or not isinstance(graph, nx.MultiDiGraph):
+            raise ValueError("bidirectional search runs on the MultiDiGraph from build_graph, "
+                             "for 'stops' and 'timeintrain' only")
+        with timer(stats, 'search'):
+            station_sequence, leg_sequence, total_cost = bidirectional_dijkstra_path(
+                graph, start, target, cost_attribute, stats)
+        with timer(stats, 'format'):
+            if station_sequence is None:
+                return 'PATH NOT FOUND'
+            return construct_connection_from_legs(leg_sequence), str(total_cost)
+
+    return solve_cost_function_many(
+        graph, start, [target], schedule_df, cost_attribute, input_arrival_time, stats)[target]
+
+
+def solve_cost_function_many(graph, start, targets, schedule_df, cost_attribute='stops', input_arrival_time='00:00:00',
+                             stats=None):
+    """
+    Solves one start station against several targets with a single search and formats every solution.
+
+    The search runs until every target is settled and all paths are reconstructed from the same
+    predecessor tree.
+
+    If stats is given, 'search_seconds' and 'format_seconds' are added to it together with the
+    counters of the search: stations or nodes settled, edges relaxed and heap pushes for the
+    Dijkstra and A* searches, and scans, connections scanned and arrivals improved for the
+    Connection Scan.
+
+    Returns:
+        dict: target -> the result solve_cost_function returns for that target
+    """
+    targets = list(dict.fromkeys(targets))
+
+    if cost_attribute not in ('stops', 'timeintrain', 'traveltime', 'arrivaltime'):
+        return {target: 'Invalid Cost Attribute' for target in targets}
+    if cost_attribute == 'arrivaltime' and isinstance(input_arrival_time, str):
+        input_arrival_time = time_to_seconds(input_arrival_time)
+
+    # The legs carry their islnos, so formatting never looks at schedule_df
+    format_path = construct_connection_from_legs
+    with timer(stats, 'search'):
+        if cost_attribute == 'stops' or cost_attribute == 'timeintrain':
+            if isinstance(graph, ALTGraph):
+                # A* is directed at one target, so every target gets its own search
+                paths = {target: astar_path_csr(graph.graph, graph.landmarks, start, target, cost_attribute, stats)
+                         for target in targets}
+            elif isinstance(graph, CSRGraph):
+                tree = dijkstra_tree_csr(graph, start, cost_attribute, targets, stats)
+                paths = {target: csr_tree_path(graph, tree, target) for target in targets}
+            else:
+                costs, predecessors = dijkstra_tree(graph, start, cost_attribute, targets, stats)
+                paths = {target: station_tree_path(costs, predecessors, target) for target in targets}
+            solutions = {target: (leg_sequence, total_cost)
+                         for target, (_, leg_sequence, total_cost) in paths.items()}
+        elif isinstance(graph, Timetable):
+            if cost_attribute == 'traveltime':
+                solutions = scan_travel_times(graph, start, targets, stats)
+            else:
+                solutions = scan_arrival_times(graph, start, targets, input_arrival_time, stats)
+        else:
+            departure_time = input_arrival_time if cost_attribute == 'arrivaltime' else None
+            costs, predecessors = dijkstra_tree_expanded_graph(
+                graph, start, targets, departure_time, stats)
+            solutions = {target: expanded_tree_path(costs, predecessors, target) for target in targets}
+            format_path = construct_connection_expanded_graph
+
+    results = {}
+    with timer(stats, 'format'):
+        for target, (path, total_cost) in solutions.items():
+            if path is None:
+                results[target] = 'PATH NOT FOUND'
+                continue
+            connection = format_path(path)
+            if cost_attribute == 'arrivaltime':
+                total_cost = add_seconds_to_time(input_arrival_time, total_cost)
+            results[target] = (connection, str(total_cost))
+
+    return results
+
+
+def solve_profile(timetable, start, target) -> list:
+    """
+    Lists every Pareto-optimal journey from start to target over the day, from one profile_scan.
+
+    An arrivaltime query for any input time is answered by the first journey departing at or
+    after it (see connection_scan.profile_arrival_time), and the traveltime answer is the journey
+    with the shortest duration.
+
+    Returns:
+        list: (departure "HH:MM:SS", arrival "dd:hh:mm:ss" counted from the departure day, connection)
+        per journey, sorted by departure; empty if target cannot be reached
+    """
+    if not isinstance(timetable, Timetable):
+        raise ValueError("profiles are computed on a Timetable from build_timetable")
+
+    return [(format_day_time(departure)[3:], format_day_time(arrival), construct_connection_from_legs(legs))
+            for departure, arrival, legs in profile_scan(timetable, start, target)]
+
+
+def solve_pareto(timetable, start, target, input_arrival_time='00:00:00') -> list:
+    """
+    Lists the Pareto-optimal journeys from start to target across departure, arrival, transfers, stops
+    and time in train, from one pareto_scan. Journeys leave within a day from input_arrival_time.
+
+    Every legacy cost function is one of these journeys (see pareto.pareto_cost): the fewest stops,
+    the least time in train, the shortest arrival minus departure, or the earliest arrival.
+
+    Returns:
+        list: (departure, arrival, transfers, stops, timeintrain, connection) per journey, sorted by
+        departure, with departure and arrival as "dd:hh:mm:ss" counted from the day of input_arrival_time
+    """
+    if not isinstance(timetable, Timetable):
+        raise ValueError("Pareto journeys are computed on a Timetable from build_timetable")
+    if isinstance(input_arrival_time, str):
+        input_arrival_time = time_to_seconds(input_arrival_time)
+
+    return [(format_day_time(journey.departure), format_day_time(journey.arrival), journey.transfers,
+             journey.stops, journey.timeintrain, construct_connection_from_legs(journey.legs))
+            for journey in pareto_scan(timetable, start, target, input_arrival_time)]
+
+
+def solve_alternatives(graph, start, target, cost_attribute='traveltime', k=3, input_arrival_time='00:00:00',
+                       max_transfers=None, stats=None) -> list:
+    """
+    Lists up to k alternative connections from start to target, cheapest first, each a distinct
+    sequence of train legs (see alternatives.k_shortest_paths).
+
+    For 'stops' and 'timeintrain' the graph is the MultiDiGraph from build_graph, for 'traveltime'
+    and 'arrivaltime' the expanded graph from expand_graph or expand_graph_sparse. The first
+    alternative has the cost solve_cost_function reports, unless max_transfers leaves it out:
+    max_transfers, if given, drops connections that change trains more often.
+
+    Returns:
+        list: (connection, cost) per alternative, formatted like solve_cost_function; empty if
+        target cannot be reached
+    """
+    if cost_attribute not in ('stops', 'timeintrain', 'traveltime', 'arrivaltime'):
+        raise ValueError(f"unknown cost function {cost_attribute}")
+
+    if cost_attribute in ('stops', 'timeintrain'):
+        if not isinstance(graph, nx.MultiDiGraph):
+            raise ValueError("station alternatives are computed on the MultiDiGraph from build_graph")
+        journeys = k_shortest_paths(graph, start, target, cost_attribute, k, max_transfers, stats)
+        return [(construct_connection_from_legs(leg_sequence), str(total_cost))
+                for _, leg_sequence, total_cost in journeys]
+
+    if not isinstance(graph, nx.DiGraph) or graph.is_multigraph():
+        raise ValueError("timed alternatives are computed on the expanded graph from expand_graph")
+    departure_time = None
+    if cost_attribute == 'arrivaltime':
+        departure_time = input_arrival_time
+        if isinstance(departure_time, str):
+            departure_time = time_to_seconds(departure_time)
+    journeys = k_shortest_paths_expanded_graph(graph, start, target, k, departure_time, max_transfers, stats)
+    if cost_attribute == 'arrivaltime':
+        return [(construct_connection_expanded_graph(node_sequence), add_seconds_to_time(departure_time, total_cost))
+                for node_sequence, total_cost in journeys]
+    return [(construct_connection_expanded_graph(node_sequence), str(total_cost))
+            for node_sequence, total_cost in journeys]
 
 
 def dijkstra_path(graph, start, target, cost_attribute):
@@ -45,113 +200,286 @@ def dijkstra_path(graph, start, target, cost_attribute):
         cost_attribute (str): The edge attribute to use as the cost ('stops' or 'timeintrain').
 
     Returns:
-        tuple: (station_sequence, train_sequence, total_cost)
+        tuple: (station_sequence, leg_sequence, total_cost) where leg_sequence holds one
+        (train, fromislno, toislno) per edge of the path
+    """
+    costs, predecessors = dijkstra_tree(graph, start, cost_attribute, [target])
+    return station_tree_path(costs, predecessors, target)
+
+
+def dijkstra_tree(graph, start, cost_attribute, targets=None, stats=None):
+    """
+    Dijkstra's algorithm on a MultiDiGraph, returning the predecessor tree of the start node.
+
+    Search state is only created for nodes the search reaches. With targets the search stops as
+    soon as all of them are settled; without, it builds the whole tree. If stats is given, the
+    numbers of nodes settled, edges relaxed and heap pushes are added to it.
+
+    Returns:
+        tuple: (costs, predecessors) for the reached nodes
     """
-    # Initialize costs to infinity and set the start node cost to 0
-    costs = {node: float('infinity') for node in graph}
-    costs[start] = 0
+    infinity = float('infinity')
+    costs = {start: 0}
 
-    # Dictionary to store the predecessor of each node to reconstruct the path
-    predecessors = {node: {'previous_station': None, 'train': None}
-                    for node in graph}
+    # Predecessor of each reached node to reconstruct the path
+    predecessors = {}
+    remaining = None
+    if targets is not None:
+        remaining = {target for target in targets if target in graph}
 
     # Priority queue to keep track of nodes to visit
     priority_queue = [(0, start)]  # (current_cost, current_node)
+    settled = relaxed = pushes = 0
 
     while priority_queue:
         # Get the node with the smallest cost
         current_cost, current_node = heapq.heappop(priority_queue)
 
         # Skip if cost is already outdated
-        if current_cost > costs[current_node] or current_node == target:
+        if current_cost > costs[current_node]:
             continue
+        settled += 1
+
+        # Stop once every target is settled
+        if remaining is not None:
+            remaining.discard(current_node)
+            if not remaining:
+                break
 
         # Check all edges to neighbors of the current node
         for neighbor, edges in graph[current_node].items():
+            relaxed += len(edges)
             for _, attribute in edges.items():  # Handle multiple edges between nodes
                 travel_cost = current_cost + attribute[cost_attribute]
 
                 # Only update if this path is shorter
-                if travel_cost < costs[neighbor]:
+                if travel_cost < costs.get(neighbor, infinity):
                     costs[neighbor] = travel_cost
                     predecessors[neighbor] = {
                         'previous_station': current_node,
-                        'train': attribute['train']
+                        'train': attribute['train'],
+                        'fromislno': attribute['fromislno'],
+                        'toislno': attribute['toislno']
                     }
                     heapq.heappush(priority_queue, (travel_cost, neighbor))
+                    pushes += 1
+
+    add_counts(stats, settled=settled, relaxed=relaxed, pushes=pushes)
+    return costs, predecessors
 
-    # If we reach the target node, reconstruct the path
-    if predecessors[target]['train'] is not None:
-        # Reconstruct the optimal path
-        current_node = target
-        station_sequence = []
-        train_sequence = []
-        while current_node is not None:
-            station_sequence.append(current_node)
-            if predecessors[current_node]['train'] is not None:
-                train_sequence.append(predecessors[current_node]['train'])
-            current_node = predecessors[current_node]['previous_station']
-        return station_sequence[::-1], train_sequence[::-1], costs[target]
 
+def station_tree_path(costs, predecessors, target):
+    """
+    Reconstructs the path to target from a dijkstra_tree result.
+
+    Returns:
+        tuple: (station_sequence, leg_sequence, total_cost), or (None, None, None) if unreachable
+    """
     # Return if target is unreachable
-    return None, None, None
+    if target not in predecessors:
+        return None, None, None
 
+    # Reconstruct the optimal path
+    current_node = target
+    station_sequence = [target]
+    leg_sequence = []
+    while current_node in predecessors:
+        predecessor = predecessors[current_node]
+        leg_sequence.append(
+            (predecessor['train'], predecessor['fromislno'], predecessor['toislno']))
+        current_node = predecessor['previous_station']
+        station_sequence.append(current_node)
+    return station_sequence[::-1], leg_sequence[::-1], costs[target]
 
-def dijkstra_path_expanded_graph(graph, start, target):
+
+def bidirectional_dijkstra_path(graph, start, target, cost_attribute, stats=None):
     """
-    Dijkstra's algorithm to find the shortest path in a MultiDiGraph.
+    Bidirectional Dijkstra on a MultiDiGraph: searches forward from start and backward from target
+    at the same time and stops once the two frontiers cannot produce a cheaper meeting point.
+
+    Returns the same optimal cost as dijkstra_path; among equally cheap paths it may pick another one.
+    If stats is given, the numbers of nodes settled, edges relaxed and heap pushes of both searches
+    are added to it.
+
+    Returns:
+        tuple: (station_sequence, leg_sequence, total_cost), or (None, None, None) if unreachable
+    """
+    if start not in graph or target not in graph or start == target:
+        return None, None, None
+
+    infinity = float('infinity')
+    # Per direction: costs, the edge each node was reached by, and the priority queue
+    forward_costs, backward_costs = {start: 0}, {target: 0}
+    forward_edges, backward_edges = {}, {}
+    forward_queue, backward_queue = [(0, start)], [(0, target)]
+
+    best_cost = infinity
+    meeting_node = None
+    settled = relaxed = pushes = 0
+
+    while forward_queue and backward_queue:
+        # No path through the unsettled nodes can be cheaper than the best meeting found
+        if forward_queue[0][0] + backward_queue[0][0] >= best_cost:
+            break
+
+        forward = forward_queue[0][0] <= backward_queue[0][0]
+        if forward:
+            costs, other_costs, reached_by, queue = forward_costs, backward_costs, forward_edges, forward_queue
+            adjacency = graph.succ
+        else:
+            costs, other_costs, reached_by, queue = backward_costs, forward_costs, backward_edges, backward_queue
+            adjacency = graph.pred
+
+        current_cost, current_node = heapq.heappop(queue)
+        if current_cost > costs[current_node]:
+            continue
+        settled += 1
+
+        for neighbor, edges in adjacency[current_node].items():
+            relaxed += len(edges)
+            for _, attribute in edges.items():
+                travel_cost = current_cost + attribute[cost_attribute]
+                if travel_cost < costs.get(neighbor, infinity):
+                    costs[neighbor] = travel_cost
+                    reached_by[neighbor] = (current_node, attribute)
+                    heapq.heappush(queue, (travel_cost, neighbor))
+                    pushes += 1
+
+                    # Record the cheapest path through a node both searches have reached
+                    if neighbor in other_costs and travel_cost + other_costs[neighbor] < best_cost:
+                        best_cost = travel_cost + other_costs[neighbor]
+                        meeting_node = neighbor
+
+    add_counts(stats, settled=settled, relaxed=relaxed, pushes=pushes)
+    if meeting_node is None:
+        return None, None, None
+
+    # Forward half, from the meeting node back to start, then backward half on to target
+    station_sequence = [meeting_node]
+    leg_sequence = []
+    current_node = meeting_node
+    while current_node in forward_edges:
+        current_node, attribute = forward_edges[current_node]
+        station_sequence.append(current_node)
+        leg_sequence.append((attribute['train'], attribute['fromislno'], attribute['toislno']))
+    station_sequence.reverse()
+    leg_sequence.reverse()
+
+    current_node = meeting_node
+    while current_node in backward_edges:
+        current_node, attribute = backward_edges[current_node]
+        station_sequence.append(current_node)
+        leg_sequence.append((attribute['train'], attribute['fromislno'], attribute['toislno']))
+
+    return station_sequence, leg_sequence, best_cost
+
+
+def dijkstra_path_expanded_graph(graph, start, target, departure_time=None):
+    """
+    Dijkstra's algorithm to find the shortest path in the expanded DiGraph.
 
     Parameters:
-        graph (nx.MultiDiGraph): The graph to search.
-        start (str): The starting node.
-        target (str): The target node.
-        cost_attribute (str): The edge attribute to use as the cost ('stops' or 'timeintrain').
+        graph (nx.DiGraph): The expanded graph to search.
+        start (str): The starting station.
+        target (str): The target station.
+        departure_time (int): Optional earliest departure in seconds since midnight. When given, the
+            initial wait to each departure of the start station is computed on the fly instead of
+            using the edge weights, so the shared graph is never copied or modified.
+
+    Returns:
+        tuple: (node_sequence, total_cost)
+    """
+    costs, predecessors = dijkstra_tree_expanded_graph(
+        graph, start, [target], departure_time)
+    return expanded_tree_path(costs, predecessors, target)
+
+
+def dijkstra_tree_expanded_graph(graph, start, targets=None, departure_time=None, stats=None):
+    """
+    Dijkstra's algorithm on the expanded DiGraph, returning the predecessor tree of the start
+    station's virtual start node.
+
+    Search state is only created for nodes the search reaches. With target stations the search
+    stops as soon as all their virtual end nodes are settled. If stats is given, the numbers of
+    nodes settled, edges relaxed and heap pushes are added to it.
 
     Returns:
-        tuple: (station_sequence, train_sequence, total_cost)
+        tuple: (costs, predecessors) for the reached nodes
     """
     start = (start, '0', -1, 'start')
-    target = (target, '0', -1, 'end')
-    # Initialize costs to infinity and set the start node cost to 0
-    costs = {node: float('infinity') for node in graph}
-    costs[start] = 0
+    remaining = None
+    if targets is not None:
+        remaining = {(target, '0', -1, 'end') for target in targets} & graph.nodes
+    if departure_time is not None and start not in graph:
+        raise ValueError(
+            f"No virtual start node found for station {start[0]}")
+
+    infinity = float('infinity')
+    costs = {start: 0}
 
-    # Dictionary to store the predecessor of each node to reconstruct the path
-    predecessors = {node: None for node in graph}
-    costs_from_pred = {node: None for node in graph}
+    # Predecessor of each reached node to reconstruct the path
+    predecessors = {}
 
     # Priority queue to keep track of nodes to visit
     priority_queue = [(0, start)]  # (current_cost, current_node)
+    settled = relaxed = pushes = 0
 
     while priority_queue:
         # Get the node with the smallest cost
         current_cost, current_node = heapq.heappop(priority_queue)
 
         # Skip if cost is already outdated
-        if current_cost > costs[current_node] or current_node == target:
+        if current_cost > costs[current_node]:
             continue
+        settled += 1
+
+        # Stop once every target is settled
+        if remaining is not None:
+            remaining.discard(current_node)
+            if not remaining:
+                break
 
         # Check all edges to neighbors of the current node
-        for neighbor, attribute in graph[current_node].items():
-            travel_cost = current_cost + attribute['time']
+        neighbors = graph[current_node]
+        relaxed += len(neighbors)
+        for neighbor, attribute in neighbors.items():
+            if departure_time is not None and current_node == start:
+                # Wait at the start station until this departure
+                edge_cost = time_difference_seconds(
+                    departure_time, attribute['departuretime'])
+            else:
+                edge_cost = attribute['time']
+            travel_cost = current_cost + edge_cost
 
             # Only update if this path is shorter
-            if travel_cost < costs[neighbor]:
+            if travel_cost < costs.get(neighbor, infinity):
                 costs[neighbor] = travel_cost
                 predecessors[neighbor] = current_node
-                costs_from_pred[neighbor] = attribute['time']
                 heapq.heappush(priority_queue, (travel_cost, neighbor))
+                pushes += 1
+
+    add_counts(stats, settled=settled, relaxed=relaxed, pushes=pushes)
+    return costs, predecessors
+
 
-    # If we reach the target node, reconstruct the path
-    if predecessors[target] is not None:
-        # Reconstruct the optimal path
-        current_node = target
-        node_sequence = []
-        while current_node is not None:
-            node_sequence.append(current_node)
-            current_node = predecessors[current_node]
+def expanded_tree_path(costs, predecessors, target):
+    """
+    Reconstructs the node sequence to a target station from a dijkstra_tree_expanded_graph result.
 
-        return node_sequence[::-1], costs[target]
+    Returns:
+        tuple: (node_sequence, total_cost), or (None, None) if unreachable
+    """
+    target = (target, '0', -1, 'end')
 
     # Return if target is unreachable
-    return None, None
+    if target not in predecessors:
+        return None, None
+
+    # Reconstruct the optimal path
+    current_node = target
+    node_sequence = []
+    while current_node is not None:
+        node_sequence.append(current_node)
+        current_node = predecessors.get(current_node)
+
+    return node_sequence[::-1], costs[target]
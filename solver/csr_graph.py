@@ -0,0 +1,223 @@
+import heapq
+from typing import NamedTuple
+from solver.graph_builder import consecutive_stops
+from solver.instrumentation import add_counts
+import numpy as np
+import pandas as pd
+import networkx as nx
+
+
+class CSRGraph(NamedTuple):
+    """
+    Frozen, array-backed version of the station MultiDiGraph from build_graph.
+
+    Stations and trains are interned to integer indices, with stations in sorted order so index
+    order matches the string order networkx Dijkstra breaks ties with. The edges of station u are
+    edges offsets[u] .. offsets[u + 1] - 1, kept in the order networkx would iterate them.
+    """
+    stations: list  # Station code per station index (sorted)
+    station_index: dict  # Station code -> station index
+    trains: list  # Train number per train index (sorted)
+    offsets: np.ndarray  # Edge offset per station, plus the total edge count
+    targets: np.ndarray  # Target station index per edge
+    train: np.ndarray  # Train index per edge
+    stops: np.ndarray  # Cost per edge for the 'stops' cost function
+    timeintrain: np.ndarray  # Cost per edge for the 'timeintrain' cost function
+    fromislno: np.ndarray
+    toislno: np.ndarray
+
+
+def _csr_from_edges(legs: pd.DataFrame) -> CSRGraph:
+    """
+    Builds a CSRGraph from a frame of edges with the columns produced by consecutive_stops.
+    The rows must be in the order the edges were added to the MultiDiGraph.
+    """
+    n = len(legs)
+    stations, station_ids = np.unique(
+        np.concatenate([legs['from'].to_numpy(), legs['to'].to_numpy()]), return_inverse=True)
+    trains, train_ids = np.unique(legs['train'].to_numpy(), return_inverse=True)
+    from_ids, to_ids = station_ids[:n], station_ids[n:]
+
+    # networkx iterates a node's neighbors in the order they were first connected, and the
+    # parallel edges to one neighbor in insertion order
+    position = np.arange(n)
+    first_position = pd.Series(position).groupby([from_ids, to_ids]).transform('min').to_numpy()
+    order = np.lexsort((position, first_position, from_ids))
+
+    offsets = np.zeros(len(stations) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(from_ids, minlength=len(stations)), out=offsets[1:])
+
+    return CSRGraph(
+        stations=stations.tolist(),
+        station_index={code: i for i, code in enumerate(stations.tolist())},
+        trains=trains.tolist(),
+        offsets=offsets,
+        targets=to_ids[order].astype(np.int32),
+        train=train_ids[order].astype(np.int32),
+        stops=np.ones(n, dtype=np.int32),
+        timeintrain=legs['timeintrain'].to_numpy(dtype=np.int32)[order],
+        fromislno=legs['fromislno'].to_numpy(dtype=np.int32)[order],
+        toislno=legs['toislno'].to_numpy(dtype=np.int32)[order]
+    )
+
+
+def build_csr_graph(schedule_df: pd.DataFrame) -> CSRGraph:
+    """
+    Builds the CSR station graph directly from the schedule, without going through networkx.
+    """
+    return _csr_from_edges(consecutive_stops(schedule_df))
+
+
+def csr_from_graph(graph: nx.MultiDiGraph) -> CSRGraph:
+    """
+    Freezes a MultiDiGraph produced by build_graph into a CSRGraph.
+    """
+    columns = ['from', 'to', 'train', 'timeintrain', 'fromislno', 'toislno']
+    legs = pd.DataFrame(
+        [(u, v, data['train'], data['timeintrain'], data['fromislno'], data['toislno'])
+         for u, v, data in graph.edges(data=True)],
+        columns=columns)
+    return _csr_from_edges(legs)
+
+
+def collapse_csr_graph(graph: CSRGraph, cost_attribute: str) -> CSRGraph:
+    """
+    CSRGraph counterpart of collapse_parallel_edges: keeps the first cheapest edge of every
+    (from, to) pair for one cost function, in the original edge order.
+    """
+    n_edges = len(graph.targets)
+    sources = np.repeat(np.arange(len(graph.stations)), np.diff(graph.offsets))
+    targets = np.asarray(graph.targets)
+
+    # Parallel edges are adjacent in the edge order, so each run of one (from, to) pair is a group
+    boundary = np.ones(n_edges, dtype=bool)
+    boundary[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+    group = np.cumsum(boundary)
+    position = np.arange(n_edges)
+    order = np.lexsort((position, np.asarray(getattr(graph, cost_attribute)), group))
+    first = np.ones(n_edges, dtype=bool)
+    first[1:] = group[order][1:] != group[order][:-1]
+    kept = np.sort(order[first])
+
+    offsets = np.zeros(len(graph.stations) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources[kept], minlength=len(graph.stations)), out=offsets[1:])
+
+    return graph._replace(
+        offsets=offsets,
+        **{field: np.asarray(getattr(graph, field))[kept]
+           for field in ('targets', 'train', 'stops', 'timeintrain', 'fromislno', 'toislno')})
+
+
+def dijkstra_path_csr(graph: CSRGraph, start: str, target: str, cost_attribute: str):
+    """
+    Dijkstra's algorithm over a CSRGraph; returns the same result as dijkstra_path on the
+    MultiDiGraph it was built from.
+
+    Parameters:
+        graph (CSRGraph): The graph to search.
+        start (str): The starting station.
+        target (str): The target station.
+        cost_attribute (str): The edge cost to use ('stops' or 'timeintrain').
+
+    Returns:
+        tuple: (station_sequence, leg_sequence, total_cost) where leg_sequence holds one
+        (train, fromislno, toislno) per edge of the path
+    """
+    tree = dijkstra_tree_csr(graph, start, cost_attribute, [target])
+    return csr_tree_path(graph, tree, target)
+
+
+def dijkstra_tree_csr(graph: CSRGraph, start: str, cost_attribute: str, targets: list = None,
+                      stats: dict = None):
+    """
+    Dijkstra's algorithm over a CSRGraph, returning the predecessor tree of the start station.
+    With targets the search stops as soon as all of them are settled. If stats is given, the
+    numbers of stations settled, edges relaxed and heap pushes are added to it.
+
+    Returns:
+        tuple: (costs, predecessor_edge, previous_station) indexed by station, or None if the
+        start station is not in the graph
+    """
+    if start not in graph.station_index:
+        return None
+    start = graph.station_index[start]
+    remaining = None
+    if targets is not None:
+        remaining = {graph.station_index[target] for target in targets if target in graph.station_index}
+
+    offsets = memoryview(graph.offsets)
+    targets = memoryview(graph.targets)
+    edge_costs = memoryview(getattr(graph, cost_attribute))
+
+    # Initialize costs to infinity and set the start node cost to 0
+    costs = [float('infinity')] * len(graph.stations)
+    costs[start] = 0
+
+    # Edge index used to reach each station, to reconstruct the path
+    predecessor_edge = [-1] * len(graph.stations)
+    previous_station = [-1] * len(graph.stations)
+
+    # Priority queue to keep track of nodes to visit
+    priority_queue = [(0, start)]  # (current_cost, current_node)
+    settled = relaxed = pushes = 0
+
+    while priority_queue:
+        current_cost, current_node = heapq.heappop(priority_queue)
+
+        # Skip if cost is already outdated
+        if current_cost > costs[current_node]:
+            continue
+        settled += 1
+
+        # Stop once every target is settled
+        if remaining is not None:
+            remaining.discard(current_node)
+            if not remaining:
+                break
+
+        relaxed += offsets[current_node + 1] - offsets[current_node]
+        for edge in range(offsets[current_node], offsets[current_node + 1]):
+            neighbor = targets[edge]
+            travel_cost = current_cost + edge_costs[edge]
+
+            # Only update if this path is shorter
+            if travel_cost < costs[neighbor]:
+                costs[neighbor] = travel_cost
+                predecessor_edge[neighbor] = edge
+                previous_station[neighbor] = current_node
+                heapq.heappush(priority_queue, (travel_cost, neighbor))
+                pushes += 1
+
+    add_counts(stats, settled=settled, relaxed=relaxed, pushes=pushes)
+    return costs, predecessor_edge, previous_station
+
+
+def csr_tree_path(graph: CSRGraph, tree, target: str):
+    """
+    Reconstructs the path to target from a dijkstra_tree_csr result.
+
+    Returns:
+        tuple: (station_sequence, leg_sequence, total_cost), or (None, None, None) if unreachable
+    """
+    if tree is None or target not in graph.station_index:
+        return None, None, None
+    costs, predecessor_edge, previous_station = tree
+    target = graph.station_index[target]
+    if predecessor_edge[target] == -1:
+        return None, None, None
+
+    trains = memoryview(graph.train)
+    from_islnos = memoryview(graph.fromislno)
+    to_islnos = memoryview(graph.toislno)
+
+    # Reconstruct the optimal path
+    station_sequence = [graph.stations[target]]
+    leg_sequence = []
+    current_node = target
+    while predecessor_edge[current_node] != -1:
+        edge = predecessor_edge[current_node]
+        leg_sequence.append((graph.trains[trains[edge]], from_islnos[edge], to_islnos[edge]))
+        current_node = previous_station[current_node]
+        station_sequence.append(graph.stations[current_node])
+
+    return station_sequence[::-1], leg_sequence[::-1], costs[target]
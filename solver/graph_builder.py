@@ -1,12 +1,85 @@
+from bisect import bisect_left
 from collections import defaultdict
-from solver.utils import calculate_time_difference
+from solver.utils import time_difference_seconds, time_to_seconds, SECONDS_PER_DAY
 import pandas as pd
 import networkx as nx
 
 
+def consecutive_stops(schedule_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pairs every stop of a train with its next stop, giving one row per elementary train leg.
+
+    Sorts the schedule once by (train, islno) and pairs the stops through shifted columns, so
+    travel times are computed in a single NumPy pass. Columns are named after the edge attributes
+    of build_graph: from, to, train, timeintrain, departuretime, arrivaltime, fromislno, toislno.
+    """
+    # A stable sort keeps the order the per-train groupby would visit the stops in
+    stops = schedule_df.sort_values(['Train No.', 'islno'], kind='stable')
+
+    trains = stops['Train No.'].to_numpy()
+    stations = stops['station Code'].to_numpy()
+    islnos = stops['islno'].to_numpy()
+    departure_seconds = stops['Departure seconds'].to_numpy()
+    arrival_seconds = stops['Arrival seconds'].to_numpy()
+
+    # Consecutive rows form a leg only if they belong to the same train
+    same_train = trains[:-1] == trains[1:]
+
+    # Overnight travel wraps around midnight, like time_difference_seconds
+    travel_time_seconds = (arrival_seconds[1:] - departure_seconds[:-1]) % SECONDS_PER_DAY
+
+    return pd.DataFrame({
+        'from': stations[:-1][same_train],
+        'to': stations[1:][same_train],
+        'train': trains[:-1][same_train],
+        'timeintrain': travel_time_seconds[same_train],
+        'departuretime': departure_seconds[:-1][same_train],
+        'arrivaltime': arrival_seconds[1:][same_train],
+        'fromislno': islnos[:-1][same_train],
+        'toislno': islnos[1:][same_train]
+    })
+
+
+def _leg_edges(legs: pd.DataFrame):
+    """
+    Yields one (from, to, attributes) station graph edge per row of a consecutive_stops frame.
+    """
+    edges = zip(
+        legs['from'].tolist(),
+        legs['to'].tolist(),
+        legs['train'].tolist(),
+        legs['timeintrain'].tolist(),
+        legs['departuretime'].tolist(),
+        legs['arrivaltime'].tolist(),
+        legs['fromislno'].tolist(),
+        legs['toislno'].tolist()
+    )
+    for from_station, to_station, train_no, travel_time, departure_time, arrival_time, from_islno, to_islno in edges:
+        yield from_station, to_station, {
+            'train': train_no,  # Each edge has a specific train number
+            'stops': 1,  # Default weight (for Stops cost function)
+            'timeintrain': travel_time,  # Travel time in seconds
+            'departuretime': departure_time,  # Seconds since midnight
+            'arrivaltime': arrival_time,  # Seconds since midnight
+            'fromislno': from_islno,
+            'toislno': to_islno
+        }
+
+
 def build_graph(schedule_df: pd.DataFrame) -> nx.MultiDiGraph:
     """
     Builds a directed multigraph from the schedule data using NetworkX, allowing multiple edges between nodes.
+    Produces the same edges, in the same insertion order, as build_graph_iterative.
+    """
+    G = nx.MultiDiGraph()  # MultiDiGraph allows multiple edges between nodes
+    G.add_edges_from(_leg_edges(consecutive_stops(schedule_df)))
+    return G
+
+
+def build_graph_iterative(schedule_df: pd.DataFrame) -> nx.MultiDiGraph:
+    """
+    Builds a directed multigraph from the schedule data using NetworkX, allowing multiple edges between nodes.
+    Row-by-row reference implementation of build_graph, kept for benchmarking and cross-checking.
     """
     G = nx.MultiDiGraph()  # MultiDiGraph allows multiple edges between nodes
 
@@ -18,13 +91,13 @@ def build_graph(schedule_df: pd.DataFrame) -> nx.MultiDiGraph:
         for i in range(len(group) - 1):
             from_station = group.iloc[i]['station Code']
             to_station = group.iloc[i + 1]['station Code']
-            departure_time = group.iloc[i]['Departure time']
-            arrival_time = group.iloc[i + 1]['Arrival time']
+            departure_time = group.iloc[i]['Departure seconds']
+            arrival_time = group.iloc[i + 1]['Arrival seconds']
             from_islno = group.iloc[i]['islno']
             to_islno = group.iloc[i+1]['islno']
             # Calculate travel time in seconds
-            travel_time_seconds = calculate_time_difference(
-                group.iloc[i]['Departure time'], group.iloc[i + 1]['Arrival time']).seconds
+            travel_time_seconds = time_difference_seconds(
+                departure_time, arrival_time)
 
             # Add a directed edge with train-specific attributes
             G.add_edge(
@@ -42,33 +115,91 @@ def build_graph(schedule_df: pd.DataFrame) -> nx.MultiDiGraph:
     return G
 
 
-def expand_graph(graph: nx.MultiDiGraph) -> nx.DiGraph:
+def collapse_parallel_edges(graph: nx.MultiDiGraph, cost_attribute: str) -> nx.MultiDiGraph:
     """
-    Expands a MultiDiGraph to a DiGraph to capture detailed arrival and departure times at stations.
+    Reduces the station graph to one edge per (from, to) pair for a single cost function.
+
+    Only the cheapest parallel edge can be part of a shortest path for 'stops' or 'timeintrain',
+    so the rest are dropped. Of several equally cheap edges the first in iteration order is kept,
+    the one Dijkstra's algorithm picks on the full graph, so searches on the reduced graph return
+    the same paths. Kept edges carry all their attributes (train, fromislno, toislno, ...).
+    """
+    reduced = nx.MultiDiGraph()
+    reduced.add_nodes_from(graph)
+    reduced.add_edges_from(
+        (from_station, to_station, dict(min(edges.values(), key=lambda attribute: attribute[cost_attribute])))
+        for from_station, neighbors in graph.adj.items()
+        for to_station, edges in neighbors.items()
+    )
+    return reduced
+
+
+def _add_train_legs(graph: nx.MultiDiGraph, expanded_graph: nx.DiGraph):
+    """
+    Adds one departure -> arrival edge per train leg to the expanded graph.
+
+    Returns:
+        tuple: (arr_node_dict, dep_node_dict) mapping each station to its arrival and departure
+        nodes and their times
     """
-    expanded_graph = nx.DiGraph()
     arr_node_dict = defaultdict(dict)
     dep_node_dict = defaultdict(dict)
 
     # Add edges between arrival and departure nodes
     for node in graph:
-        for in_edge in graph.in_edges(node, data=True):
-            dep_node = (in_edge[0], in_edge[2]['train'],
-                        in_edge[2]['fromislno'], 'dep')
-            arr_node = (node, in_edge[2]['train'],
-                        in_edge[2]['toislno'], 'arr')
-
-            # Add edge to expanded graph with departure time as an attribute
-            expanded_graph.add_edge(
-                dep_node,
-                arr_node,
-                time=in_edge[2]['timeintrain'],
-                departuretime=in_edge[2]['departuretime']
-            )
+        _add_expanded_legs(graph.in_edges(node, data=True), expanded_graph, arr_node_dict, dep_node_dict)
+
+    return arr_node_dict, dep_node_dict
+
+
+def _add_expanded_legs(edges, expanded_graph: nx.DiGraph, arr_node_dict: dict, dep_node_dict: dict):
+    """
+    Adds the departure -> arrival edge of every (from, to, attributes) station graph edge, recording
+    the new nodes and their times per station in arr_node_dict and dep_node_dict.
+    """
+    for from_station, to_station, attributes in edges:
+        dep_node = (from_station, attributes['train'],
+                    attributes['fromislno'], 'dep')
+        arr_node = (to_station, attributes['train'],
+                    attributes['toislno'], 'arr')
 
-            # Store arrival and departure times in dictionaries
-            arr_node_dict[node][arr_node] = in_edge[2]['arrivaltime']
-            dep_node_dict[in_edge[0]][dep_node] = in_edge[2]['departuretime']
+        # Add edge to expanded graph with departure time as an attribute
+        expanded_graph.add_edge(
+            dep_node,
+            arr_node,
+            time=attributes['timeintrain'],
+            departuretime=attributes['departuretime']
+        )
+
+        # Store arrival and departure times in dictionaries
+        arr_node_dict[to_station][arr_node] = attributes['arrivaltime']
+        dep_node_dict[from_station][dep_node] = attributes['departuretime']
+
+
+def _add_virtual_nodes(node, expanded_graph: nx.DiGraph, arr_nodes: dict, dep_nodes: dict):
+    """
+    Connects a station's virtual start node to its departures and its arrivals to its virtual end node.
+    """
+    # Connect virtual start to all departure nodes
+    for dep_node, dep_time in dep_nodes.items():
+        expanded_graph.add_edge(
+            (node, '0', -1, 'start'),
+            dep_node,
+            time=0,
+            departuretime=dep_time
+        )
+
+    # Connect all arrival nodes to virtual end
+    for arr_node in arr_nodes:
+        expanded_graph.add_edge(arr_node, (node, '0', -1, 'end'), time=0)
+
+
+def expand_graph(graph: nx.MultiDiGraph) -> nx.DiGraph:
+    """
+    Expands a MultiDiGraph to a DiGraph to capture detailed arrival and departure times at stations.
+    """
+    expanded_graph = nx.DiGraph()
+    arr_node_dict, dep_node_dict = _add_train_legs(graph, expanded_graph)
 
     # Ensure every station has virtual start and end connections
     all_nodes = set(graph.nodes())
@@ -76,34 +207,84 @@ def expand_graph(graph: nx.MultiDiGraph) -> nx.DiGraph:
     for node in all_nodes:
         dep_nodes = dep_node_dict.get(node, {})
         arr_nodes = arr_node_dict.get(node, {})
+        _add_virtual_nodes(node, expanded_graph, arr_nodes, dep_nodes)
+
+        _add_transfers(expanded_graph, arr_nodes, dep_nodes)
+
+    return expanded_graph
+
 
-        # Connect virtual start to all departure nodes
+def _add_transfers(expanded_graph: nx.DiGraph, arr_nodes: dict, dep_nodes: dict):
+    """
+    Connects every arrival node to every departure node of the same station, weighted by the wait.
+    """
+    for arr_node, arr_time in arr_nodes.items():
         for dep_node, dep_time in dep_nodes.items():
-            expanded_graph.add_edge(
-                (node, '0', -1, 'start'),
-                dep_node,
-                time=0,
-                departuretime=dep_time
-            )
+            time_spent = time_difference_seconds(arr_time, dep_time)
+            expanded_graph.add_edge(arr_node, dep_node, time=time_spent)
 
-        # Connect all arrival nodes to virtual end
-        for arr_node in arr_nodes:
-            expanded_graph.add_edge(arr_node, (node, '0', -1, 'end'), time=0)
 
-        # Connect all arrival nodes to departure nodes within the same station
-        for arr_node, arr_time in arr_nodes.items():
-            for dep_node, dep_time in dep_nodes.items():
-                time_spent = calculate_time_difference(
-                    arr_time, dep_time).seconds
-                expanded_graph.add_edge(arr_node, dep_node, time=time_spent)
+def expand_graph_sparse(graph: nx.MultiDiGraph) -> nx.DiGraph:
+    """
+    Expands a MultiDiGraph like expand_graph, but models transfers with O(events) edges.
+
+    Every departure gets a waiting node (station, train, islno, 'wait'). A station's waiting nodes
+    are chained in departure-time order, wrapping around midnight, and each leads to its departure
+    node at no cost. An arrival only connects to the waiting node of the next departure, so any
+    later departure is reached by waiting along the chain, at the same total cost as the direct
+    arrival -> departure edges of expand_graph.
+    """
+    expanded_graph = nx.DiGraph()
+    arr_node_dict, dep_node_dict = _add_train_legs(graph, expanded_graph)
+
+    for node in set(graph.nodes()):
+        dep_nodes = dep_node_dict.get(node, {})
+        arr_nodes = arr_node_dict.get(node, {})
+        _add_virtual_nodes(node, expanded_graph, arr_nodes, dep_nodes)
+        _add_waiting_chain(expanded_graph, arr_nodes, dep_nodes)
 
     return expanded_graph
 
 
-def adjust_start_times(graph: nx.DiGraph, start_station: str, input_time: str) -> nx.DiGraph:
+def _add_waiting_chain(expanded_graph: nx.DiGraph, arr_nodes: dict, dep_nodes: dict):
+    """
+    Adds the waiting nodes of expand_graph_sparse for the arrival and departure nodes of one station.
+    """
+    if not dep_nodes:
+        return
+
+    # Chain the departures in time order; the last one waits on to the first one of the next day.
+    # Departures at the same time are ordered by node, so the chain does not depend on build order
+    departures = sorted(dep_nodes.items(), key=lambda item: (item[1], item[0]))
+    dep_times = [dep_time for _, dep_time in departures]
+    wait_nodes = [dep_node[:3] + ('wait',) for dep_node, _ in departures]
+    for i, (dep_node, dep_time) in enumerate(departures):
+        expanded_graph.add_edge(wait_nodes[i], dep_node, time=0)
+        next_i = (i + 1) % len(departures)
+        if next_i == i:
+            continue
+        expanded_graph.add_edge(
+            wait_nodes[i], wait_nodes[next_i],
+            time=time_difference_seconds(dep_time, dep_times[next_i]))
+
+    # Connect each arrival only to the next departure
+    for arr_node, arr_time in arr_nodes.items():
+        next_i = bisect_left(dep_times, arr_time) % len(departures)
+        expanded_graph.add_edge(
+            arr_node, wait_nodes[next_i],
+            time=time_difference_seconds(arr_time, dep_times[next_i]))
+
+
+def adjust_start_times(graph: nx.DiGraph, start_station: str, input_time) -> nx.DiGraph:
     """
     Adjusts the edge weights from the virtual start node of a specific station based on the provided input time.
+    The input time is either a "HH:MM:SS" string or seconds since midnight.
+    This copies the whole graph; dijkstra_path_expanded_graph(..., departure_time=...) applies the
+    same waits at query time without copying.
     """
+    if isinstance(input_time, str):
+        input_time = time_to_seconds(input_time)
+
     adjusted_graph = graph.copy()
     virtual_start_node = (start_station, '0', -1, 'start')
 
@@ -111,7 +292,7 @@ def adjust_start_times(graph: nx.DiGraph, start_station: str, input_time: str) -
         # Iterate over edges from the virtual start node
         for neighbor in list(graph.neighbors(virtual_start_node)):
             dep_time = graph[virtual_start_node][neighbor]['departuretime']
-            wait_time = calculate_time_difference(input_time, dep_time).seconds
+            wait_time = time_difference_seconds(input_time, dep_time)
 
             # Update the time attribute for the edge
             adjusted_graph[virtual_start_node][neighbor]['time'] = wait_time
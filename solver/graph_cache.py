@@ -0,0 +1,124 @@
+import glob
+import hashlib
+import os
+import pickle
+import shutil
+from pathlib import Path
+import numpy as np
+
+# Bump whenever a builder changes its output, so caches written by older code are rebuilt
+BUILDER_VERSION = 3
+
+DEFAULT_CACHE_DIR = "tmp/cache"
+
+
+def schedule_fingerprint(schedule_file_path: str, kind: str) -> str:
+    """
+    Hashes the schedule CSV contents together with the builder version and the structure kind.
+    """
+    digest = hashlib.sha256(f"{BUILDER_VERSION}:{kind}:".encode())
+    with open(schedule_file_path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def _location(schedule_file_path: str) -> str:
+    """
+    Short hash of the resolved schedule path, so same-named schedules in different directories get
+    their own cache entries.
+    """
+    return hashlib.sha256(str(Path(schedule_file_path).resolve()).encode()).hexdigest()[:8]
+
+
+def _is_array_structure(structure) -> bool:
+    """
+    Tells whether a structure is a NamedTuple whose array fields can be stored as .npy files.
+    """
+    return isinstance(structure, tuple) and hasattr(structure, '_fields')
+
+
+def _save(directory: Path, structure):
+    """
+    Writes a structure to a cache directory.
+
+    NamedTuples (Timetable, CSRGraph, ...) store every NumPy field as its own .npy file so it can be
+    memory-mapped on load; everything else, including networkx graphs and DataFrames, is pickled.
+    """
+    directory.mkdir(parents=True)
+    if _is_array_structure(structure):
+        arrays = {name: value for name, value in zip(structure._fields, structure)
+                  if isinstance(value, np.ndarray)}
+        for name, value in arrays.items():
+            np.save(directory / f"{name}.npy", np.ascontiguousarray(value))
+        meta = {
+            'type': type(structure),
+            'fields': {name: value for name, value in zip(structure._fields, structure) if name not in arrays},
+            'arrays': list(arrays)
+        }
+    else:
+        meta = {'type': None, 'object': structure}
+
+    with open(directory / "meta.pkl", 'wb') as fp:
+        pickle.dump(meta, fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load(directory: Path):
+    """
+    Reads a structure written by _save, memory-mapping its arrays.
+    """
+    with open(directory / "meta.pkl", 'rb') as fp:
+        meta = pickle.load(fp)
+
+    if meta['type'] is None:
+        return meta['object']
+
+    fields = dict(meta['fields'])
+    for name in meta['arrays']:
+        fields[name] = np.load(directory / f"{name}.npy", mmap_mode='r')
+    return meta['type'](**fields)
+
+
+def load_or_build(schedule_file_path: str, kind: str, builder, cache_dir: str = DEFAULT_CACHE_DIR):
+    """
+    Returns the cached structure of the given kind for a schedule, building and storing it if needed.
+
+    Parameters:
+        schedule_file_path (str): The schedule CSV the structure is built from.
+        kind (str): Name of the structure, e.g. 'schedule', 'csr' or 'timetable'.
+        builder (callable): Called without arguments to build the structure on a cache miss.
+        cache_dir (str): Directory holding the cache entries.
+
+    Returns:
+        The cached or freshly built structure.
+    """
+    prefix = f"{Path(schedule_file_path).stem}-{_location(schedule_file_path)}-{kind}"
+    fingerprint = schedule_fingerprint(schedule_file_path, kind)
+    cache_root = Path(cache_dir)
+    directory = cache_root / f"{prefix}-{fingerprint}"
+
+    if (directory / "meta.pkl").exists():
+        try:
+            return _load(directory)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError) as e:
+            print(f"Warning: discarding unreadable cache entry {directory}: {e}")
+            shutil.rmtree(directory, ignore_errors=True)
+
+    structure = builder()
+
+    # Drop entries for older versions of this schedule file, then write the new one atomically
+    for stale in cache_root.glob(f"{glob.escape(prefix)}-{'[0-9a-f]' * 16}"):
+        shutil.rmtree(stale, ignore_errors=True)
+    partial = cache_root / f".{directory.name}.{os.getpid()}"
+    try:
+        _save(partial, structure)
+        os.replace(partial, directory)
+    except OSError as e:
+        print(f"Warning: could not write cache entry {directory}: {e}")
+        shutil.rmtree(partial, ignore_errors=True)
+        return structure
+
+    # Hand back the memory-mapped arrays so a cold and a warm run behave the same
+    if _is_array_structure(structure):
+        return _load(directory)
+    return structure
@@ -0,0 +1,48 @@
+import json
+import resource
+import time
+from contextlib import contextmanager
+
+
+def add_counts(stats: dict, **counts):
+    """
+    Adds counts to a stats dict. Without stats (None) it does nothing, so searches can report
+    their counters unconditionally once they finish.
+    """
+    if stats is None:
+        return
+    for name, value in counts.items():
+        stats[name] = stats.get(name, 0) + value
+
+
+@contextmanager
+def timer(stats: dict, name: str):
+    """
+    Adds the wall time of the with-block to stats['<name>_seconds']; without stats it only runs the block.
+    """
+    if stats is None:
+        yield
+        return
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_counts(stats, **{f"{name}_seconds": time.perf_counter() - begin})
+
+
+def peak_rss_mib() -> dict:
+    """
+    Peak resident set size of this process and of its finished child processes (e.g. pool workers), in MiB.
+    """
+    # ru_maxrss is in KiB on Linux
+    return {'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'peak_rss_children_mib': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024}
+
+
+def write_json_lines(file_path: str, records):
+    """
+    Writes one JSON object per line. NumPy scalars are written as plain numbers.
+    """
+    with open(file_path, 'w') as fp:
+        for record in records:
+            fp.write(json.dumps(record, default=lambda value: value.item()) + '\n')
@@ -0,0 +1,235 @@
+import heapq
+from typing import NamedTuple
+import numpy as np
+from solver.csr_graph import CSRGraph, csr_tree_path
+from solver.instrumentation import add_counts
+
+# Distance table entry of a station that cannot reach or be reached from a landmark
+UNREACHABLE = np.iinfo(np.int32).max
+
+
+class Landmarks(NamedTuple):
+    """
+    Landmark distance tables of a CSRGraph for A* with ALT lower bounds.
+
+    For every landmark L and station v, *_from holds the cost from L to v and *_to the cost from v
+    to L, per cost function. By the triangle inequality, the cost from v to a target t is at
+    least from[L, t] - from[L, v] and at least to[L, v] - to[L, t].
+    """
+    landmarks: np.ndarray  # Station index per landmark
+    stops_from: np.ndarray  # (landmarks, stations)
+    stops_to: np.ndarray
+    timeintrain_from: np.ndarray
+    timeintrain_to: np.ndarray
+
+
+class ALTGraph(NamedTuple):
+    """
+    A CSRGraph with its landmark tables. solve_cost_function answers 'stops' and 'timeintrain' on
+    it with astar_path_csr instead of Dijkstra's algorithm.
+    """
+    graph: CSRGraph
+    landmarks: Landmarks
+
+
+def _reduced_adjacency(graph: CSRGraph, cost_attribute: str, reverse: bool = False) -> tuple:
+    """
+    Adjacency of the station graph with parallel edges collapsed to their cheapest one, optionally reversed.
+
+    Returns:
+        tuple: (offsets, neighbors, costs) in CSR layout
+    """
+    sources = np.repeat(np.arange(len(graph.stations)), np.diff(graph.offsets))
+    targets = np.asarray(graph.targets, dtype=np.int64)
+    costs = np.asarray(getattr(graph, cost_attribute), dtype=np.int64)
+    if reverse:
+        sources, targets = targets, sources
+
+    # Keep the cheapest edge of every (source, target) pair
+    order = np.lexsort((costs, targets, sources))
+    sources, targets, costs = sources[order], targets[order], costs[order]
+    first = np.ones(len(sources), dtype=bool)
+    first[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+    sources, targets, costs = sources[first], targets[first], costs[first]
+
+    offsets = np.zeros(len(graph.stations) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=len(graph.stations)), out=offsets[1:])
+    return offsets.tolist(), targets.tolist(), costs.tolist()
+
+
+def _distances(adjacency: tuple, source: int) -> np.ndarray:
+    """
+    Dijkstra's algorithm from source over a _reduced_adjacency, to every station.
+    """
+    offsets, neighbors, edge_costs = adjacency
+    costs = [UNREACHABLE] * (len(offsets) - 1)
+    costs[source] = 0
+    priority_queue = [(0, source)]
+    while priority_queue:
+        current_cost, current_node = heapq.heappop(priority_queue)
+        if current_cost > costs[current_node]:
+            continue
+        for edge in range(offsets[current_node], offsets[current_node + 1]):
+            neighbor = neighbors[edge]
+            travel_cost = current_cost + edge_costs[edge]
+            if travel_cost < costs[neighbor]:
+                costs[neighbor] = travel_cost
+                heapq.heappush(priority_queue, (travel_cost, neighbor))
+    return np.minimum(np.array(costs, dtype=np.int64), UNREACHABLE).astype(np.int32)
+
+
+def build_landmarks(graph: CSRGraph, count: int = 16) -> Landmarks:
+    """
+    Selects landmark stations and computes their distance tables.
+
+    Landmarks are chosen by farthest selection on the 'stops' costs. The first is the station
+    farthest from the best-connected station, and every further one is the station farthest from
+    all landmarks chosen so far, so that the landmarks lie spread out on the edge of the network.
+    Stations that cannot reach or be reached from a landmark do not count towards its distance.
+    """
+    count = min(count, len(graph.stations))
+    adjacency = {(cost_attribute, reverse): _reduced_adjacency(graph, cost_attribute, reverse)
+                 for cost_attribute in ('stops', 'timeintrain') for reverse in (False, True)}
+
+    def round_trip(station):
+        # Hops from and to station, counting unreachable stations as 0
+        there = _distances(adjacency[('stops', False)], station).astype(np.int64)
+        back = _distances(adjacency[('stops', True)], station).astype(np.int64)
+        there[there == UNREACHABLE] = 0
+        back[back == UNREACHABLE] = 0
+        return there + back
+
+    hub = int(np.argmax(np.diff(graph.offsets)))
+    landmarks = [int(np.argmax(round_trip(hub)))]
+    spread = round_trip(landmarks[0])
+    while len(landmarks) < count:
+        spread[landmarks] = -1
+        landmarks.append(int(np.argmax(spread)))
+        spread = np.minimum(spread, round_trip(landmarks[-1]))
+
+    tables = {}
+    for cost_attribute in ('stops', 'timeintrain'):
+        tables[f"{cost_attribute}_from"] = np.stack(
+            [_distances(adjacency[(cost_attribute, False)], landmark) for landmark in landmarks])
+        tables[f"{cost_attribute}_to"] = np.stack(
+            [_distances(adjacency[(cost_attribute, True)], landmark) for landmark in landmarks])
+
+    return Landmarks(landmarks=np.array(landmarks, dtype=np.int32), **tables)
+
+
+def landmark_bound(landmarks: Landmarks, cost_attribute: str, source: int, target: int, active: int = 16):
+    """
+    ALT lower bound on the cost from a station to target, as a function of the station index.
+
+    Each landmark gives two bounds, from[L, t] - from[L, v] and to[L, v] - to[L, t]. Only the
+    active bounds that are largest at source are used. A maximum of consistent bounds is still
+    consistent, so the heuristic stays exact. Only the source's and target's entries of the tables
+    are read up front. A station's bound is computed from its own entries when it is asked for, so
+    a query does no work for stations it never reaches. Landmarks that cannot reach the target, or
+    that the target cannot reach, give no bound. The maximum of the bounds and 0 is a consistent
+    heuristic for A*.
+    """
+    # (landmark's entry for the target, landmark's row) per usable bound, with the bounds that are
+    # largest at source first
+    forward = [(int(row[target]), row) for row in getattr(landmarks, f"{cost_attribute}_from")
+               if row[target] != UNREACHABLE and row[source] != UNREACHABLE]
+    backward = [(int(row[target]), row) for row in getattr(landmarks, f"{cost_attribute}_to")
+                if row[target] != UNREACHABLE and row[source] != UNREACHABLE]
+    ranked = sorted([(from_target - int(row[source]), True, i) for i, (from_target, row) in enumerate(forward)]
+                    + [(int(row[source]) - to_target, False, i) for i, (to_target, row) in enumerate(backward)],
+                    reverse=True)[:active]
+    forward = [(forward[i][0], memoryview(forward[i][1])) for _, is_forward, i in ranked if is_forward]
+    backward = [(backward[i][0], memoryview(backward[i][1])) for _, is_forward, i in ranked if not is_forward]
+
+    # A station the landmark cannot be reached from gets a negative forward bound, and the target
+    # cannot be reached from a station that cannot reach the landmark, so its backward bound may
+    # be as large as UNREACHABLE makes it; neither needs a check
+    def bound(station: int) -> int:
+        best = 0
+        for from_target, from_landmark in forward:
+            if from_target - from_landmark[station] > best:
+                best = from_target - from_landmark[station]
+        for to_target, to_landmark in backward:
+            if to_landmark[station] - to_target > best:
+                best = to_landmark[station] - to_target
+        return best
+
+    return bound
+
+
+def astar_path_csr(graph: CSRGraph, landmarks: Landmarks, start: str, target: str, cost_attribute: str,
+                   stats: dict = None):
+    """
+    A* search over a CSRGraph guided by ALT landmark bounds.
+
+    The bounds are consistent, so the search settles every station at its exact cost and the
+    path cost equals the one from dijkstra_path_csr. Among paths of equal cost the two searches
+    may return different ones.
+
+    Parameters:
+        graph (CSRGraph): The graph to search.
+        landmarks (Landmarks): Distance tables from build_landmarks for this graph.
+        start (str), target (str): The stations of the query.
+        cost_attribute (str): The edge cost to use ('stops' or 'timeintrain').
+        stats (dict): If given, the numbers of stations settled, edges relaxed and heap pushes are added to it.
+
+    Returns:
+        tuple: (station_sequence, leg_sequence, total_cost), or (None, None, None) if unreachable
+    """
+    if start not in graph.station_index or target not in graph.station_index:
+        return None, None, None
+    source = graph.station_index[start]
+    destination = graph.station_index[target]
+    bound = landmark_bound(landmarks, cost_attribute, source, destination)
+    bounds = [None] * len(graph.stations)  # Computed when a station is first popped
+    bounds[source] = bound(source)
+
+    offsets = memoryview(graph.offsets)
+    targets = memoryview(graph.targets)
+    edge_costs = memoryview(getattr(graph, cost_attribute))
+
+    costs = [float('infinity')] * len(graph.stations)
+    costs[source] = 0
+    predecessor_edge = [-1] * len(graph.stations)
+    previous_station = [-1] * len(graph.stations)
+
+    # Ordered by cost so far plus the bound of the rest. A station is pushed with its bound if it
+    # is known, else with the bound of the station it is reached from less the edge cost, which the
+    # consistent bounds never exceed. Its own bound is computed when it is popped, and it is pushed
+    # again if that raises its key, so stations are still settled in key order. Of equal keys the
+    # station with the higher cost so far, nearer the target, goes first (hence the negated cost)
+    priority_queue = [(bounds[source], 0, source)]
+    settled = relaxed = pushes = 0
+    while priority_queue:
+        key, negated_cost, current_node = heapq.heappop(priority_queue)
+        current_cost = -negated_cost
+        if current_cost > costs[current_node]:
+            continue
+        if bounds[current_node] is None:
+            bounds[current_node] = bound(current_node)
+        current_key = current_cost + bounds[current_node]
+        if current_key > key:
+            heapq.heappush(priority_queue, (current_key, -current_cost, current_node))
+            pushes += 1
+            continue
+        settled += 1
+        if current_node == destination:
+            break
+
+        relaxed += offsets[current_node + 1] - offsets[current_node]
+        for edge in range(offsets[current_node], offsets[current_node + 1]):
+            neighbor = targets[edge]
+            travel_cost = current_cost + edge_costs[edge]
+            if travel_cost < costs[neighbor]:
+                costs[neighbor] = travel_cost
+                predecessor_edge[neighbor] = edge
+                previous_station[neighbor] = current_node
+                if bounds[neighbor] is None:
+                    neighbor_key = travel_cost if travel_cost > current_key else current_key
+                else:
+                    neighbor_key = travel_cost + bounds[neighbor]
+                heapq.heappush(priority_queue, (neighbor_key, -travel_cost, neighbor))
+                pushes += 1
+
+    add_counts(stats, settled=settled, relaxed=relaxed, pushes=pushes)
+    return csr_tree_path(graph, (costs, predecessor_edge, previous_station), target)
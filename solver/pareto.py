@@ -0,0 +1,243 @@
+import heapq
+from bisect import bisect_left
+from itertools import count
+from typing import NamedTuple
+from solver.connection_scan import Timetable, _destinations
+from solver.utils import SECONDS_PER_DAY
+
+# Fields of a search label, kept as plain tuples for speed
+DEPARTURE, ARRIVAL, TRANSFERS, STOPS, TIMEINTRAIN, TRAIN, ISLNO, PARENT, CONNECTION = range(9)
+
+
+class Journey(NamedTuple):
+    """
+    One Pareto-optimal journey. Times are seconds since midnight of the query's departure day.
+    """
+    departure: int
+    arrival: int
+    transfers: int
+    stops: int
+    timeintrain: int
+    legs: list  # (train, fromislno, toislno) per connection
+
+
+def _dominates(a: tuple, b: tuple, seated: bool = True) -> bool:
+    """
+    Whether label a is at least as good as label b in every criterion.
+
+    A label seated in a train can continue in it without a transfer, so a label sitting in another
+    train only dominates it with at least one transfer less. At the target, where journeys end,
+    seated=False ignores the train.
+    """
+    if a[DEPARTURE] < b[DEPARTURE] or a[ARRIVAL] > b[ARRIVAL] \
+            or a[STOPS] > b[STOPS] or a[TIMEINTRAIN] > b[TIMEINTRAIN]:
+        return False
+    if not seated or (a[TRAIN] == b[TRAIN] and a[ISLNO] == b[ISLNO]):
+        return a[TRANSFERS] <= b[TRANSFERS]
+    return a[TRANSFERS] < b[TRANSFERS]
+
+
+def _lower_bounds(timetable: Timetable, destination: int) -> tuple:
+    """
+    Fewest stops and least time in train from every station to the destination, ignoring departure
+    times, by two Dijkstra searches backwards over the connections.
+
+    Returns:
+        tuple: (stops, timeintrain) lists per station index; infinity where the destination is unreachable
+    """
+    incoming = {}
+    for origin, to, time_in_train in zip(timetable.from_station.tolist(), timetable.to_station.tolist(),
+                                         (timetable.arrival - timetable.departure).tolist()):
+        incoming.setdefault(to, {})
+        # Parallel connections only need their shortest time in train
+        if time_in_train < incoming[to].get(origin, float('infinity')):
+            incoming[to][origin] = time_in_train
+
+    bounds = []
+    for weight in (lambda time_in_train: 1, lambda time_in_train: time_in_train):
+        costs = [float('infinity')] * len(timetable.stations)
+        costs[destination] = 0
+        heap = [(0, destination)]
+        while heap:
+            cost, station = heapq.heappop(heap)
+            if cost > costs[station]:
+                continue
+            for origin, time_in_train in incoming.get(station, {}).items():
+                new_cost = cost + weight(time_in_train)
+                if new_cost < costs[origin]:
+                    costs[origin] = new_cost
+                    heapq.heappush(heap, (new_cost, origin))
+        bounds.append(costs)
+    return tuple(bounds)
+
+
+def _insert(bag: list, label: tuple, seated: bool = True) -> bool:
+    """
+    Adds a label to a bag unless it is dominated, removing the labels it dominates.
+    """
+    for other in bag:
+        if _dominates(other, label, seated):
+            return False
+    bag[:] = [other for other in bag if not _dominates(label, other, seated)]
+    bag.append(label)
+    return True
+
+
+def pareto_scan(timetable: Timetable, start: str, target: str, departure_time: int = 0,
+                max_days: int = 7) -> list:
+    """
+    Multi-criteria Connection Scan: all Pareto-optimal journeys from start to target.
+
+    The criteria are departure (later is better), arrival, transfers, stops and time in train.
+    Journeys leave start within one day from departure_time. The schedule repeats daily, so this
+    covers every departure time of the day. Every station keeps a bag of non-dominated labels.
+    Connections are scanned in departure order, wrapping into the following days, and extend the
+    labels of their departure station.
+
+    A label is dropped once a journey already found at the target is at least as good as the best
+    the label could still become. That bound uses the fewest stops and least time in train left to
+    the target. The scan ends when the last label is dropped, or after max_days days. Only
+    journeys arriving within max_days can be missed, which matters for minimum-stops or
+    minimum-time-in-train journeys that wait several days between trains.
+
+    The legacy cost functions are derived from the result with pareto_cost.
+
+    Parameters:
+        timetable (Timetable): The connections to scan.
+        start (str), target (str): The stations of the query.
+        departure_time (int): Start of the departure window, in seconds since midnight.
+        max_days (int): Length of the scanned period in days.
+
+    Returns:
+        list: Journey per Pareto-optimal journey, sorted by departure
+    """
+    source = timetable.station_index.get(start)
+    destination = _destinations(timetable, source, [target]).get(target)
+    if source is None or destination is None:
+        return []
+
+    least_stops, least_time = _lower_bounds(timetable, destination)
+    # Highest islno at which each train stops at the destination; seated labels of these trains
+    # can still reach it without a transfer
+    reaches_target = {}
+    for train, to, islno in zip(timetable.train.tolist(), timetable.to_station.tolist(), timetable.to_islno.tolist()):
+        if to == destination:
+            reaches_target[train] = max(islno, reaches_target.get(train, islno))
+
+    departure = memoryview(timetable.departure)
+    arrival = memoryview(timetable.arrival)
+    from_station = memoryview(timetable.from_station)
+    to_station = memoryview(timetable.to_station)
+    train = memoryview(timetable.train)
+    from_islno = memoryview(timetable.from_islno)
+    to_islno = memoryview(timetable.to_islno)
+    n = len(departure)
+
+    bags = [[] for _ in timetable.stations]
+    results = bags[destination]
+
+    def hopeless(label: tuple, now: int) -> bool:
+        # The best the label could still reach at the target, compared with the journeys found so far
+        station = to_station[label[CONNECTION]]
+        transfers = label[TRANSFERS]
+        if reaches_target.get(label[TRAIN], -1) <= label[ISLNO]:
+            transfers += 1
+        departure_bound, arrival_bound = label[DEPARTURE], max(label[ARRIVAL], now)
+        stops_bound = label[STOPS] + least_stops[station]
+        time_bound = label[TIMEINTRAIN] + least_time[station]
+        for journey in results:
+            if journey[DEPARTURE] >= departure_bound and journey[ARRIVAL] <= arrival_bound \
+                    and journey[STOPS] <= stops_bound and journey[TIMEINTRAIN] <= time_bound \
+                    and journey[TRANSFERS] <= transfers:
+                return True
+        return False
+
+    window_end = departure_time + SECONDS_PER_DAY
+    horizon = departure_time + max_days * SECONDS_PER_DAY
+    first = bisect_left(departure, departure_time % SECONDS_PER_DAY)
+    done = False
+    for day_offset in count(departure_time - departure_time % SECONDS_PER_DAY, SECONDS_PER_DAY):
+        for i in range(first, n):
+            dep = departure[i] + day_offset
+            if dep >= horizon:
+                done = True
+                break
+
+            origin = from_station[i]
+            to = to_station[i]
+            if origin == destination or to == source or least_stops[to] == float('infinity'):
+                continue
+            arr = arrival[i] + day_offset
+            time_in_train = arr - dep
+
+            new_labels = []
+            if origin == source and dep < window_end:
+                new_labels.append((dep, arr, 0, 1, time_in_train, train[i], to_islno[i], None, i))
+            for label in bags[origin]:
+                if label[ARRIVAL] > dep:
+                    continue
+                seated = label[TRAIN] == train[i] and label[ISLNO] == from_islno[i]
+                new_labels.append((label[DEPARTURE], arr, label[TRANSFERS] + (0 if seated else 1),
+                                   label[STOPS] + 1, label[TIMEINTRAIN] + time_in_train,
+                                   train[i], to_islno[i], label, i))
+
+            for label in new_labels:
+                if to == destination:
+                    _insert(results, label, seated=False)
+                elif not any(_dominates(other, label) for other in bags[to]) and not hopeless(label, arr):
+                    _insert(bags[to], label)
+
+        # Once no journey can leave the start any more, drop the labels that cannot improve the result
+        now = day_offset + SECONDS_PER_DAY
+        if not done and now >= window_end:
+            live = False
+            for station, bag in enumerate(bags):
+                if station != destination and bag:
+                    bag[:] = [label for label in bag if not hopeless(label, now)]
+                    live = live or bool(bag)
+            done = not live
+        if done:
+            break
+        first = 0
+
+    journeys = []
+    for label in sorted(results, key=lambda label: label[:TRAIN]):
+        connections = []
+        step = label
+        while step is not None:
+            connections.append(step[CONNECTION])
+            step = step[PARENT]
+        legs = [(timetable.trains[timetable.train[i]], int(timetable.from_islno[i]), int(timetable.to_islno[i]))
+                for i in reversed(connections)]
+        journeys.append(Journey(label[DEPARTURE], label[ARRIVAL], label[TRANSFERS], label[STOPS],
+                                label[TIMEINTRAIN], legs))
+    return journeys
+
+
+def pareto_cost(journeys: list, cost_function: str, departure_time: int = None):
+    """
+    Derives a legacy cost function's answer from a pareto_scan result.
+
+    'stops' and 'timeintrain' take the journey minimizing that criterion and 'traveltime' the one
+    minimizing arrival minus departure. 'arrivaltime' takes the earliest arrival and needs the scan to
+    have started at the query's departure_time.
+
+    Returns:
+        tuple: (legs, total_cost) like the scan_* functions, with arrivaltime costs in seconds after
+        departure_time, or (None, None)
+    """
+    if not journeys:
+        return None, None
+    if cost_function == 'stops':
+        best = min(journeys, key=lambda journey: journey.stops)
+        return best.legs, best.stops
+    if cost_function == 'timeintrain':
+        best = min(journeys, key=lambda journey: journey.timeintrain)
+        return best.legs, best.timeintrain
+    if cost_function == 'traveltime':
+        best = min(journeys, key=lambda journey: journey.arrival - journey.departure)
+        return best.legs, best.arrival - best.departure
+    if cost_function == 'arrivaltime':
+        best = min(journeys, key=lambda journey: journey.arrival)
+        return best.legs, best.arrival - departure_time
+    raise ValueError(f"unknown cost function {cost_function}")
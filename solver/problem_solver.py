@@ -1,5 +1,10 @@
+import numpy as np
 import pandas as pd
 from itertools import groupby
+from solver.utils import time_column_to_seconds
+
+# Columns of the schedule CSV the solver uses
+SCHEDULE_COLUMNS = ['Train No.', 'islno', 'station Code', 'Arrival time', 'Departure time']
 
 
 def load_problems_csv(problems_file_path: str) -> pd.DataFrame:
@@ -49,12 +54,72 @@ def read_and_preprocess_csv(schedule_file_path: str) -> pd.DataFrame:
         "'")
     schedule_df['station Code'] = schedule_df['station Code'].str.strip()
 
+    # Normalize times once to integer seconds since midnight; the solver only works on these
+    schedule_df['Arrival seconds'] = time_column_to_seconds(
+        schedule_df['Arrival time'])
+    schedule_df['Departure seconds'] = time_column_to_seconds(
+        schedule_df['Departure time'])
+
     return schedule_df
 
 
+def _strip_categories(column: pd.Series, chars=None) -> pd.Series:
+    """
+    Strips a categorical column by stripping its categories, so the work is per distinct value.
+    Categories that become equal are merged and the categories stay sorted.
+    """
+    categories, inverse = np.unique(
+        column.cat.categories.str.strip(chars).to_numpy(dtype=object), return_inverse=True)
+    codes = column.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, inverse[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories), index=column.index, name=column.name)
+
+
+def _category_seconds(column: pd.Series) -> np.ndarray:
+    """
+    Converts a categorical "HH:MM:SS" column to seconds since midnight, parsing each distinct time once.
+    """
+    seconds = time_column_to_seconds(pd.Series(column.cat.categories)).to_numpy(dtype=np.int32)
+    return seconds[column.cat.codes.to_numpy()]
+
+
+def load_schedule(schedule_file_path: str) -> pd.DataFrame:
+    """
+    Loads the schedule dataset with compact, explicitly typed columns.
+
+    Only the columns the solver needs are parsed. Train numbers, station codes and times are read
+    as categoricals, so quotes and whitespace are stripped once per distinct value, and islnos and
+    the integer time columns are 32-bit. The result is sorted by (train, islno) and otherwise has
+    the same columns and values as read_and_preprocess_csv.
+    """
+    schedule_df = pd.read_csv(
+        schedule_file_path,
+        usecols=SCHEDULE_COLUMNS,
+        dtype={
+            'Train No.': 'category',
+            'islno': np.int32,
+            'station Code': 'category',
+            'Arrival time': 'category',
+            'Departure time': 'category'
+        })
+
+    # Strip unwanted characters from relevant columns
+    schedule_df['Train No.'] = _strip_categories(schedule_df['Train No.'], "'")
+    schedule_df['Arrival time'] = _strip_categories(schedule_df['Arrival time'], "'")
+    schedule_df['Departure time'] = _strip_categories(schedule_df['Departure time'], "'")
+    schedule_df['station Code'] = _strip_categories(schedule_df['station Code'])
+
+    # Integer seconds since midnight, as in read_and_preprocess_csv
+    schedule_df['Arrival seconds'] = _category_seconds(schedule_df['Arrival time'])
+    schedule_df['Departure seconds'] = _category_seconds(schedule_df['Departure time'])
+
+    # Categories are sorted, so this is the same order as sorting the train number strings
+    return schedule_df.sort_values(['Train No.', 'islno'], kind='stable', ignore_index=True)
+
+
 def construct_connection_expanded_graph(path: list) -> str:
-    # Given data as a list of tuples
-    path = path[1:]
+    # Given data as a list of tuples; waiting nodes of expand_graph_sparse are not part of a train
+    path = [node for node in path[1:] if node[3] != 'wait']
     connections = []
     # Group train sequences while tracking segments
     train_segment = []
@@ -74,9 +139,36 @@ def construct_connection_expanded_graph(path: list) -> str:
     return (" ; ".join(connections))
 
 
-def construct_connection(schedule_df, station_sequence, train_sequence):
+def construct_connection_from_legs(legs: list) -> str:
+    """
+    Formats a list of (train, fromislno, toislno) legs, merging consecutive legs of the same train.
+    """
+    connections = []
+    for train_no, from_islno, to_islno in legs:
+        if connections and connections[-1][0] == train_no:
+            connections[-1][2] = to_islno
+        else:
+            connections.append([train_no, from_islno, to_islno])
+
+    return ' ; '.join(f"{train_no} : {from_islno} -> {to_islno}" for train_no, from_islno, to_islno in connections)
+
+
+def build_islno_index(schedule_df: pd.DataFrame) -> dict:
+    """
+    Maps (train, station) to the islno of the train's first stop at that station, in one pass over the schedule.
+    """
+    first_stops = schedule_df.drop_duplicates(['Train No.', 'station Code'])
+    return dict(zip(
+        zip(first_stops['Train No.'].tolist(), first_stops['station Code'].tolist()),
+        first_stops['islno'].tolist()))
+
+
+def construct_connection(islno_index: dict, station_sequence, train_sequence):
     """
     Constructs the formatted connection string from station and train sequences.
+
+    The islnos are looked up in islno_index; build it once per schedule with build_islno_index and
+    reuse it for every answer.
     """
     identical_train_groups = [list(y) for _, y in groupby(train_sequence)]
 
@@ -98,10 +190,8 @@ def construct_connection(schedule_df, station_sequence, train_sequence):
         end_station = station_seq[i + 1]
 
         # Fetch islno for both stations
-        start_islno = schedule_df[(schedule_df['Train No.'] == train_no) &
-                                  (schedule_df['station Code'] == start_station)]['islno'].values[0]
-        end_islno = schedule_df[(schedule_df['Train No.'] == train_no) &
-                                (schedule_df['station Code'] == end_station)]['islno'].values[0]
+        start_islno = islno_index[(train_no, start_station)]
+        end_islno = islno_index[(train_no, end_station)]
 
         # Append formatted result
         connection.append(f"{train_no} : {start_islno} -> {end_islno}")
@@ -0,0 +1,187 @@
+from bisect import bisect_left
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from solver.costFunctions import solve_cost_function_many
+from solver.graph_builder import consecutive_stops
+from solver.instrumentation import add_counts
+from solver.utils import SECONDS_PER_DAY, time_to_seconds, format_day_time, day_time_to_seconds
+
+
+def departure_index(schedule_df: pd.DataFrame) -> dict:
+    """
+    Maps every station to the sorted, distinct times (seconds since midnight) at which a train leaves it.
+    """
+    legs = consecutive_stops(schedule_df)
+    departures = legs[['from', 'departuretime']].drop_duplicates().sort_values(['from', 'departuretime'])
+    stations = departures['from'].to_numpy()
+    times = departures['departuretime'].to_numpy(dtype=np.int64)
+    bounds = np.flatnonzero(np.r_[True, stations[1:] != stations[:-1], True])
+    return {stations[begin]: times[begin:end].tolist() for begin, end in zip(bounds[:-1], bounds[1:])}
+
+
+def connection_trains(connection: str) -> set:
+    """
+    The train numbers of a "train : from -> to ; ..." connection string.
+    """
+    return {leg.split(':')[0].strip() for leg in connection.split(';')}
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of solve_cost_function results, keyed by
+    (schedule, start, target, cost function, normalized input time).
+
+    Only 'arrivaltime' depends on the input time. Its input time is normalized to the next departure
+    from the start station: every input time between two departures leads to the same journey,
+    arriving the same number of seconds after that departure. Entries therefore keep the arrival as
+    an offset from the departure and are turned back into a "dd:hh:mm:ss" cost for each lookup.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.departures = {}  # Schedule name -> departure_index of that schedule
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self) -> dict:
+        return {'size': len(self.entries), 'maxsize': self.maxsize, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions, 'invalidations': self.invalidations}
+
+    def needs_departures(self, schedule: str, cost_function: str) -> bool:
+        """
+        Whether a lookup or store for this query would first build the schedule's departure index.
+        """
+        return self.maxsize > 0 and cost_function == 'arrivaltime' and schedule not in self.departures
+
+    def index_departures(self, schedule: str, schedule_df: pd.DataFrame):
+        """
+        Builds the departure index of a schedule, which keys its 'arrivaltime' entries, unless it exists.
+        This reads the whole schedule, so a server does it off its event loop (see needs_departures).
+        """
+        if schedule not in self.departures:
+            self.departures[schedule] = departure_index(schedule_df)
+
+    def departure_bucket(self, schedule: str, schedule_df: pd.DataFrame, start: str, input_time: int):
+        """
+        The next departure from start at or after input_time, wrapping around midnight, or None if
+        no train leaves start.
+        """
+        self.index_departures(schedule, schedule_df)
+        times = self.departures[schedule].get(start)
+        if not times:
+            return None
+        return times[bisect_left(times, input_time % SECONDS_PER_DAY) % len(times)]
+
+    def _key(self, graphs: dict, schedule: str, cost_function: str, start: str, target: str, input_time):
+        """
+        Returns (key, input_time in seconds or None, bucket).
+        """
+        if cost_function != 'arrivaltime':
+            return (schedule, start, target, cost_function, None), None, None
+        if isinstance(input_time, str):
+            input_time = time_to_seconds(input_time)
+        bucket = self.departure_bucket(schedule, graphs['schedule'], start, input_time)
+        return (schedule, start, target, cost_function, bucket), input_time, bucket
+
+    def lookup(self, graphs: dict, schedule: str, cost_function: str, start: str, target: str, input_time=None):
+        """
+        Returns the cached result in the form solve_cost_function returns it, or None on a miss.
+        """
+        if self.maxsize <= 0:
+            self.misses += 1
+            return None
+        key, input_time, bucket = self._key(graphs, schedule, cost_function, start, target, input_time)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+
+        if cost_function != 'arrivaltime' or isinstance(entry, str):
+            return entry
+        connection, offset = entry
+        departure = input_time + (bucket - input_time) % SECONDS_PER_DAY
+        return connection, format_day_time(departure + offset)
+
+    def store(self, graphs: dict, schedule: str, cost_function: str, start: str, target: str, input_time,
+              result):
+        """
+        Stores a result solve_cost_function returned for these arguments, evicting the least recently used
+        entry when the cache is full.
+        """
+        if self.maxsize <= 0:
+            return
+        key, input_time, bucket = self._key(graphs, schedule, cost_function, start, target, input_time)
+        entry = result
+        if cost_function == 'arrivaltime' and not isinstance(result, str):
+            connection, cost = result
+            departure = input_time + (bucket - input_time) % SECONDS_PER_DAY
+            entry = (connection, day_time_to_seconds(cost) - departure)
+
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, schedule: str, train: str, scope: dict) -> int:
+        """
+        Drops the entries of a schedule that a change to one train can have made wrong, and the
+        schedule's departure index.
+
+        Parameters:
+            schedule (str): The changed schedule.
+            train (str): The changed train.
+            scope (dict): Cost function -> 'train' to drop the entries whose connection uses the train,
+                or 'all' to drop every entry; other cost functions keep their entries.
+
+        Returns:
+            int: Number of entries dropped
+        """
+        self.departures.pop(schedule, None)
+        stale = []
+        for key, entry in self.entries.items():
+            entry_schedule, _, _, cost_function, _ = key
+            if entry_schedule != schedule or cost_function not in scope:
+                continue
+            # Entries without a connection ('PATH NOT FOUND') do not use any train
+            if scope[cost_function] == 'all' or (not isinstance(entry, str) and train in connection_trains(entry[0])):
+                stale.append(key)
+        for key in stale:
+            del self.entries[key]
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def solve_many(self, graphs: dict, graph, schedule: str, cost_function: str, start: str, targets: list,
+                   input_time=None, stats: dict = None) -> dict:
+        """
+        solve_cost_function_many through the cache: only the targets without an entry are searched for,
+        all in one search. stats, if given, counts the 'cache_hits' and collects the search's stats.
+        """
+        results = {}
+        for target in dict.fromkeys(targets):
+            cached = self.lookup(graphs, schedule, cost_function, start, target, input_time)
+            if cached is not None:
+                results[target] = cached
+        add_counts(stats, cache_hits=len(results))
+
+        missing = [target for target in dict.fromkeys(targets) if target not in results]
+        if missing:
+            if cost_function == 'arrivaltime':
+                solved = solve_cost_function_many(graph, start, missing, graphs['schedule'], cost_function, input_time,
+                                                  stats)
+            else:
+                solved = solve_cost_function_many(graph, start, missing, graphs['schedule'], cost_function,
+                                                  stats=stats)
+            for target, result in solved.items():
+                self.store(graphs, schedule, cost_function, start, target, input_time, result)
+                results[target] = result
+        return results
@@ -0,0 +1,282 @@
+import asyncio
+import json
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from solver.batch import solve_problem_group, solve_profile_query, solve_pareto_query, _init_worker
+from solver.result_cache import ResultCache
+from solver.connection_scan import Timetable
+from solver.utils import time_to_seconds
+
+COST_FUNCTIONS = ['stops', 'timeintrain', 'traveltime', 'arrivaltime']
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class LatencyRecorder:
+    """
+    Keeps the latencies of the most recent requests and reports their percentiles.
+    """
+
+    def __init__(self, window: int = 10000):
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+
+    def record(self, seconds: float, error: bool = False):
+        self.latencies.append(seconds)
+        self.requests += 1
+        self.errors += error
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Nearest-rank percentile of the recorded latencies, in milliseconds.
+        """
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+    def summary(self) -> dict:
+        return {'requests': self.requests, 'errors': self.errors, 'window': len(self.latencies),
+                'p50_ms': self.percentile(0.50), 'p99_ms': self.percentile(0.99)}
+
+
+def solve_query(schedule: str, cost_function: str, start: str, target: str, input_time) -> tuple:
+    """
+    Answers one query on the schedules of this process (or of the worker it runs in).
+
+    Returns:
+        The result as solve_cost_function returns it: (connection, cost) or a message like 'PATH NOT FOUND'
+    """
+    group = ((schedule, cost_function, start, input_time), [(0, target)])
+    _, connection, cost = solve_problem_group(group)[0]
+    return connection if cost == '' else (connection, cost)
+
+
+def _parameters(target: str, schedules: dict, required: tuple) -> tuple:
+    """
+    Reads the query string of a request target and checks the required parameters, the schedule
+    and the time, if given.
+
+    Returns:
+        tuple: (parameters, schedule name)
+    """
+    query = {name: values[-1] for name, values in parse_qs(urlsplit(target).query).items()}
+    missing = [name for name in required if not query.get(name)]
+    if missing:
+        raise ValueError(f"missing parameter(s): {', '.join(missing)}")
+
+    schedule = query.get('schedule', 'schedule.csv')
+    if schedule not in schedules:
+        raise ValueError(f"unknown schedule {schedule}")
+    if 'time' in query:
+        try:
+            time_to_seconds(query['time'])
+        except ValueError:
+            raise ValueError(f"malformed time {query['time']}, expected HH:MM:SS")
+    return query, schedule
+
+
+def parse_query(target: str, schedules: dict) -> tuple:
+    """
+    Reads the arguments of solve_query from a request target like
+    /solve?from=NDLS&to=BCT&cost=arrivaltime&time=08:00:00&schedule=schedule.csv
+
+    Raises:
+        ValueError: If an argument is missing, unknown or malformed.
+    """
+    query, schedule = _parameters(target, schedules, ('from', 'to', 'cost'))
+    cost_function = query['cost']
+    if cost_function not in COST_FUNCTIONS:
+        raise ValueError(f"unknown cost function {cost_function}")
+    input_time = query.get('time', '00:00:00') if cost_function == 'arrivaltime' else None
+
+    return schedule, cost_function, query['from'].strip(), query['to'].strip(), input_time
+
+
+async def _read_request(reader: asyncio.StreamReader):
+    """
+    Reads one HTTP request head.
+
+    Returns:
+        tuple: (method, target, headers), or None when the client closed the connection
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    # Queries carry no body, but skip one if a client sends it
+    length = int(headers.get('content-length', 0))
+    if length:
+        await reader.readexactly(length)
+    return method, target, headers
+
+
+def _response(status: int, body: dict, keep_alive: bool) -> bytes:
+    payload = json.dumps(body).encode()
+    head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + payload
+
+
+class QueryServer:
+    """
+    HTTP server answering queries on graphs that stay loaded for the lifetime of the process.
+
+    Endpoints:
+        GET /solve?from=..&to=..&cost=..[&time=HH:MM:SS][&schedule=..]  -> {"connection", "cost"}
+        GET /profile?from=..&to=..[&schedule=..]  -> {"journeys": [[departure, arrival, connection], ...]}
+        GET /pareto?from=..&to=..[&time=HH:MM:SS][&schedule=..]
+            -> {"journeys": [[departure, arrival, transfers, stops, timeintrain, connection], ...]}
+        GET /stats  -> request count and p50/p99 latency of the recent /solve requests, and cache counters
+
+    Every connection is served by its own coroutine, and the searches run on an executor so that
+    slow queries do not hold up others. With more than one worker the executor is a process pool
+    forked after the graphs are loaded, so the workers share them copy-on-write. Repeated queries
+    are answered from a ResultCache in the server process without reaching the executor.
+    """
+
+    def __init__(self, schedules: dict, workers: int = 1, cache_size: int = 10000):
+        self.schedules = schedules
+        self.workers = workers
+        self.stats = LatencyRecorder()
+        self.cache = ResultCache(cache_size)
+        self.executor = None
+
+    def start_executor(self):
+        # solve_problem_group reads the schedules of the process it runs in
+        _init_worker(self.schedules)
+        if self.workers <= 1:
+            self.executor = ThreadPoolExecutor(1)
+        else:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+            self.executor = ProcessPoolExecutor(
+                self.workers, mp_context=context, initializer=_init_worker, initargs=(self.schedules,))
+
+    async def handle(self, method: str, target: str) -> tuple:
+        """
+        Answers one request.
+
+        Returns:
+            tuple: (status, body)
+        """
+        path = urlsplit(target).path
+        if method != 'GET':
+            return 405, {'error': f"method {method} not allowed"}
+        if path == '/stats':
+            return 200, {**self.stats.summary(), 'cache': self.cache.stats()}
+        if path in ('/profile', '/pareto'):
+            return await self.handle_journeys(path, target)
+        if path != '/solve':
+            return 404, {'error': f"no such endpoint {path}"}
+
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            query = parse_query(target, self.schedules)
+            graphs = self.schedules[query[0]]
+            # Only a dict probe and a bisection stay on the event loop; the departure index that
+            # arrivaltime keys need is built on a thread the first time
+            if self.cache.needs_departures(query[0], query[1]):
+                await loop.run_in_executor(None, lambda: self.cache.index_departures(query[0], graphs['schedule']))
+            # The cache reads the input time too, so its errors are the client's as well
+            result = self.cache.lookup(graphs, *query)
+        except ValueError as e:
+            self.stats.record(time.perf_counter() - start, error=True)
+            return 400, {'error': str(e)}
+
+        if result is None:
+            try:
+                result = await loop.run_in_executor(self.executor, solve_query, *query)
+            except Exception as e:
+                self.stats.record(time.perf_counter() - start, error=True)
+                return 500, {'error': f"{type(e).__name__}: {e}"}
+            self.cache.store(graphs, *query, result)
+
+        self.stats.record(time.perf_counter() - start)
+        if isinstance(result, str):
+            return 200, {'connection': result, 'cost': ''}
+        return 200, {'connection': result[0], 'cost': result[1]}
+
+    async def handle_journeys(self, path: str, target: str) -> tuple:
+        """
+        Answers a /profile request with every Pareto-optimal journey of the day (see solve_profile), or a
+        /pareto request with the multi-criteria Pareto set (see solve_pareto).
+        """
+        try:
+            query, schedule = _parameters(target, self.schedules, ('from', 'to'))
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        if not isinstance(self.schedules[schedule]['timetable'], Timetable):
+            return 400, {'error': f"{path} needs the 'csa' timetable engine"}
+
+        stations = (schedule, query['from'].strip(), query['to'].strip())
+        if path == '/profile':
+            function, arguments = solve_profile_query, stations
+        else:
+            function, arguments = solve_pareto_query, stations + (query.get('time', '00:00:00'),)
+        loop = asyncio.get_running_loop()
+        try:
+            journeys = await loop.run_in_executor(self.executor, function, *arguments)
+        except Exception as e:
+            return 500, {'error': f"{type(e).__name__}: {e}"}
+        return 200, {'journeys': journeys}
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves the requests of one client connection until it closes; HTTP/1.1 keep-alive is supported.
+        """
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    writer.write(_response(400, {'error': 'malformed request'}, False))
+                    break
+                if request is None:
+                    break
+                method, target, headers = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+
+                status, body = await self.handle(method, target)
+                writer.write(_response(status, body, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def run(self, host: str = '127.0.0.1', port: int = 8973, ready=None):
+        """
+        Serves until cancelled.
+
+        Parameters:
+            host (str), port (int): Address to listen on; localhost by default.
+            ready (callable): Called with the bound (host, port) once the server accepts connections.
+        """
+        self.start_executor()
+        server = await asyncio.start_server(self.serve_connection, host, port)
+        try:
+            if ready is not None:
+                ready(server.sockets[0].getsockname()[:2])
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(cancel_futures=True)
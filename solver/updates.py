@@ -0,0 +1,428 @@
+from bisect import bisect_left
+from collections import defaultdict
+from typing import NamedTuple
+import networkx as nx
+import numpy as np
+import pandas as pd
+from solver.graph_builder import (consecutive_stops, _leg_edges, _add_expanded_legs, _add_virtual_nodes,
+                                  _add_transfers, _add_waiting_chain)
+from solver.connection_scan import Timetable
+from solver.csr_graph import CSRGraph
+from solver.utils import SECONDS_PER_DAY, format_day_time
+
+FEED_COLUMNS = ['kind', 'train', 'islno', 'seconds']
+DELTA_KINDS = ('delay', 'cancel', 'skip')
+_CSR_EDGE_FIELDS = ('targets', 'train', 'stops', 'timeintrain', 'fromislno', 'toislno')
+_TIMETABLE_FIELDS = ('departure', 'arrival', 'from_station', 'to_station', 'train', 'from_islno', 'to_islno')
+
+
+class Delta(NamedTuple):
+    """
+    One change to the running timetable.
+
+    'delay' shifts the arrival and departure of the train at stop islno and every later stop by
+    seconds (negative for running early), 'cancel' removes the train and 'skip' removes its stop
+    islno, so it runs through without stopping there.
+    """
+    kind: str
+    train: str
+    islno: int = 0
+    seconds: int = 0
+
+
+def load_feed(feed_file_path: str) -> list:
+    """
+    Reads a delta feed: a CSV file with the columns kind, train, islno and seconds, one delta per
+    line in the order they happened. islno and seconds may be empty where the kind does not use them.
+
+    Returns:
+        list: Delta per line
+    """
+    feed_df = pd.read_csv(feed_file_path, dtype={'kind': str, 'train': str}, skipinitialspace=True)
+    missing = [column for column in FEED_COLUMNS if column not in feed_df.columns]
+    if missing:
+        raise ValueError(f"feed {feed_file_path} lacks the columns {missing}")
+    unknown = set(feed_df['kind']) - set(DELTA_KINDS)
+    if unknown:
+        raise ValueError(f"feed {feed_file_path} has unknown kinds {sorted(unknown)}")
+
+    feed_df[['islno', 'seconds']] = feed_df[['islno', 'seconds']].fillna(0).astype(int)
+    return [Delta(row.kind, row.train.strip("'"), row.islno, row.seconds)
+            for row in feed_df.itertuples(index=False)]
+
+
+class TrainIndex:
+    """
+    The positions of every train's rows in a schedule DataFrame, kept up to date as deltas remove
+    rows, so apply_to_schedule and train_legs find a train without scanning the frame.
+
+    Positions are stored as they were when the frame was indexed, together with the sorted stored
+    positions of the rows removed since; a row's position now is its stored one less the removed
+    rows before it.
+    """
+    def __init__(self, schedule_df: pd.DataFrame):
+        self.positions = schedule_df.groupby('Train No.', observed=True, sort=False).indices
+        self.removed = np.empty(0, dtype=np.int64)
+
+    def __contains__(self, train: str) -> bool:
+        return train in self.positions
+
+    def __getitem__(self, train: str) -> np.ndarray:
+        """
+        The positions of the train's rows now; none for a train without rows.
+        """
+        positions = self.positions.get(train, self.removed[:0])
+        return positions - np.searchsorted(self.removed, positions)
+
+    def keep(self, train: str, kept: np.ndarray):
+        """
+        Records that of the train's rows only those where kept (see apply_to_schedule) is True are left.
+        """
+        positions = self.positions[train]
+        dropped = positions[~kept]
+        self.removed = np.insert(self.removed, np.searchsorted(self.removed, dropped), dropped)
+        if kept.any():
+            self.positions[train] = positions[kept]
+        else:
+            del self.positions[train]
+
+
+def _set_times(schedule_df: pd.DataFrame, rows: np.ndarray, column: str, seconds: np.ndarray):
+    """
+    Writes new times of the rows at the given positions to both the '<column> seconds' and the
+    '<column> time' columns.
+    """
+    schedule_df.iloc[rows, schedule_df.columns.get_loc(f"{column} seconds")] = seconds
+    text = [format_day_time(value)[3:] for value in seconds.tolist()]
+    if isinstance(schedule_df[f"{column} time"].dtype, pd.CategoricalDtype):
+        categories = schedule_df[f"{column} time"].cat.categories
+        new = sorted({value for value, code in zip(text, categories.get_indexer(text)) if code < 0})
+        if new:
+            schedule_df[f"{column} time"] = schedule_df[f"{column} time"].cat.add_categories(new)
+    schedule_df.iloc[rows, schedule_df.columns.get_loc(f"{column} time")] = text
+
+
+def apply_to_schedule(schedule_df: pd.DataFrame, delta: Delta, rows: np.ndarray = None) -> tuple:
+    """
+    Applies a delta to a schedule DataFrame from load_schedule or read_and_preprocess_csv.
+
+    Only the rows of the train are read or written. A delay changes them in place; a cancel or skip
+    takes the other rows into a new frame by position. rows are the positions of the train's rows
+    (see TrainIndex); without them the frame is scanned for the train.
+
+    Returns:
+        tuple: (schedule, kept) with the updated schedule, schedule_df itself for a delay, and a
+        boolean array telling which of the train's rows are left
+    """
+    if rows is None:
+        rows = np.flatnonzero((schedule_df['Train No.'] == delta.train).to_numpy())
+    islnos = schedule_df['islno'].to_numpy()[rows]
+    if delta.kind in ('cancel', 'skip'):
+        kept = islnos != delta.islno if delta.kind == 'skip' else np.zeros(len(rows), dtype=bool)
+        keep = np.ones(len(schedule_df), dtype=bool)
+        keep[rows[~kept]] = False
+        updated = schedule_df.take(np.flatnonzero(keep))
+        updated.index = pd.RangeIndex(len(updated))
+        return updated, kept
+    if delta.kind != 'delay':
+        raise ValueError(f"unknown delta kind {delta.kind}")
+
+    shifted = rows[islnos >= delta.islno]
+    for column in ('Arrival', 'Departure'):
+        seconds = schedule_df[f"{column} seconds"].to_numpy()[shifted]
+        _set_times(schedule_df, shifted, column, (seconds + delta.seconds) % SECONDS_PER_DAY)
+    return schedule_df, np.ones(len(rows), dtype=bool)
+
+
+def train_legs(schedule_df: pd.DataFrame, train: str, rows: np.ndarray = None) -> pd.DataFrame:
+    """
+    The consecutive_stops legs of one train, from the rows at the given positions (see TrainIndex)
+    if given.
+    """
+    if rows is None:
+        return consecutive_stops(schedule_df.loc[schedule_df['Train No.'] == train])
+    return consecutive_stops(schedule_df.iloc[rows])
+
+
+def update_station_graph(graph: nx.MultiDiGraph, old_legs: pd.DataFrame, new_legs: pd.DataFrame):
+    """
+    Replaces the edges of a train in a station graph from build_graph, in place.
+    """
+    for from_station, to_station, attributes in _leg_edges(old_legs):
+        keys = [key for key, edge in graph[from_station][to_station].items()
+                if edge['train'] == attributes['train'] and edge['fromislno'] == attributes['fromislno']]
+        graph.remove_edges_from((from_station, to_station, key) for key in keys)
+    graph.add_edges_from(_leg_edges(new_legs))
+
+
+def update_collapsed_graph(reduced: nx.MultiDiGraph, graph: nx.MultiDiGraph, cost_attribute: str,
+                           old_legs: pd.DataFrame, new_legs: pd.DataFrame):
+    """
+    Brings a collapse_parallel_edges graph up to date with an updated station graph, in place, by
+    choosing the cheapest edge again for every station pair the train served before or serves now.
+    """
+    pairs = set(zip(old_legs['from'].tolist(), old_legs['to'].tolist())) \
+        | set(zip(new_legs['from'].tolist(), new_legs['to'].tolist()))
+    for from_station, to_station in pairs:
+        if reduced.has_edge(from_station, to_station):
+            reduced.remove_edges_from([(from_station, to_station, key) for key in list(reduced[from_station][to_station])])
+        if graph.has_edge(from_station, to_station):
+            edges = graph[from_station][to_station].values()
+            reduced.add_edge(from_station, to_station,
+                             **min(edges, key=lambda attribute: attribute[cost_attribute]))
+
+
+def _legs_by_islno(legs: pd.DataFrame) -> dict:
+    """
+    The legs of one train from consecutive_stops by (fromislno, toislno), as (from, to,
+    timeintrain, departuretime) tuples.
+    """
+    keys = zip(legs['fromislno'].tolist(), legs['toislno'].tolist())
+    values = zip(legs['from'].tolist(), legs['to'].tolist(), legs['timeintrain'].tolist(),
+                 legs['departuretime'].tolist())
+    return dict(zip(keys, values))
+
+
+def lowers_costs(old_legs: pd.DataFrame, new_legs: pd.DataFrame) -> bool:
+    """
+    Whether the new legs of a train can make a journey cheaper by stops or time in train: they
+    have a leg the train did not run before (a skipped stop joins two legs) or a shorter one.
+    Landmark distance tables stay valid lower bounds as long as no cost drops.
+    """
+    old = _legs_by_islno(old_legs)
+    return any(key not in old or leg[2] < old[key][2] for key, leg in _legs_by_islno(new_legs).items())
+
+
+def _changed_legs(old_legs: pd.DataFrame, new_legs: pd.DataFrame) -> tuple:
+    """
+    The legs of a train before and after a change (see _legs_by_islno) and the keys of those
+    whose stations or time in train differ; departure times do not matter to a station graph.
+
+    Returns:
+        tuple: (old, new, changed)
+    """
+    old, new = _legs_by_islno(old_legs), _legs_by_islno(new_legs)
+    return old, new, {key for key in old.keys() | new.keys() if old.get(key, ())[:3] != new.get(key, ())[:3]}
+
+
+def _csr_station_edges(graph: CSRGraph, station: int) -> list:
+    """
+    The edges leaving a station of a CSRGraph, as tuples of their _CSR_EDGE_FIELDS values.
+    """
+    begin, end = graph.offsets[station], graph.offsets[station + 1]
+    return list(zip(*(getattr(graph, field)[begin:end].tolist() for field in _CSR_EDGE_FIELDS)))
+
+
+def _write_csr_edges(graph: CSRGraph, edges: dict) -> CSRGraph:
+    """
+    Replaces the edges leaving some stations of a CSRGraph; edges maps a station index to its new
+    edge tuples. If no station's edge count changes they are written in place, otherwise the
+    untouched runs of the arrays are spliced around them into new arrays.
+    """
+    offsets = graph.offsets
+    if all(len(station_edges) == offsets[station + 1] - offsets[station] for station, station_edges in edges.items()):
+        # Arrays memory-mapped from the cache are read-only; those are copied once
+        graph = graph._replace(**{field: np.array(getattr(graph, field)) for field in _CSR_EDGE_FIELDS
+                                  if not getattr(graph, field).flags.writeable})
+        for station, station_edges in edges.items():
+            for field, values in zip(_CSR_EDGE_FIELDS, zip(*station_edges)):
+                getattr(graph, field)[offsets[station]:offsets[station + 1]] = values
+        return graph
+
+    counts = np.diff(offsets)
+    pieces = {field: [] for field in _CSR_EDGE_FIELDS}
+    begin = 0
+    for station in sorted(edges):
+        columns = list(zip(*edges[station])) or [()] * len(_CSR_EDGE_FIELDS)
+        for field, values in zip(_CSR_EDGE_FIELDS, columns):
+            array = getattr(graph, field)
+            pieces[field] += [array[begin:offsets[station]], np.array(values, dtype=array.dtype)]
+        begin = offsets[station + 1]
+        counts[station] = len(edges[station])
+
+    new_offsets = np.zeros_like(offsets)
+    np.cumsum(counts, out=new_offsets[1:])
+    return graph._replace(
+        offsets=new_offsets,
+        **{field: np.concatenate(pieces[field] + [getattr(graph, field)[begin:]]) for field in _CSR_EDGE_FIELDS})
+
+
+def update_csr_graph(graph: CSRGraph, old_legs: pd.DataFrame, new_legs: pd.DataFrame) -> CSRGraph:
+    """
+    Replaces the edges of a train in a CSRGraph from build_csr_graph.
+
+    Only the stations the train's changed legs leave are touched. Their edges are put in the order
+    build_csr_graph gives the updated schedule: legs by (train, fromislno), the order
+    consecutive_stops lists them in, with the parallel edges to one neighbor kept together where
+    the first of them is. A delay only changes edge costs, which are written in place.
+
+    Returns:
+        CSRGraph: The updated graph; graph itself if only edge costs changed
+    """
+    if old_legs.empty:
+        return graph
+    train = bisect_left(graph.trains, old_legs['train'].iloc[0])
+    old, new, changed = _changed_legs(old_legs, new_legs)
+    edges = {}
+    for station in {graph.station_index[legs[key][0]] for legs in (old, new) for key in changed & legs.keys()}:
+        station_edges = [edge for edge in _csr_station_edges(graph, station)
+                         if edge[1] != train or (edge[4], edge[5]) not in changed]
+        station_edges += [(graph.station_index[to_station], train, 1, time_in_train, from_islno, to_islno)
+                          for (from_islno, to_islno), (from_station, to_station, time_in_train, _) in new.items()
+                          if (from_islno, to_islno) in changed and graph.station_index[from_station] == station]
+        first = {}
+        for edge in sorted(station_edges, key=lambda edge: (edge[1], edge[4])):
+            first.setdefault(edge[0], (edge[1], edge[4]))
+        edges[station] = sorted(station_edges, key=lambda edge: (first[edge[0]], edge[1], edge[4]))
+    return _write_csr_edges(graph, edges)
+
+
+def update_collapsed_csr_graph(reduced: CSRGraph, graph: CSRGraph, cost_attribute: str, old_legs: pd.DataFrame,
+                               new_legs: pd.DataFrame) -> CSRGraph:
+    """
+    Brings a collapse_csr_graph graph up to date with an updated CSRGraph by collapsing the edges
+    of the stations whose legs of the train changed again.
+
+    Returns:
+        CSRGraph: The updated graph; reduced itself if no station's edge count changed
+    """
+    column = _CSR_EDGE_FIELDS.index(cost_attribute)
+    old, new, changed = _changed_legs(old_legs, new_legs)
+    edges = {}
+    for station in {legs[key][0] for legs in (old, new) for key in changed & legs.keys()}:
+        # Parallel edges are adjacent, so each run of one neighbor keeps its first cheapest edge
+        kept = []
+        for edge in _csr_station_edges(graph, graph.station_index[station]):
+            if kept and kept[-1][0] == edge[0]:
+                if edge[column] < kept[-1][column]:
+                    kept[-1] = edge
+            else:
+                kept.append(edge)
+        edges[graph.station_index[station]] = kept
+    return _write_csr_edges(reduced, edges)
+
+
+def update_timetable(timetable: Timetable, old_legs: pd.DataFrame, new_legs: pd.DataFrame) -> Timetable:
+    """
+    Replaces the connections of a train in a Timetable from build_timetable.
+
+    Only the connections that changed are taken out and put back at their place in the departure
+    order, found by binary search: by departure, then arrival, then the order of the legs, so the
+    result is the Timetable build_timetable gives the updated schedule.
+
+    Returns:
+        Timetable: The updated timetable
+    """
+    if old_legs.empty:
+        return timetable
+    train = bisect_left(timetable.trains, old_legs['train'].iloc[0])
+    old, new = _legs_by_islno(old_legs), _legs_by_islno(new_legs)
+    changed = {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+    if not changed:
+        return timetable
+
+    removed = []
+    for from_islno, to_islno in changed & old.keys():
+        departure = old[from_islno, to_islno][3]
+        begin, end = np.searchsorted(timetable.departure, [departure, departure + 1])
+        matches = (timetable.train[begin:end] == train) & (timetable.from_islno[begin:end] == from_islno)
+        removed.append(begin + np.flatnonzero(matches)[0])
+    columns = {field: np.delete(getattr(timetable, field), removed) for field in _TIMETABLE_FIELDS}
+
+    added = sorted(
+        (departure, departure + time_in_train, train, from_islno, to_islno,
+         timetable.station_index[from_station], timetable.station_index[to_station])
+        for (from_islno, to_islno), (from_station, to_station, time_in_train, departure) in new.items()
+        if (from_islno, to_islno) in changed)
+    positions = []
+    for departure, arrival, _, from_islno, *_ in added:
+        begin, end = np.searchsorted(columns['departure'], [departure, departure + 1])
+        tied = list(zip(columns['arrival'][begin:end].tolist(), columns['train'][begin:end].tolist(),
+                        columns['from_islno'][begin:end].tolist()))
+        positions.append(begin + bisect_left(tied, (arrival, train, from_islno)))
+
+    for field, values in zip(('departure', 'arrival', 'train', 'from_islno', 'to_islno', 'from_station',
+                              'to_station'), zip(*added)):
+        columns[field] = np.insert(columns[field], positions, np.array(values, dtype=columns[field].dtype))
+    return timetable._replace(**columns)
+
+
+def _station_events(expanded_graph: nx.DiGraph, station) -> tuple:
+    """
+    The arrival and departure nodes of a station in an expanded graph with their times, found
+    through the station's virtual end and start nodes.
+    """
+    start = (station, '0', -1, 'start')
+    end = (station, '0', -1, 'end')
+    dep_nodes = {}
+    if start in expanded_graph:
+        dep_nodes = {dep_node: edge['departuretime'] for dep_node, edge in expanded_graph[start].items()}
+    arr_nodes = {}
+    if end in expanded_graph:
+        for arr_node in expanded_graph.predecessors(end):
+            # An arrival node is only entered by its train leg
+            for dep_node in expanded_graph.predecessors(arr_node):
+                leg = expanded_graph[dep_node][arr_node]
+                arr_nodes[arr_node] = (leg['departuretime'] + leg['time']) % SECONDS_PER_DAY
+    return arr_nodes, dep_nodes
+
+
+def update_expanded_graph(expanded_graph: nx.DiGraph, old_legs: pd.DataFrame, new_legs: pd.DataFrame,
+                          sparse: bool = False):
+    """
+    Replaces the events of a train in an expanded graph from expand_graph (or expand_graph_sparse
+    with sparse=True), in place.
+
+    Only the train's own nodes and the transfers at the stations it served before or serves now
+    change. In the dense graph the train's arrivals and departures are linked to the other events
+    of their station. In the sparse graph the station's waiting chain is rebuilt.
+    """
+    old_nodes = []
+    for from_station, to_station, attributes in _leg_edges(old_legs):
+        old_nodes.append((from_station, attributes['train'], attributes['fromislno'], 'dep'))
+        old_nodes.append((to_station, attributes['train'], attributes['toislno'], 'arr'))
+    stations = set(old_legs['from'].tolist()) | set(old_legs['to'].tolist()) \
+        | set(new_legs['from'].tolist()) | set(new_legs['to'].tolist())
+
+    # The remaining events of each station, before the train's new ones are added
+    remaining = {}
+    expanded_graph.remove_nodes_from(old_nodes)
+    if sparse:
+        # Rebuilt below from the remaining and new departures; the removed ones' waiting nodes go too
+        expanded_graph.remove_nodes_from(node[:3] + ('wait',) for node in old_nodes if node[3] == 'dep')
+    for station in stations:
+        remaining[station] = _station_events(expanded_graph, station)
+        if sparse:
+            expanded_graph.remove_nodes_from(dep_node[:3] + ('wait',) for dep_node in remaining[station][1])
+
+    new_arr_nodes = defaultdict(dict)
+    new_dep_nodes = defaultdict(dict)
+    _add_expanded_legs(_leg_edges(new_legs), expanded_graph, new_arr_nodes, new_dep_nodes)
+
+    for station in stations:
+        arr_nodes, dep_nodes = remaining[station]
+        _add_virtual_nodes(station, expanded_graph, new_arr_nodes[station], new_dep_nodes[station])
+        if sparse:
+            _add_waiting_chain(expanded_graph, {**arr_nodes, **new_arr_nodes[station]},
+                               {**dep_nodes, **new_dep_nodes[station]})
+        else:
+            _add_transfers(expanded_graph, new_arr_nodes[station], {**dep_nodes, **new_dep_nodes[station]})
+            _add_transfers(expanded_graph, arr_nodes, new_dep_nodes[station])
+
+
+def cache_scope(delta: Delta) -> dict:
+    """
+    Which cached results a delta can make wrong, per cost function: 'train' for the results whose
+    connection uses the train, 'all' for every result of the schedule. Cost functions not listed
+    are unaffected.
+
+    Removing trips or making them costlier only affects the results that use them. A skip makes
+    the train one stop shorter between its neighbors, and a delay can create or break transfers,
+    so those can improve journeys on other trains too.
+    """
+    if delta.kind == 'cancel':
+        return {cost_function: 'train' for cost_function in ('stops', 'timeintrain', 'traveltime', 'arrivaltime')}
+    if delta.kind == 'skip':
+        return {'stops': 'all', 'timeintrain': 'train', 'traveltime': 'train', 'arrivaltime': 'train'}
+    # A delay keeps the stops; it lengthens the time in train of the leg into stop islno
+    return {'timeintrain': 'train' if delta.seconds >= 0 else 'all', 'traveltime': 'all', 'arrivaltime': 'all'}
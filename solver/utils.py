@@ -1,4 +1,7 @@
 from datetime import datetime, timedelta
+import pandas as pd
+
+SECONDS_PER_DAY = 86400
 
 
 def calculate_time_difference(from_time, to_time):
@@ -15,29 +18,60 @@ def calculate_time_difference(from_time, to_time):
     return (to_time - from_time)
 
 
-def add_seconds_to_time(arrival_time: str, seconds: int) -> str:
+def time_column_to_seconds(times: pd.Series) -> pd.Series:
+    """
+    Converts a column of "HH:MM:SS" strings to integer seconds since midnight in one vectorized pass.
+    """
+    parts = times.str.strip("'").str.split(':', expand=True).astype('int64')
+    return parts[0] * 3600 + parts[1] * 60 + parts[2]
+
+
+def time_to_seconds(time: str) -> int:
+    """
+    Converts a "HH:MM:SS" time string to integer seconds since midnight.
+    """
+    hours, minutes, seconds = time.strip("'").split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def time_difference_seconds(from_seconds: int, to_seconds: int) -> int:
+    """
+    Integer counterpart of calculate_time_difference for times given as seconds since midnight.
+    A to-time earlier than the from-time is taken to be on the next day.
+    """
+    return (to_seconds - from_seconds) % SECONDS_PER_DAY
+
+
+def format_day_time(total_seconds: int) -> str:
+    """
+    Formats a number of seconds since midnight of the first day as "dd:hh:mm:ss".
+    """
+    days, remainder = divmod(int(total_seconds), SECONDS_PER_DAY)
+    hours, remainder = divmod(remainder, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{days:02}:{hours:02}:{minutes:02}:{seconds:02}"
+
+
+def day_time_to_seconds(day_time: str) -> int:
+    """
+    Inverse of format_day_time: converts "dd:hh:mm:ss" to seconds since midnight of the first day.
+    """
+    days, hours, minutes, seconds = day_time.split(':')
+    return int(days) * SECONDS_PER_DAY + int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def add_seconds_to_time(arrival_time, seconds: int) -> str:
     """
     Adds seconds to the given arrival time and returns the result in dd:hh:mm:ss format.
 
     Parameters:
-        arrival_time (str): The arrival time in "HH:MM:SS" format.
+        arrival_time (str or int): The arrival time in "HH:MM:SS" format or as seconds since midnight.
         seconds (int): The number of seconds to add.
 
     Returns:
         str: The resulting time in "dd:hh:mm:ss" format.
     """
-    # Parse the arrival time
-    base_time = datetime.strptime(arrival_time, "%H:%M:%S")
-
-    # Add the seconds to the base time
-    updated_time = base_time + timedelta(seconds=seconds)
-
-    # Calculate total days, hours, minutes, and seconds
-    total_seconds = (updated_time - base_time.replace(hour=0,
-                     minute=0, second=0)).total_seconds()
-    days, remainder = divmod(total_seconds, 86400)
-    hours, remainder = divmod(remainder, 3600)
-    minutes, seconds = divmod(remainder, 60)
+    if isinstance(arrival_time, str):
+        arrival_time = time_to_seconds(arrival_time)
 
-    # Format and return the result
-    return f"{int(days):02}:{int(hours):02}:{int(minutes):02}:{int(seconds):02}"
+    return format_day_time(arrival_time + seconds)
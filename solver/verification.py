@@ -0,0 +1,265 @@
+import re
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+from solver.utils import SECONDS_PER_DAY, time_to_seconds
+
+# One leg of a connection string: "train : fromislno -> toislno"
+LEG_PATTERN = re.compile(r"^\s*(\S+)\s*:\s*(\d+)\s*->\s*(\d+)\s*$")
+
+# Result of verifying one solution, from best to worst
+STATUSES = ['ok', 'unverified', 'better than expected', 'suboptimal', 'wrong cost', 'missing path',
+            'unexpected path', 'infeasible', 'no solution']
+
+
+class StopIndex(NamedTuple):
+    """
+    The stops of a schedule, addressable by (train, islno), for recomputing connection costs.
+
+    Rows are the schedule's stops sorted by (train, islno). timeintrain holds the train's
+    accumulated time in train at each stop, without dwell times. elapsed_arrival and
+    elapsed_departure hold the time since the train left its first stop, with dwell times.
+    Times between two stops of a train are then a difference of two entries.
+    """
+    row: dict  # (train, islno) -> row
+    train: list
+    station: list
+    position: np.ndarray  # Stop number within the train, from 0
+    arrival: np.ndarray
+    departure: np.ndarray
+    timeintrain: np.ndarray
+    elapsed_arrival: np.ndarray
+    elapsed_departure: np.ndarray
+
+
+def build_stop_index(schedule_df: pd.DataFrame) -> StopIndex:
+    """
+    Builds the StopIndex of a schedule from read_and_preprocess_csv or load_schedule.
+    """
+    stops = schedule_df.sort_values(['Train No.', 'islno'], kind='stable')
+    trains = stops['Train No.'].astype(str).to_numpy()
+    islnos = stops['islno'].to_numpy(dtype=np.int64)
+    arrival = stops['Arrival seconds'].to_numpy(dtype=np.int64)
+    departure = stops['Departure seconds'].to_numpy(dtype=np.int64)
+
+    # A new train starts wherever the train number changes
+    first = np.ones(len(trains), dtype=bool)
+    first[1:] = trains[1:] != trains[:-1]
+    starts = np.flatnonzero(first)
+    lengths = np.diff(np.append(starts, len(trains)))
+    position = np.arange(len(trains)) - np.repeat(starts, lengths)
+
+    # Leg times wrap around midnight like in consecutive_stops; the sum restarts with every train
+    leg_time = np.zeros(len(trains), dtype=np.int64)
+    leg_time[1:] = (arrival[1:] - departure[:-1]) % SECONDS_PER_DAY
+    leg_time[first] = 0
+    cumulative = np.cumsum(leg_time)
+    timeintrain = cumulative - np.repeat(cumulative[starts], lengths)
+
+    # Dwell times wrap as well; the first stop's arrival does not count
+    dwell = (departure - arrival) % SECONDS_PER_DAY
+    dwell[first] = 0
+    cumulative_dwell = np.cumsum(dwell)
+    elapsed_departure = timeintrain + cumulative_dwell - np.repeat(cumulative_dwell[starts], lengths)
+    elapsed_arrival = elapsed_departure - dwell
+
+    train_list = trains.tolist()
+    return StopIndex(
+        row=dict(zip(zip(train_list, islnos.tolist()), range(len(train_list)))),
+        train=train_list,
+        station=stops['station Code'].astype(str).tolist(),
+        position=position,
+        arrival=arrival,
+        departure=departure,
+        timeintrain=timeintrain,
+        elapsed_arrival=elapsed_arrival,
+        elapsed_departure=elapsed_departure
+    )
+
+
+def parse_connection(connection: str) -> list:
+    """
+    Parses a connection string into its legs.
+
+    Returns:
+        list: (train, fromislno, toislno) per leg, or None if the string is malformed
+    """
+    legs = []
+    for part in connection.split(';'):
+        match = LEG_PATTERN.match(part)
+        if match is None:
+            return None
+        legs.append((match.group(1), int(match.group(2)), int(match.group(3))))
+    return legs
+
+
+def parse_cost(cost) -> int:
+    """
+    Parses a cost as written to a solutions file: an integer, or a "hh:mm:ss" or "dd:hh:mm:ss" time.
+
+    Returns:
+        int: The cost in stops or seconds, or None if it cannot be parsed
+    """
+    text = str(cost).strip()
+    try:
+        if ':' not in text:
+            return int(float(text))
+        parts = [int(part) for part in text.split(':')]
+    except ValueError:
+        return None
+    if len(parts) == 3:
+        parts = [0] + parts
+    if len(parts) != 4:
+        return None
+    days, hours, minutes, seconds = parts
+    return days * SECONDS_PER_DAY + hours * 3600 + minutes * 60 + seconds
+
+
+def connection_cost(index: StopIndex, legs: list, start: str, target: str, cost_function: str,
+                    input_time=None):
+    """
+    Checks that a connection is feasible and recomputes its cost.
+
+    A connection is feasible when every leg rides an existing train forwards between two of its
+    stops, the first leg starts at start, every leg ends where the next one starts and the last
+    leg ends at target. The schedule repeats every day, so a transfer waits from the arrival until
+    the next departure of the following train, possibly on the next day.
+
+    Parameters:
+        index (StopIndex): Stops of the schedule the connection runs on.
+        legs (list): (train, fromislno, toislno) per leg, from parse_connection.
+        start (str), target (str): The stations of the problem.
+        cost_function (str): 'stops', 'timeintrain', 'traveltime' or 'arrivaltime'.
+        input_time (str or int): Earliest departure for 'arrivaltime'.
+
+    Returns:
+        tuple: (cost, None), with arrivaltime costs in seconds since midnight of the first day,
+        or (None, reason) for an infeasible connection
+    """
+    rows = []
+    for train, from_islno, to_islno in legs:
+        from_row = index.row.get((train, from_islno))
+        to_row = index.row.get((train, to_islno))
+        if from_row is None or to_row is None:
+            return None, f"train {train} has no stop {from_islno if from_row is None else to_islno}"
+        if index.position[from_row] >= index.position[to_row]:
+            return None, f"train {train}: islno {from_islno} is not before {to_islno}"
+        rows.append((from_row, to_row))
+
+    station = index.station
+    if station[rows[0][0]] != start:
+        return None, f"starts at {station[rows[0][0]]}, not {start}"
+    for (_, arrive_row), (depart_row, _) in zip(rows, rows[1:]):
+        if station[arrive_row] != station[depart_row]:
+            return None, f"arrives at {station[arrive_row]} but continues from {station[depart_row]}"
+    if station[rows[-1][1]] != target:
+        return None, f"ends at {station[rows[-1][1]]}, not {target}"
+
+    if cost_function == 'stops':
+        return int(sum(index.position[to_row] - index.position[from_row] for from_row, to_row in rows)), None
+
+    if cost_function == 'timeintrain':
+        return int(sum(index.timeintrain[to_row] - index.timeintrain[from_row] for from_row, to_row in rows)), None
+
+    # Riding through a stop includes its dwell time, like a transfer to the same train would
+    in_train = int(sum(index.elapsed_arrival[to_row] - index.elapsed_departure[from_row]
+                       for from_row, to_row in rows))
+    waiting = int(sum((index.departure[depart_row] - index.arrival[arrive_row]) % SECONDS_PER_DAY
+                      for (_, arrive_row), (depart_row, _) in zip(rows, rows[1:])))
+    if cost_function == 'traveltime':
+        return in_train + waiting, None
+
+    if isinstance(input_time, str):
+        input_time = time_to_seconds(input_time)
+    first_departure = int((index.departure[rows[0][0]] - input_time) % SECONDS_PER_DAY)
+    return input_time + first_departure + in_train + waiting, None
+
+
+def verify_solution(index: StopIndex, problem, connection, cost, expected=None) -> tuple:
+    """
+    Verifies one solution of a problem.
+
+    Parameters:
+        index (StopIndex): Stops of the problem's schedule.
+        problem: Row of load_problems_csv with FromStation, ToStation, CostFunction and input_time.
+        connection (str): The solution's connection, or 'PATH NOT FOUND'.
+        cost: The solution's cost.
+        expected (tuple): (connection, cost) of a reference solution, if there is one.
+
+    Returns:
+        tuple: (status, detail), with status one of STATUSES
+    """
+    expected_cost = None
+    expected_found = None
+    if expected is not None:
+        expected_found = str(expected[0]).strip() != 'PATH NOT FOUND'
+        expected_cost = parse_cost(expected[1]) if expected_found else None
+
+    if str(connection).strip() == 'PATH NOT FOUND':
+        if expected_found:
+            return 'missing path', f"expected {expected[0]} with cost {expected[1]}"
+        return ('ok', '') if expected is not None else ('unverified', 'no path and no reference')
+    if expected_found is False:
+        return 'unexpected path', "the reference has no path"
+
+    if problem.CostFunction not in ('stops', 'timeintrain', 'traveltime', 'arrivaltime'):
+        return 'unverified', f"unsupported cost function {problem.CostFunction}"
+    legs = parse_connection(str(connection))
+    if legs is None:
+        return 'infeasible', f"malformed connection {connection!r}"
+    recomputed, reason = connection_cost(
+        index, legs, problem.FromStation, problem.ToStation, problem.CostFunction, problem.input_time)
+    if reason is not None:
+        return 'infeasible', reason
+
+    claimed = parse_cost(cost)
+    if claimed != recomputed:
+        return 'wrong cost', f"claimed {cost}, recomputed {recomputed}"
+    if expected_cost is None:
+        return 'unverified' if expected is None else 'ok', ''
+    if recomputed > expected_cost:
+        return 'suboptimal', f"cost {cost}, expected {expected[1]}"
+    if recomputed < expected_cost:
+        return 'better than expected', f"cost {cost}, expected {expected[1]}"
+    return 'ok', ''
+
+
+def verify_solutions(solutions_df: pd.DataFrame, problems_df: pd.DataFrame, schedules: dict,
+                     expected_df: pd.DataFrame = None, default_schedule: str = 'schedule.csv') -> pd.DataFrame:
+    """
+    Verifies every problem against a solutions DataFrame.
+
+    Parameters:
+        solutions_df (pd.DataFrame): Solutions with ProblemNo, Connection and Cost columns.
+        problems_df (pd.DataFrame): Problems as returned by load_problems_csv.
+        schedules (dict): Schedule name -> schedule DataFrame.
+        expected_df (pd.DataFrame): Optional reference solutions to compare costs with.
+        default_schedule (str): Schedule used for problems naming a schedule not in schedules.
+
+    Returns:
+        pd.DataFrame: ProblemNo, CostFunction, status and detail per problem
+    """
+    indexes = {}
+    solutions = {row.ProblemNo: (row.Connection, row.Cost) for row in solutions_df.itertuples(index=False)}
+    expected_solutions = {}
+    if expected_df is not None:
+        expected_solutions = {row.ProblemNo: (row.Connection, row.Cost)
+                              for row in expected_df.itertuples(index=False)}
+
+    results = []
+    for problem in problems_df.itertuples(index=False):
+        if problem.ProblemNo not in solutions:
+            results.append((problem.ProblemNo, problem.CostFunction, 'no solution', ''))
+            continue
+
+        # Each schedule is indexed once, on first use
+        schedule = problem.Schedule if problem.Schedule in schedules else default_schedule
+        if schedule not in indexes:
+            indexes[schedule] = build_stop_index(schedules[schedule])
+
+        connection, cost = solutions[problem.ProblemNo]
+        status, detail = verify_solution(
+            indexes[schedule], problem, connection, cost, expected_solutions.get(problem.ProblemNo))
+        results.append((problem.ProblemNo, problem.CostFunction, status, detail))
+
+    return pd.DataFrame(results, columns=['ProblemNo', 'CostFunction', 'status', 'detail'])
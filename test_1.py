@@ -1,8 +1,8 @@
 from solver.problem_solver import load_problems_csv, read_and_preprocess_csv, create_solutions_csv, construct_connection
 from solver.costFunctions import solve_cost_function, dijkstra_path_expanded_graph
 from solver.graph_builder import build_graph, expand_graph
+from solver.graph_cache import load_or_build
 import networkx as nx
-import pickle
 
 def main():
 
@@ -20,17 +20,17 @@ def main():
     #mini_graph = build_graph(mini_schedule_df)
     #expanded_mini_graph = expand_graph(mini_graph)
     #expanded_graph = expand_graph(graph)
-    expanded_graph = pickle.load(open('tmp/expanded_graph.txt', 'rb'))
-    #pickle.dump(expanded_graph, open('tmp/expanded_graph.txt', 'wb'))
+    expanded_graph = load_or_build(
+        schedule_file, 'expanded', lambda: expand_graph(build_graph(schedule_df)))
     #nx.write_gexf(expanded_graph, "expanded_schedule.gexf")
     #for node in expanded_graph:
     #    print(type(node[2]))
     #    return 0
-    connection, cost = solve_cost_funtion(expanded_graph, 'RTA', 'JONR', schedule_df, 'traveltime')
+    connection, cost = solve_cost_function(expanded_graph, 'RTA', 'JONR', schedule_df, 'traveltime')
     #total_time = 0
     print(connection)
     print(cost)
-    #connection = construct_connection(schedule_df, *decode_expanded_path(node_sequence))
+    #connection = construct_connection(build_islno_index(schedule_df), *decode_expanded_path(node_sequence))
     #print(connection, cost)
     
         
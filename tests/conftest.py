@@ -0,0 +1,12 @@
+import pytest
+from benchmarks.synthetic_schedule import generate_schedule
+
+
+@pytest.fixture(scope='session')
+def schedule_file(tmp_path_factory):
+    """
+    A small random schedule in the format of data/schedule.csv, shared by all tests.
+    """
+    file_path = tmp_path_factory.mktemp('data') / 'schedule.csv'
+    generate_schedule(str(file_path), n_stations=60, n_trains=150, max_stops=12, seed=1)
+    return str(file_path)
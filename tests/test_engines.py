@@ -0,0 +1,174 @@
+import random
+import pytest
+from solver.connection_scan import build_timetable
+from solver.costFunctions import solve_cost_function, solve_alternatives
+from solver.csr_graph import build_csr_graph, collapse_csr_graph
+from solver.landmarks import ALTGraph, build_landmarks
+from solver.graph_builder import build_graph, expand_graph, expand_graph_sparse, collapse_parallel_edges
+from solver.pareto import pareto_scan, pareto_cost
+from solver.problem_solver import load_schedule
+from solver.result_cache import ResultCache
+from solver.utils import time_to_seconds, format_day_time, add_seconds_to_time, day_time_to_seconds
+
+
+@pytest.fixture(scope='module')
+def baseline(schedule_file):
+    """
+    The schedule, the networkx station and expanded graphs Dijkstra answers on, and random queries.
+    """
+    schedule_df = load_schedule(schedule_file)
+    graph = build_graph(schedule_df)
+    rng = random.Random(0)
+    stations = sorted(graph.nodes)
+    queries = [(*rng.sample(stations, 2), f"{rng.randrange(24):02}:{rng.randrange(60):02}:00") for _ in range(40)]
+    return {'schedule': schedule_df, 'station': graph, 'expanded': expand_graph(graph), 'queries': queries}
+
+
+def _results(graph, schedule_df, cost_function, queries, **options) -> list:
+    return [solve_cost_function(graph, start, target, schedule_df, cost_function, input_time, **options)
+            for start, target, input_time in queries]
+
+
+def _costs(graph, schedule_df, cost_function, queries, **options) -> list:
+    return [result if isinstance(result, str) else result[1]
+            for result in _results(graph, schedule_df, cost_function, queries, **options)]
+
+
+def _expected_results(baseline, cost_function) -> list:
+    """
+    The answers of Dijkstra's algorithm on the networkx graph of the cost function, for every query.
+    """
+    kind = 'station' if cost_function in ('stops', 'timeintrain') else 'expanded'
+    expected = _results(baseline[kind], baseline['schedule'], cost_function, baseline['queries'])
+    assert any(result != 'PATH NOT FOUND' for result in expected)
+    return expected
+
+
+def _expected(baseline, cost_function) -> list:
+    """
+    The costs of _expected_results.
+    """
+    return [result if isinstance(result, str) else result[1] for result in _expected_results(baseline, cost_function)]
+
+
+@pytest.mark.parametrize('cost_function', ['traveltime', 'arrivaltime'])
+def test_connection_scan(baseline, cost_function):
+    schedule_df, queries = baseline['schedule'], baseline['queries']
+    assert _costs(build_timetable(schedule_df), schedule_df, cost_function, queries) == _expected(
+        baseline, cost_function)
+
+
+@pytest.mark.parametrize('cost_function', ['stops', 'timeintrain'])
+def test_csr_graph(baseline, cost_function):
+    schedule_df, queries = baseline['schedule'], baseline['queries']
+    # Same connections too, not only the same costs
+    assert _results(build_csr_graph(schedule_df), schedule_df, cost_function, queries) == _expected_results(
+        baseline, cost_function)
+
+
+@pytest.mark.parametrize('cost_function', ['stops', 'timeintrain'])
+def test_bidirectional_search(baseline, cost_function):
+    schedule_df, queries = baseline['schedule'], baseline['queries']
+    assert _costs(baseline['station'], schedule_df, cost_function, queries, bidirectional=True) == _expected(
+        baseline, cost_function)
+
+    stats = {}
+    start, target, _ = queries[0]
+    solve_cost_function(baseline['station'], start, target, schedule_df, cost_function, bidirectional=True,
+                        stats=stats)
+    assert stats['settled'] > 0 and stats['relaxed'] > 0 and stats['pushes'] > 0
+    assert 'search_seconds' in stats
+
+
+def test_bidirectional_search_needs_the_station_graph(baseline):
+    schedule_df = baseline['schedule']
+    start, target, input_time = baseline['queries'][0]
+    csr_graph = build_csr_graph(schedule_df)
+    alt_graph = ALTGraph(csr_graph, build_landmarks(csr_graph, count=2))
+    unsupported = [(csr_graph, 'stops'), (alt_graph, 'timeintrain'), (baseline['expanded'], 'traveltime'),
+                   (baseline['station'], 'arrivaltime')]
+    for graph, cost_function in unsupported:
+        with pytest.raises(ValueError):
+            solve_cost_function(graph, start, target, schedule_df, cost_function, input_time, bidirectional=True)
+
+
+@pytest.mark.parametrize('cost_function', ['traveltime', 'arrivaltime'])
+def test_sparse_expansion(baseline, cost_function):
+    schedule_df, queries = baseline['schedule'], baseline['queries']
+    # Same connections too, not only the same costs
+    assert _results(expand_graph_sparse(baseline['station']), schedule_df, cost_function, queries) == \
+        _expected_results(baseline, cost_function)
+
+
+@pytest.mark.parametrize('cost_function', ['stops', 'timeintrain'])
+def test_alt_search(baseline, cost_function):
+    schedule_df, queries = baseline['schedule'], baseline['queries']
+    csr_graph = build_csr_graph(schedule_df)
+    graph = ALTGraph(csr_graph, build_landmarks(csr_graph, count=4))
+    assert _costs(graph, schedule_df, cost_function, queries) == _expected(baseline, cost_function)
+
+
+@pytest.mark.parametrize('cost_function', ['stops', 'timeintrain'])
+def test_collapsed_graphs(baseline, cost_function):
+    schedule_df, queries = baseline['schedule'], baseline['queries']
+    csr_graph = build_csr_graph(schedule_df)
+    # The collapsed graphs keep the edges Dijkstra picks, so the connections are the same too
+    for graph, collapsed in [(baseline['station'], collapse_parallel_edges(baseline['station'], cost_function)),
+                             (csr_graph, collapse_csr_graph(csr_graph, cost_function))]:
+        for start, target, _ in queries:
+            assert (solve_cost_function(collapsed, start, target, schedule_df, cost_function)
+                    == solve_cost_function(graph, start, target, schedule_df, cost_function))
+
+
+@pytest.mark.parametrize('cost_function', ['stops', 'traveltime', 'arrivaltime'])
+def test_result_cache_hits(baseline, cost_function):
+    schedule_df = baseline['schedule']
+    graph = baseline['station' if cost_function == 'stops' else 'expanded']
+    graphs = {'schedule': schedule_df}
+    cache = ResultCache()
+    for start, target, input_time in baseline['queries']:
+        cache.store(graphs, 'schedule.csv', cost_function, start, target, input_time,
+                    solve_cost_function(graph, start, target, schedule_df, cost_function, input_time))
+        # Any input time up to the next departure from start is answered from the same entry
+        bucket = cache.departure_bucket('schedule.csv', schedule_df, start, time_to_seconds(input_time))
+        later_time = input_time if bucket is None else format_day_time(bucket)[3:]
+        for query_time in (input_time, later_time):
+            assert cache.lookup(graphs, 'schedule.csv', cost_function, start, target, query_time) == \
+                solve_cost_function(graph, start, target, schedule_df, cost_function, query_time)
+    assert cache.misses == 0
+
+
+def test_pareto_set_holds_legacy_answers(baseline):
+    timetable = build_timetable(baseline['schedule'])
+    cost_functions = ['stops', 'timeintrain', 'traveltime', 'arrivaltime']
+    costs = {cost_function: [] for cost_function in cost_functions}
+    for start, target, input_time in baseline['queries']:
+        # The scan covers a whole day of departures, so one from the input time answers every cost function
+        departure_time = time_to_seconds(input_time)
+        journeys = pareto_scan(timetable, start, target, departure_time)
+        for cost_function in cost_functions:
+            _, cost = pareto_cost(journeys, cost_function, departure_time)
+            if cost is None:
+                cost = 'PATH NOT FOUND'
+            elif cost_function == 'arrivaltime':
+                cost = add_seconds_to_time(departure_time, cost)
+            costs[cost_function].append(str(cost))
+    for cost_function in cost_functions:
+        assert costs[cost_function] == _expected(baseline, cost_function)
+
+
+@pytest.mark.parametrize('cost_function, kind', [('stops', 'station'), ('timeintrain', 'station'),
+                                                 ('traveltime', 'expanded'), ('arrivaltime', 'expanded')])
+def test_alternatives_start_with_the_optimum(baseline, cost_function, kind):
+    expected = _expected(baseline, cost_function)
+    for (start, target, input_time), best in zip(baseline['queries'], expected):
+        alternatives = solve_alternatives(baseline[kind], start, target, cost_function, 4, input_time)
+        if best == 'PATH NOT FOUND':
+            assert alternatives == []
+            continue
+        assert alternatives[0][1] == best
+        # Distinct connections, cheapest first
+        costs = [day_time_to_seconds(cost) if cost_function == 'arrivaltime' else int(cost)
+                 for _, cost in alternatives]
+        assert costs == sorted(costs)
+        assert len({connection for connection, _ in alternatives}) == len(alternatives)
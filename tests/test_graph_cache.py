@@ -0,0 +1,36 @@
+from benchmarks.synthetic_schedule import generate_schedule
+from solver.graph_cache import load_or_build
+from solver.problem_solver import load_schedule
+
+
+def test_same_named_schedules_keep_their_entries(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    paths = []
+    for seed in (1, 2):
+        directory = tmp_path / f"region{seed}"
+        directory.mkdir()
+        paths.append(str(directory / 'schedule.csv'))
+        generate_schedule(paths[-1], n_stations=20, n_trains=30, max_stops=8, seed=seed)
+
+    builds = []
+
+    def builder(path):
+        builds.append(path)
+        return load_schedule(path)
+
+    for _ in range(2):
+        frames = [load_or_build(path, 'schedule', lambda: builder(path), cache_dir) for path in paths]
+    # The second round is answered from the cache, each schedule from its own entry
+    assert builds == paths
+    for path, schedule_df in zip(paths, frames):
+        assert schedule_df.equals(load_schedule(path))
+
+
+def test_changed_schedule_replaces_its_entry(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    path = str(tmp_path / 'schedule.csv')
+    for seed in (1, 2):
+        generate_schedule(path, n_stations=20, n_trains=30, max_stops=8, seed=seed)
+        schedule_df = load_or_build(path, 'schedule', lambda: load_schedule(path), str(cache_dir))
+        assert schedule_df.equals(load_schedule(path))
+    assert len(list(cache_dir.iterdir())) == 1
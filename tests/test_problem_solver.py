@@ -0,0 +1,24 @@
+import random
+from solver.costFunctions import dijkstra_path
+from solver.graph_builder import build_graph
+from solver.problem_solver import load_schedule, build_islno_index, construct_connection, construct_connection_from_legs
+
+
+def test_construct_connection_matches_legs(schedule_file):
+    schedule_df = load_schedule(schedule_file)
+    graph = build_graph(schedule_df)
+    islno_index = build_islno_index(schedule_df)
+
+    rng = random.Random(0)
+    stations = sorted(graph.nodes)
+    found = 0
+    for _ in range(50):
+        start, target = rng.sample(stations, 2)
+        station_sequence, leg_sequence, _ = dijkstra_path(graph, start, target, 'stops')
+        if station_sequence is None:
+            continue
+        found += 1
+        train_sequence = [train for train, _, _ in leg_sequence]
+        assert (construct_connection(islno_index, station_sequence, train_sequence)
+                == construct_connection_from_legs(leg_sequence))
+    assert found
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import pytest
+import solver.result_cache
+from solver.batch import load_schedules
+from solver.server import QueryServer
+
+
+@pytest.fixture(scope='module')
+def server(schedule_file, tmp_path_factory):
+    schedules = load_schedules({'schedule.csv': schedule_file}, cache_dir=str(tmp_path_factory.mktemp('cache')))
+    query_server = QueryServer(schedules)
+    query_server.start_executor()
+    yield query_server
+    query_server.executor.shutdown()
+
+
+def _handle(server, target, method='GET'):
+    return asyncio.run(server.handle(method, target))
+
+
+def test_solve(server):
+    status, body = _handle(server, '/solve?from=S00001&to=S00002&cost=arrivaltime&time=08:00:00')
+    assert status == 200
+    assert set(body) == {'connection', 'cost'}
+
+
+@pytest.mark.parametrize('target', [
+    '/solve?from=S00001&cost=stops',
+    '/solve?from=S00001&to=S00002&cost=fastest',
+    '/solve?from=S00001&to=S00002&cost=stops&schedule=other.csv',
+    '/solve?from=S00001&to=S00002&cost=arrivaltime&time=garbage',
+    '/solve?from=S00001&to=S00002&cost=arrivaltime&time=08:xx:00',
+    '/profile?from=S00001',
+    '/pareto?from=S00001&to=S00002&time=bad',
+])
+def test_malformed_queries(server, target):
+    status, body = _handle(server, target)
+    assert status == 400
+    assert 'error' in body
+
+
+def test_unknown_endpoint_and_method(server):
+    assert _handle(server, '/route?from=S00001')[0] == 404
+    assert _handle(server, '/solve?from=S00001&to=S00002&cost=stops', method='POST')[0] == 405
+
+
+def test_malformed_time_reaching_the_cache(server, monkeypatch):
+    # Even if parsing let a bad time through, the cache lookup must not drop the connection
+    monkeypatch.setattr('solver.server.parse_query',
+                        lambda target, schedules: ('schedule.csv', 'arrivaltime', 'S00001', 'S00002', 'garbage'))
+    status, body = _handle(server, '/solve?from=S00001&to=S00002&cost=arrivaltime&time=garbage')
+    assert status == 400
+
+
+def test_departure_index_is_built_off_the_event_loop(server, monkeypatch):
+    threads = []
+    build = solver.result_cache.departure_index
+
+    def departure_index(schedule_df):
+        threads.append(threading.current_thread())
+        return build(schedule_df)
+
+    monkeypatch.setattr(solver.result_cache, 'departure_index', departure_index)
+    query_server = QueryServer(server.schedules)
+    query_server.executor = server.executor
+    target = '/solve?from=S00001&to=S00002&cost=arrivaltime&time=08:00:00'
+    first = _handle(query_server, target)
+    assert _handle(query_server, target) == first
+    assert query_server.cache.hits == 1
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
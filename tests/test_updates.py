@@ -0,0 +1,119 @@
+import random
+import pytest
+import solver.batch
+from solver.batch import ScheduleGraphs
+from solver.costFunctions import solve_cost_function
+from solver.updates import Delta
+
+ENGINES = [('networkx', 'expanded'), ('networkx', 'sparse'), ('csr', 'csa'), ('alt', 'csa')]
+COST_FUNCTIONS = ['stops', 'timeintrain', 'traveltime', 'arrivaltime']
+
+
+def _graph_kind(cost_function):
+    return cost_function if cost_function in ('stops', 'timeintrain') else 'timetable'
+
+
+def _feed(schedule_df):
+    trains = sorted(schedule_df['Train No.'].unique())
+    rng = random.Random(0)
+    return [Delta('delay', rng.choice(trains), 2, 600), Delta('cancel', rng.choice(trains)),
+            Delta('skip', rng.choice(trains), 2), Delta('delay', rng.choice(trains), 1, -300)]
+
+
+def _costs(graphs, queries):
+    costs = []
+    for cost_function in COST_FUNCTIONS:
+        for start, target, input_time in queries:
+            result = solve_cost_function(graphs[_graph_kind(cost_function)], start, target, graphs['schedule'],
+                                         cost_function, input_time)
+            costs.append(result if isinstance(result, str) else result[1])
+    return costs
+
+
+def _csr_edges(graph) -> list:
+    """
+    The edges of a CSRGraph by station and train name, in edge order.
+    """
+    return [(graph.stations[station], graph.stations[graph.targets[edge]], graph.trains[graph.train[edge]],
+             *(int(getattr(graph, field)[edge]) for field in ('stops', 'timeintrain', 'fromislno', 'toislno')))
+            for station in range(len(graph.stations)) for edge in range(graph.offsets[station], graph.offsets[station + 1])]
+
+
+def _connections(timetable) -> list:
+    """
+    The connections of a Timetable by station and train name, in scan order.
+    """
+    return list(zip(timetable.departure.tolist(), timetable.arrival.tolist(),
+                    [timetable.stations[station] for station in timetable.from_station],
+                    [timetable.stations[station] for station in timetable.to_station],
+                    [timetable.trains[train] for train in timetable.train],
+                    timetable.from_islno.tolist(), timetable.to_islno.tolist()))
+
+
+@pytest.mark.parametrize('station_engine, timetable_engine', ENGINES)
+def test_apply_delta_matches_rebuild(schedule_file, tmp_path, station_engine, timetable_engine):
+    graphs = ScheduleGraphs(schedule_file, station_engine, timetable_engine, cache_dir=str(tmp_path))
+    for kind in ScheduleGraphs.KINDS:
+        graphs[kind]
+    feed = _feed(graphs['schedule'])
+    for delta in feed:
+        assert graphs.apply_delta(delta)
+
+    # Rebuilt from scratch on the updated schedule
+    rebuilt = ScheduleGraphs(schedule_file, station_engine, timetable_engine, cache_dir=str(tmp_path))
+    rebuilt.deltas = list(feed)
+    rebuilt.built['schedule'] = graphs['schedule']
+
+    rng = random.Random(1)
+    stations = sorted(graphs['schedule']['station Code'].unique())
+    queries = [(*rng.sample(stations, 2), rng.randrange(86400)) for _ in range(15)]
+    assert _costs(graphs, queries) == _costs(rebuilt, queries)
+
+
+def test_apply_delta_to_cached_collapsed_graph(schedule_file, tmp_path):
+    # Warm the cache, then load only a collapsed graph from it: the station graph is never built
+    for kind in ('stops', 'timeintrain'):
+        ScheduleGraphs(schedule_file, 'networkx', cache_dir=str(tmp_path))[kind]
+    graphs = ScheduleGraphs(schedule_file, 'networkx', cache_dir=str(tmp_path))
+    graphs['stops']
+    assert 'station' not in graphs.built
+
+    train = sorted(graphs['schedule']['Train No.'].unique())[0]
+    assert graphs.apply_delta(Delta('skip', train, 2))
+
+    rebuilt = ScheduleGraphs(schedule_file, 'networkx', cache_dir=str(tmp_path))
+    rebuilt.deltas = [Delta('skip', train, 2)]
+    rebuilt.built['schedule'] = graphs['schedule']
+    stations = sorted(graphs['schedule']['station Code'].unique())
+    # Of equally cheap parallel edges the updated graph may keep another one, so only costs are compared
+    queries = [(start, target, 0) for start in stations[:5] for target in stations[-5:]]
+    assert _costs(graphs, queries)[:len(queries)] == _costs(rebuilt, queries)[:len(queries)]
+
+
+def test_array_graphs_are_patched(schedule_file, tmp_path, monkeypatch):
+    graphs = ScheduleGraphs(schedule_file, 'csr', 'csa', cache_dir=str(tmp_path))
+    for kind in ScheduleGraphs.KINDS:
+        graphs[kind]
+    # Loaded again, so the arrays are the read-only memory maps of the cache
+    graphs = ScheduleGraphs(schedule_file, 'csr', 'csa', cache_dir=str(tmp_path))
+    for kind in ScheduleGraphs.KINDS:
+        graphs[kind]
+    feed = _feed(graphs['schedule'])
+
+    def rebuild(*args):
+        raise AssertionError("array graph rebuilt")
+
+    with monkeypatch.context() as patch:
+        for builder in ('build_csr_graph', 'collapse_csr_graph', 'build_timetable', 'load_schedule'):
+            patch.setattr(solver.batch, builder, rebuild)
+        for delta in feed:
+            assert graphs.apply_delta(delta)
+        assert not graphs.apply_delta(Delta('delay', feed[1].train, 1, 60))
+
+    rebuilt = ScheduleGraphs(schedule_file, 'csr', 'csa', cache_dir=str(tmp_path))
+    rebuilt.deltas = list(feed)
+    rebuilt.built['schedule'] = graphs['schedule'].reset_index(drop=True)
+    # Edge for edge and connection for connection what the builders give the updated schedule
+    for kind in ('station', 'stops', 'timeintrain'):
+        assert _csr_edges(graphs[kind]) == _csr_edges(rebuilt[kind])
+    assert _connections(graphs['timetable']) == _connections(rebuilt['timetable'])
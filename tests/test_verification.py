@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+from benchmarks.synthetic_schedule import generate_problems
+from solver.batch import load_schedules, solve_problems
+from solver.problem_solver import load_problems_csv, load_schedule
+from solver.verification import verify_solutions, parse_connection
+
+
+@pytest.fixture(scope='module')
+def solved(schedule_file, tmp_path_factory):
+    """
+    Random problems on the synthetic schedule, their solutions and the schedules to verify them on.
+    """
+    directory = tmp_path_factory.mktemp('verification')
+    problems_file = str(directory / 'problems.csv')
+    generate_problems(problems_file, schedule_file, 'schedule.csv', n_problems=40, seed=2)
+    problems_df = load_problems_csv(problems_file)
+    schedules = load_schedules({'schedule.csv': schedule_file}, cache_dir=str(directory / 'cache'))
+    solutions_df = pd.DataFrame(solve_problems(problems_df, schedules))
+    return problems_df, solutions_df, {'schedule.csv': load_schedule(schedule_file)}
+
+
+def _statuses(solved, solutions_df, expected_df=None) -> dict:
+    problems_df, _, schedules = solved
+    report = verify_solutions(solutions_df, problems_df, schedules, expected_df)
+    return dict(zip(report['ProblemNo'], report['status']))
+
+
+def test_solutions_verify(solved):
+    _, solutions_df, _ = solved
+    assert set(_statuses(solved, solutions_df, solutions_df).values()) == {'ok'}
+    # Without a reference every found connection is still recomputed to its claimed cost
+    assert set(_statuses(solved, solutions_df).values()) == {'unverified'}
+
+
+def test_tampered_solutions_are_rejected(solved):
+    _, solutions_df, _ = solved
+    found = solutions_df[solutions_df['Connection'] != 'PATH NOT FOUND']
+    assert len(found) >= 5
+    problem_nos = found['ProblemNo'].tolist()[:5]
+    connections = dict(zip(found['ProblemNo'], found['Connection']))
+
+    def leg(problem_no):
+        return parse_connection(connections[problem_no])[0]
+
+    tampered = solutions_df.copy().set_index('ProblemNo')
+    # Wrong cost
+    tampered.loc[problem_nos[0], 'Cost'] = '12345678'
+    # A stop the train does not have
+    train, from_islno, _ = leg(problem_nos[1])
+    tampered.loc[problem_nos[1], 'Connection'] = f"{train} : {from_islno} -> 9999"
+    # A leg ridden backwards
+    train, from_islno, to_islno = leg(problem_nos[2])
+    tampered.loc[problem_nos[2], 'Connection'] = f"{train} : {to_islno} -> {from_islno}"
+    # Not a connection at all
+    tampered.loc[problem_nos[3], 'Connection'] = "garbage"
+    # A path the reference has
+    tampered.loc[problem_nos[4], 'Connection'] = 'PATH NOT FOUND'
+
+    statuses = _statuses(solved, tampered.reset_index(), solutions_df)
+    assert [statuses[problem_no] for problem_no in problem_nos] == [
+        'wrong cost', 'infeasible', 'infeasible', 'infeasible', 'missing path']
+    assert all(status == 'ok' for problem_no, status in statuses.items() if problem_no not in problem_nos)
+
+
+def test_missing_solution(solved):
+    _, solutions_df, _ = solved
+    statuses = _statuses(solved, solutions_df.iloc[1:], solutions_df)
+    assert statuses[solutions_df['ProblemNo'].iloc[0]] == 'no solution'
@@ -1,20 +1,82 @@
-import sys, requests, pathlib, json
+import argparse
+import sys
+import time
+import pandas as pd
+from solver.problem_solver import load_problems_csv, load_schedule
+from solver.verification import verify_solutions, STATUSES
+from solver.graph_cache import load_or_build
 
-if len(sys.argv) != 2:
-    print('Usage: verify.py path/to/your/example-solutions.csv')
-    sys.exit()
+# Statuses that make the verification fail
+FAILURES = ['suboptimal', 'wrong cost', 'missing path', 'unexpected path', 'infeasible', 'no solution']
 
-with open(sys.argv[1]) as fp:
-    data = fp.read()
 
-response = requests.get(f'http://jfschaefer.de:8973/verify/ws2425a11/code', data=data)
+def verify_remote(solutions_file: str):
+    """
+    Posts the solutions to the course's verification server; only checks the example problems.
+    """
+    import requests
 
-print(response.text)
+    with open(solutions_file) as fp:
+        data = fp.read()
 
-print()
-print('WARNING: YOU MAY GET A DIFFERENT NUMBER OF POINTS')
-print('The script only checks your solutions for the example problems, '
-        'but your grade will depend on the actual solutions. '
-        'Furthermore, there is a chance that the script contains mistakes. '
-        'The script is only intended to help you with debugging.')
+    response = requests.get(f'http://jfschaefer.de:8973/verify/ws2425a11/code', data=data)
 
+    print(response.text)
+
+    print()
+    print('WARNING: YOU MAY GET A DIFFERENT NUMBER OF POINTS')
+    print('The script only checks your solutions for the example problems, '
+            'but your grade will depend on the actual solutions. '
+            'Furthermore, there is a chance that the script contains mistakes. '
+            'The script is only intended to help you with debugging.')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check solutions offline: every connection must be feasible in the schedule, its cost must "
+                    "match the recomputed cost, and it must be as good as the reference solution.")
+    parser.add_argument('solutions', help="solutions CSV to check")
+    parser.add_argument('--problems', default='problems/example-problems.csv', help="problems the solutions answer")
+    parser.add_argument('--expected', default='solutions/example-solutions.csv',
+                        help="reference solutions to compare costs with; 'none' to only check feasibility")
+    parser.add_argument('--mini-schedule', default='data/mini-schedule.csv')
+    parser.add_argument('--schedule', default='data/schedule.csv')
+    parser.add_argument('--show', type=int, default=20, help="failures to print")
+    parser.add_argument('--remote', action='store_true', help="check with the course's server instead")
+    args = parser.parse_args()
+
+    if args.remote:
+        verify_remote(args.solutions)
+        return
+
+    start = time.perf_counter()
+    problems_df = load_problems_csv(args.problems)
+    solutions_df = pd.read_csv(args.solutions, dtype={'Connection': str, 'Cost': str})
+    expected_df = None
+    if args.expected != 'none':
+        expected_df = pd.read_csv(args.expected, dtype={'Connection': str, 'Cost': str})
+    schedules = {
+        'mini-schedule.csv': load_or_build(args.mini_schedule, 'schedule', lambda: load_schedule(args.mini_schedule)),
+        'schedule.csv': load_or_build(args.schedule, 'schedule', lambda: load_schedule(args.schedule))
+    }
+
+    results = verify_solutions(solutions_df, problems_df, schedules, expected_df)
+    elapsed = time.perf_counter() - start
+
+    # Summary per status, then the failures
+    counts = results['status'].value_counts()
+    for status in STATUSES:
+        if status in counts:
+            print(f"{status:22s} {counts[status]}")
+    failures = results.loc[results['status'].isin(FAILURES)]
+    for row in failures.head(args.show).itertuples(index=False):
+        print(f"problem {row.ProblemNo} ({row.CostFunction}): {row.status}: {row.detail}")
+    if len(failures) > args.show:
+        print(f"... and {len(failures) - args.show} more")
+    print(f"checked {len(results)} problems in {elapsed:.2f} s")
+
+    sys.exit(1 if len(failures) else 0)
+
+
+if __name__ == "__main__":
+    main()